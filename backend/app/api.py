@@ -2,21 +2,65 @@ import traceback
 import json
 import os
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Request
-from fastapi.responses import Response
-from app.schemas import Message, ChatRequest, PlantAnalysisRequest, PlantAnalysisResponse, FirebaseLoginRequest, LoginResponse, ProtectedResponse, SaveCollectionRequest, UserCollectionResponse, DeleteCollectionItemRequest, CreateMarkerRequest, MapMarker, FeedbackRequest
-from app.backend import Imager
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from app.schemas import Message, ChatRequest, PlantAnalysisRequest, PlantAnalysisResponse, FirebaseLoginRequest, LoginResponse, ProtectedResponse, SaveCollectionRequest, UserCollectionResponse, DeleteCollectionItemRequest, CreateMarkerRequest, MapMarker, MapMarkersDelta, FeedbackRequest
+from app.backend import Imager, current_date_and_season
 from app.auth import AuthService, get_current_user, get_current_user_optional
 from app.collections import collection_manager
-from app.maps import map_manager
+from app.maps import map_manager, export_markers, etag_matches, EXPORT_FORMATS
 from app.rate_limiter import rate_limiter
 from app.rewards import rewards_manager
-from app.plant_classifier import is_plant
+from app.llm_governor import llm_governor
+from app.llm_resilience import llm_resilience
+from app.llm_errors import LLMError
+from app.chat_cache import chat_cache
+from app.chat_sessions import chat_sessions
+from app.species_index import species_index
+from app.species_knowledge import species_knowledge
 
 imager = Imager()
 router = APIRouter()
 
+def classify_plant(image):
+    """CNN plant check; the classifier (and torch) is imported on first use, not with the API"""
+    from app.plant_classifier import classify
+    return classify(image)
+
+def embed_image(prepared):
+    """Classifier embedding of the upload, the species index key (torch imported on first use)"""
+    from app.plant_classifier import embed
+    return embed(prepared)
+
+def prepare_image(image_bytes: bytes, content_type: str):
+    """Decode the upload once; the result is shared by the classifier and the LLM payload"""
+    from app.preprocessing import prepare_image as prepare
+    return prepare(image_bytes, content_type)
+
+def _cnn_only_verdict(region: str, reason: str, prediction) -> Dict[str, Any]:
+    """Result returned when the LLM is unavailable, built from whatever the CNN concluded"""
+    if prediction.verdict == "plant":
+        reasoning = "Our on-device filter recognised a plant, but detailed species identification is temporarily unavailable."
+    else:
+        # Gray band: the CNN deferred to the LLM, so there is no verdict to fall back on
+        reasoning = "We could not confirm that this image shows a plant, and detailed identification is temporarily unavailable."
+    return {
+        "specieIdentified": "Unidentified Plant",
+        "nativeRegion": "Unknown",
+        "invasiveOrNot": False,
+        "confidenceScore": 0.0,
+        "confidenceReasoning": reasoning,
+        "invasiveEffects": "",
+        "nativeAlternatives": [],
+        "removeInstructions": "Please try the analysis again in a few minutes.",
+        "region": region,
+        "analysisDegraded": True,
+        "degradedReason": reason,
+        "classifier": prediction.to_dict()
+    }
+
 # Authentication endpoints
 @router.post("/api/auth/login", response_model=LoginResponse)
 async def login(request: FirebaseLoginRequest):
@@ -117,26 +161,43 @@ async def clear_user_collection(current_user: Dict[str, Any] = Depends(get_curre
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/api/chat")
-def chat(request: ChatRequest, current_user: Dict[str, Any] = Depends(get_current_user_optional)) -> dict[str, str]:
+def chat(request: ChatRequest, http_request: Request, current_user: Dict[str, Any] = Depends(get_current_user_optional)) -> dict[str, str]:
     """Chat endpoint - optionally authenticated"""
-    print(f"Message request received from user: {current_user.get('email') if current_user else 'anonymous'}")
+    user_identifier = current_user.get('email') if current_user else 'anonymous'
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    print(f"Message request received from user: {user_identifier}")
+    rate_limiter.check_rate_limit(rate_limiter.get_rate_limit_key(user_identifier, client_ip), endpoint="chat")
     try:
-        response = imager.chat_response(request.message, request.context)
-        return {"text": response}
+        # Follow-ups keep the session's earlier turns and plant context without the client resending them
+        session = chat_sessions.open(request.sessionId, owner=user_identifier)
+        context = request.context or session.context
+        response = imager.chat_response(request.message, context, chat_sessions.history(session))
+        chat_sessions.record(session, request.message, response, context)
+        return {"text": response, "sessionId": session.id}
+    except LLMError as e:
+        print(f"❌ Chat LLM call failed: {e}")
+        raise HTTPException(status_code=503, detail="The plant expert is temporarily unavailable. Please try again shortly.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/api/check-plant")
-async def check_plant(image: UploadFile = File(...)):
+async def check_plant(
+    request: Request,
+    image: UploadFile = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_user_optional)
+):
     """Quickly check if the image is a plant using CNN"""
+    user_identifier = current_user.get('email') if current_user else 'anonymous'
+    client_ip = request.client.host if request.client else "unknown"
+    rate_limiter.check_rate_limit(rate_limiter.get_rate_limit_key(user_identifier, client_ip), endpoint="check")
     try:
         if not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
             
         image_data = await image.read()
-        is_plant_result = is_plant(image_data)
+        prediction = await run_in_threadpool(classify_plant, image_data)
         
-        return {"is_plant": is_plant_result}
+        return {"is_plant": prediction.is_plant, **prediction.to_dict()}
     except Exception as e:
         print(f"❌ Check plant failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -153,19 +214,8 @@ async def analyze_plant(
     client_ip = request.client.host if request.client else "unknown"
     
     # Get current date and season
-    from datetime import datetime
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    month = datetime.now().month
-    
-    if 3 <= month <= 5:
-        season = "Spring"
-    elif 6 <= month <= 8:
-        season = "Summer"
-    elif 9 <= month <= 11:
-        season = "Fall"
-    else:
-        season = "Winter"
-    
+    current_date, season = current_date_and_season()
+
     print(f"Plant analysis request received from user: {user_identifier} for region: {region}, Date: {current_date}, Season: {season}")
 
     # Rate limiting check
@@ -173,21 +223,21 @@ async def analyze_plant(
     
     try:
         # Check rate limits before processing
-        rate_limiter.check_rate_limit(rate_limit_key)
+        rate_limiter.check_rate_limit(rate_limit_key, endpoint="analysis")
         
         # Validate image file
         if not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
 
-        # Set region for analysis
-        imager.set_region(region)
-
-        # Convert uploaded file to base64
         image_data = await image.read()
+        prepared = await run_in_threadpool(prepare_image, image_data, image.content_type)
         
         # 🌿 Check if it is a plant using CNN
         print("🔍 Checking if image is a plant...")
-        if not is_plant(image_data):
+        prediction = await run_in_threadpool(classify_plant, prepared)
+        if prediction.verdict == "uncertain":
+            print("🤔 Plant classifier is unsure (gray band). Deferring to the LLM.")
+        if not prediction.is_plant:
             print("🚫 Image classified as NOT a plant. Skipping LLM analysis.")
             return {
                 "specieIdentified": "Not a Plant",
@@ -199,26 +249,38 @@ async def analyze_plant(
                 "nativeAlternatives": [],
                 "removeInstructions": "Please upload a clear image of a plant.",
                 "region": region,
+                "classifier": prediction.to_dict(),
                 "analyzed_by": current_user['uid'] if current_user else 'anonymous',
                 "user_email": current_user['email'] if current_user else 'anonymous@example.com',
                 "coinAwarded": False,
                 "coins": int(rewards_manager.get_user_rewards(current_user['uid']).get('coins', 0)) if current_user else 0
             }
             
-        import base64
-        base64_data = base64.b64encode(image_data).decode('utf-8')
-        
-        # Create Data URI with correct MIME type
-        base64_image = f"data:{image.content_type};base64,{base64_data}"
+        # Data URI with correct MIME type (built once on the prepared image)
+        base64_image = prepared.data_uri
         
         print(f"📸 Starting analysis for user {user_identifier} (Region: {region})")
 
         # Analyze the image
         try:
-            parsed_data = imager.analyze_plant_image(base64_image, date=current_date, season=season)
+            # ⚡ Uploads the CNN accepted that closely match confident past analyses from this region skip the LLM
+            embedding = await run_in_threadpool(embed_image, prepared) if prediction.verdict == "plant" and species_index.enabled else None
+            match = await run_in_threadpool(species_index.match, embedding, region) if embedding is not None else None
+            if match:
+                print(f"⚡ Species index match: {match.species} ({match.votes} neighbours, similarity >= {match.similarity:.3f}). Skipping LLM analysis.")
+                parsed_data = match.analysis
+                parsed_data['fastPath'] = match.to_dict()
+                parsed_data['source'] = "species_index"
+                parsed_data['routing'] = {"tier": "species_index", "model": None, "latencies": {}, "escalated": False}
+            else:
+                # Region, date and season travel with the call; the shared Imager holds no request state
+                parsed_data = await imager.analyze_plant_image_async(base64_image, region=region, date=current_date, season=season)
+                if embedding is not None:
+                    await run_in_threadpool(species_index.add, embedding, region, parsed_data)
             
-            # Add region to response
+            # Add region and the CNN pre-check to response
             parsed_data['region'] = region
+            parsed_data['classifier'] = prediction.to_dict()
             
             print(f"✅ Analysis successful for user {user_identifier}")
             
@@ -259,7 +321,17 @@ async def analyze_plant(
                 parsed_data['user_email'] = 'anonymous@example.com'
             
             return parsed_data
-            
+
+        except LLMError as e:
+            # Fail fast with the CNN verdict instead of an opaque error
+            print(f"⚠️ LLM unavailable for user {user_identifier}, returning CNN-only verdict: {e}")
+            degraded = _cnn_only_verdict(region, type(e).__name__, prediction)
+            degraded['analyzed_by'] = current_user['uid'] if current_user else 'anonymous'
+            degraded['user_email'] = current_user['email'] if current_user else 'anonymous@example.com'
+            degraded['coinAwarded'] = False
+            degraded['coins'] = int(rewards_manager.get_user_rewards(current_user['uid']).get('coins', 0)) if current_user else 0
+            return degraded
+
         except Exception as e:
             print(f"❌ Analysis failed: {str(e)}")
             traceback.print_exc()
@@ -301,6 +373,12 @@ async def submit_feedback(
         print(f"❌ Feedback submission failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to submit feedback")
 
+@router.get("/api/llm/status")
+async def llm_status():
+    """Current LLM concurrency limit, queue length, shed counts, circuit states, chat cache hit rate and chat sessions"""
+    return {**llm_governor.stats(), "resilience": llm_resilience.stats(), "chat_cache": chat_cache.stats(),
+            "chat_sessions": chat_sessions.stats(), "species_knowledge": species_knowledge.stats()}
+
 # Rewards endpoints
 @router.get("/api/rewards")
 async def get_rewards(response: Response, current_user: Dict[str, Any] = Depends(get_current_user)):
@@ -338,10 +416,70 @@ async def create_marker(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/api/map/markers", response_model=List[MapMarker])
-async def get_markers(current_user: Dict[str, Any] = Depends(get_current_user_optional)):
-    """Get all markers from the community map"""
+async def get_markers(
+    request: Request,
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user_optional)
+):
+    """Get all markers from the community map (honours If-None-Match)"""
+    try:
+        etag = map_manager.etag
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        markers, etag = map_manager.get_all_markers_with_etag()
+        response.headers["ETag"] = etag
+        return markers
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/map/markers/delta", response_model=MapMarkersDelta)
+async def get_markers_delta(
+    response: Response,
+    cursor: Optional[int] = None,
+    since: Optional[datetime] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user_optional)
+):
+    """Get markers added or removed since a cursor (preferred) or a timestamp"""
     try:
-        return map_manager.get_all_markers()
+        delta = map_manager.get_markers_delta(cursor=cursor, since=since)
+        response.headers["ETag"] = f'"markers-{delta.cursor}"'
+        return delta
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/api/map/markers/export")
+async def export_map_markers(
+    format: str = "geojson",
+    gzip: bool = False,
+    current_user: Dict[str, Any] = Depends(get_current_user_optional)
+):
+    """Stream the full sighting dataset as GeoJSON or NDJSON, optionally gzipped"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+
+    _, media_type = EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="map_markers.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        export_markers(map_manager, fmt=format, compress=gzip),
+        media_type=media_type,
+        headers=headers
+    )
+
+@router.delete("/api/map/markers/{marker_id}")
+async def delete_marker(marker_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Remove one of the current user's markers from the community map"""
+    try:
+        if map_manager.remove_marker(marker_id, current_user['uid']):
+            return {"message": "Marker removed successfully", "success": True}
+        raise HTTPException(status_code=404, detail="Marker not found")
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
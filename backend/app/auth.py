@@ -1,53 +1,57 @@
 import os
 import jwt
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
 from dotenv import load_dotenv
 
 load_dotenv()
 
+_firebase_lock = threading.Lock()
+
 # Initialize Firebase Admin SDK
 def initialize_firebase():
     """Initialize Firebase Admin SDK with service account"""
-    try:
-        # Check if Firebase is already initialized
-        firebase_admin.get_app()
-    except ValueError:
-        # Firebase not initialized, initialize it
+    # Imported here so importing this module does not pull in the Google SDKs
+    import firebase_admin
+    from firebase_admin import credentials
+    with _firebase_lock:
+        try:
+            # Check if Firebase is already initialized
+            firebase_admin.get_app()
+        except ValueError:
+            # Firebase not initialized, initialize it
         
-        # Option 1: Using service account JSON from environment variable (for production)
-        service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_JSON')
-        if service_account_json:
-            import json
-            import tempfile
-            # Parse the JSON string and create a temporary file
-            service_account_info = json.loads(service_account_json)
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            print("Firebase initialized with service account from environment variable")
-        else:
-            # Option 2: Using service account key file (for local development)
-            service_account_path = os.getenv('FIREBASE_SERVICE_ACCOUNT_PATH')
-            if service_account_path and os.path.exists(service_account_path):
-                cred = credentials.Certificate(service_account_path)
+            # Option 1: Using service account JSON from environment variable (for production)
+            service_account_json = os.getenv('FIREBASE_SERVICE_ACCOUNT_JSON')
+            if service_account_json:
+                import json
+                import tempfile
+                # Parse the JSON string and create a temporary file
+                service_account_info = json.loads(service_account_json)
+                cred = credentials.Certificate(service_account_info)
                 firebase_admin.initialize_app(cred)
-                print("Firebase initialized with service account file")
+                print("Firebase initialized with service account from environment variable")
             else:
-                # Option 3: Using default credentials (fallback)
-                try:
-                    cred = credentials.ApplicationDefault()
+                # Option 2: Using service account key file (for local development)
+                service_account_path = os.getenv('FIREBASE_SERVICE_ACCOUNT_PATH')
+                if service_account_path and os.path.exists(service_account_path):
+                    cred = credentials.Certificate(service_account_path)
                     firebase_admin.initialize_app(cred)
-                    print("Firebase initialized with default credentials")
-                except Exception as e:
-                    print(f"Warning: Could not initialize Firebase Admin SDK: {e}")
-                    print("Please set FIREBASE_SERVICE_ACCOUNT_JSON or FIREBASE_SERVICE_ACCOUNT_PATH")
+                    print("Firebase initialized with service account file")
+                else:
+                    # Option 3: Using default credentials (fallback)
+                    try:
+                        cred = credentials.ApplicationDefault()
+                        firebase_admin.initialize_app(cred)
+                        print("Firebase initialized with default credentials")
+                    except Exception as e:
+                        print(f"Warning: Could not initialize Firebase Admin SDK: {e}")
+                        print("Please set FIREBASE_SERVICE_ACCOUNT_JSON or FIREBASE_SERVICE_ACCOUNT_PATH")
 
-# Initialize Firebase on module import
-initialize_firebase()
+# Firebase is initialized by the startup warm-up task (app.startup), or on first token verification
 
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
@@ -62,6 +66,8 @@ class AuthService:
     def verify_firebase_token(id_token: str) -> Dict[str, Any]:
         """Verify Firebase ID token and return user info"""
         try:
+            from firebase_admin import auth as firebase_auth
+            initialize_firebase()
             # Verify the ID token with Firebase Admin SDK
             decoded_token = firebase_auth.verify_id_token(id_token)
             return {
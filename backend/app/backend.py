@@ -1,120 +1,226 @@
-from app.llm_framework import LLM, Gemini, ImageLLM
+from app.llm_framework import LLM
+from app.llm_registry import llm_registry
+from app.llm_errors import LLMError
+import asyncio
 import base64
 import json
 import re
+import time
+from datetime import datetime
 llm = LLM()
-from app.prompts import paragraph_analysis, json_information, optimized_analysis, plant_expert_chat
+from app.prompts import paragraph_analysis, json_information, optimized_analysis, plant_expert_chat, identification_analysis, species_facts
+from app.confidence import confidence_score
+from app.species_knowledge import species_knowledge
+from app.chat_cache import chat_cache
+from app.chat_sessions import ChatHistory
 from dotenv import load_dotenv
 load_dotenv(override=True)
 print(llm)
-from typing import Optional
+from typing import List, Optional, Tuple
 
 class Generate:
-    def __init__(self):
-        self.LLM = LLM()
-        self.key,self.name,self.url=self.LLM.initialize_llm(KEY='LLM_KEY',
-                                                            NAME='LLM_NAME',
-                                                            URL='LLM_URL')
-        
+    """Text generation against the main model from the current registry snapshot"""
+
     def __call__(self,
                  prompt:str,
                  system_prompt:Optional[str]=None,
                  max_tokens:Optional[int]=None,
-                 mode:str="default")->str:
-        # Auto-detect Gemini mode if URL suggests it
-        if "generativelanguage.googleapis.com" in self.url:
-            mode = "gemini"
-            
-        if mode == "gemini":
-            self.LLM = Gemini()
-        contents = self.LLM.llm_contents(key=self.key,
-                                         name=self.name,
-                                         prompt=prompt,
-                                         system_prompt=system_prompt,
-                                         max_tokens=max_tokens)
-        return self.LLM.get_output(url=self.url, llm_contents=contents)
-    
+                 mode:str="default",
+                 history:Optional[List[Tuple[str, str]]]=None)->str:
+        config = llm_registry.current
+        endpoint = config.main
+        client = config.chat_client(mode)
+        contents = client.llm_contents(key=endpoint.key,
+                                       name=endpoint.name,
+                                       prompt=prompt,
+                                       system_prompt=system_prompt,
+                                       max_tokens=max_tokens,
+                                       history=history)
+        return client.get_output(url=endpoint.url, llm_contents=contents)
+
+# Shared, stateless text generator
+generate = Generate()
+
+# Output budget for the identification-only prompt (a short JSON answer; thinking models need headroom)
+IDENTIFICATION_MAX_TOKENS = 1500
+
+def current_date_and_season(now: Optional[datetime] = None) -> Tuple[str, str]:
+    """Today's date (YYYY-MM-DD) and meteorological season for the prompt context"""
+    now = now or datetime.now()
+    month = now.month
+    if 3 <= month <= 5:
+        season = "Spring"
+    elif 6 <= month <= 8:
+        season = "Summer"
+    elif 9 <= month <= 11:
+        season = "Fall"
+    else:
+        season = "Winter"
+    return now.strftime("%Y-%m-%d"), season
+
 class Imager:
+    """
+    Stateless analysis service. Everything request-specific (region, date, season)
+    is passed per call, so one instance can serve concurrent requests from threads
+    or the event loop without one request's context leaking into another's prompt.
+    """
+
     def __init__(self, region: str = "North America"):
-        self.llm_info = LLM().initialize_llm(KEY='LLM_KEY',NAME='LLM_NAME',URL='LLM_URL')
-        self.key, self.name, self.url = self.llm_info
-            
-        self.region = region
-        self.image_llm = ImageLLM()
-        print(self.name, self.url)
-
-    def set_region(self, region: str):
-        """Update the region for analysis"""
-        self.region = region
-
-    def chat_response(self, message: str, context: dict = None) -> str:
-        """Get chat response from expert botanist persona"""
-        prompt = plant_expert_chat(message, context)
+        # Used only when a caller does not pass a region; never mutated after construction
+        self.default_region = region
+        config = llm_registry.current
+        print(config.main.name, config.main.url)
+
+    def chat_response(self, message: str, context: dict = None, history: ChatHistory = None) -> str:
+        """Get chat response from expert botanist persona; history is the session so far (already trimmed to budget)"""
+        # Follow-ups depend on the conversation, so only opening questions use the answer cache
+        cacheable = not history
+        cached = chat_cache.get(message, context) if cacheable else None
+        if cached is not None:
+            print("💬 Chat answer served from cache")
+            return cached
+
+        prompt = plant_expert_chat(message, context, history.summary if history else None)
         
         # Use regular LLM for text chat, not ImageLLM
-        generator = Generate()
-        response = generator(
+        response = generate(
             prompt=prompt,
-            max_tokens=2000  # Reduced to 2000 for faster response
+            max_tokens=2000,  # Reduced to 2000 for faster response
+            history=[(turn.question, turn.answer) for turn in history.turns] if history else None
         )
+        if cacheable:
+            chat_cache.put(message, context, response)
         return response
 
-    def analyze_plant_image(self, image_path_or_data: str, date: str = None, season: str = None)->dict:
+    def analyze_plant_image(self, image_path_or_data: str, region: str = None, date: str = None, season: str = None)->dict:
         """Analyze plant image for invasive species using optimized single-step approach"""
-        return self._get_optimized_analysis(image_path_or_data, date, season)
+        region = region or self.default_region
+        # Regions whose uploads are mostly cached species: identify first and only generate the full answer on a miss
+        identify_first = species_knowledge.worth_identifying(region)
+        if identify_first:
+            result = self._get_identified_analysis(image_path_or_data, region, date, season)
+            if result is not None:
+                return result
+        # An identification miss was already counted, so only measure uploads that skipped it
+        return self._get_optimized_analysis(image_path_or_data, region, date, season, measure=not identify_first)
 
-    def analyze_plant_image_legacy(self, image_path_or_data: str)->dict:
+    async def analyze_plant_image_async(self, image_path_or_data: str, region: str = None, date: str = None, season: str = None)->dict:
+        """Run analyze_plant_image in a worker thread so the event loop is never blocked"""
+        return await asyncio.to_thread(self.analyze_plant_image, image_path_or_data, region, date, season)
+
+    def analyze_plant_image_legacy(self, image_path_or_data: str, region: str = None)->dict:
         """Legacy two-step analysis (kept for fallback)"""
         # Step 1: Get paragraph analysis
-        paragraph_response = self._get_paragraph_analysis(image_path_or_data)
+        paragraph_response = self._get_paragraph_analysis(image_path_or_data, region or self.default_region)
 
         # Step 2: Convert to JSON
         json_response = self._convert_to_json(paragraph_response)
 
         return json_response
 
-    def _get_optimized_analysis(self, image_path_or_data: str, date: str = None, season: str = None)->dict:
-        """Get optimized single-step analysis that returns JSON directly"""
+    def _get_optimized_analysis(self, image_path_or_data: str, region: str, date: str = None, season: str = None, measure: bool = True)->dict:
+        """Get optimized single-step analysis that returns JSON directly; measure feeds the region's knowledge hit rate"""
+        image_data = self._image_data(image_path_or_data)
+        result = self._run_tiers(optimized_analysis(region, date, season), image_data, max_tokens=4000)  # Reduced from 8000 to 4000 for efficiency
+        if measure:
+            species_knowledge.observe(result, region)
+        species_knowledge.remember(result, region)
+        return result
+
+    def _get_identified_analysis(self, image_path_or_data: str, region: str, date: str = None, season: str = None)->Optional[dict]:
+        """Identification-only analysis completed from the species knowledge cache; None on a cache miss"""
+        image_data = self._image_data(image_path_or_data)
+        start = time.perf_counter()
+        identification = self._run_tiers(identification_analysis(region, date, season), image_data, max_tokens=IDENTIFICATION_MAX_TOKENS)
+        result = species_knowledge.complete(identification, region, refresh=self._species_facts)
+        seconds = time.perf_counter() - start
+        species_knowledge.record_identification(region, hit=result is not None, seconds=seconds)
+        if result is None:
+            print(f"📚 No cached knowledge for '{identification.get('specieIdentified')}' in {region} "
+                  f"(miss cost {seconds:.2f}s), running the full analysis")
+        else:
+            print(f"📚 Completed '{result.get('specieIdentified')}' from cached species knowledge ({result['knowledge']})")
+        return result
+
+    def _species_facts(self, species: str, region: str)->dict:
+        """Text-only regeneration of the photo-independent fields (background knowledge refresh)"""
+        return self._extract_json(generate(prompt=species_facts(species, region), max_tokens=4000))
+
+    def _image_data(self, image_path_or_data: str)->str:
         # Check if input is base64 data or file path
         if image_path_or_data.startswith('data:image') or len(image_path_or_data) > 100:  # Likely base64
-            image_data = image_path_or_data
-        else:  # Likely file path
-            image_data = self._image_to_base64(image_path_or_data)
+            return image_path_or_data
+        return self._image_to_base64(image_path_or_data)
 
-        prompt = optimized_analysis(self.region, date, season)
+    def _run_tiers(self, prompt: str, image_data: str, max_tokens: int)->dict:
+        """Ask the fast tier first and escalate to the main model on failure or low confidence"""
+        config = llm_registry.current
+        tiers = []
+        if config.fast:
+            tiers.append(("fast", config.fast))
+        tiers.append(("main", config.main))
 
-        contents = self.image_llm.llm_contents(
-            key=self.key,
-            name=self.name,
-            prompt=prompt,
-            image_data=image_data,
-            max_tokens=4000  # Reduced from 8000 to 4000 for efficiency
-        )
+        latencies = {}
+        for index, (tier, endpoint) in enumerate(tiers):
+            name = endpoint.name
+            is_last_tier = index == len(tiers) - 1
+            start = time.perf_counter()
+            try:
+                contents = config.image_client.llm_contents(
+                    key=endpoint.key,
+                    name=endpoint.name,
+                    prompt=prompt,
+                    image_data=image_data,
+                    max_tokens=max_tokens
+                )
+                json_response = config.image_client.get_output(url=endpoint.url, llm_contents=contents)
+            except LLMError as e:
+                latencies[tier] = round(time.perf_counter() - start, 3)
+                if is_last_tier:
+                    raise
+                print(f"⚠️ {tier} tier ({name}) failed ({e}), escalating")
+                continue
+            latencies[tier] = round(time.perf_counter() - start, 3)
+            print(f"DEBUG - Raw LLM Response ({tier}): {json_response[:500]}...") # Log the first 500 chars
 
-        json_response = self.image_llm.get_output(url=self.url, llm_contents=contents)
-        print(f"DEBUG - Raw LLM Response: {json_response[:500]}...") # Log the first 500 chars
-        return self.parse_llm_response(json_response)
+            if is_last_tier:
+                result = self.parse_llm_response(json_response)
+                break
+
+            try:
+                result = self._extract_json(json_response)
+            except ValueError:
+                print(f"⚠️ {tier} tier returned unparseable JSON, escalating")
+                continue
+            confidence = confidence_score(result)
+            if result.get("specieIdentified") and confidence is not None and confidence >= config.escalation_confidence:
+                break
+            print(f"⚠️ {tier} tier confidence {confidence} below {config.escalation_confidence}, escalating")
+
+        print(f"🧭 Analysis answered by {tier} tier ({name}); latencies: {latencies}")
+        result["routing"] = {"tier": tier, "model": name, "latencies": latencies, "escalated": index > 0}
+        return result
 
-    def _get_paragraph_analysis(self, image_path_or_data: str)->str:
+    def _get_paragraph_analysis(self, image_path_or_data: str, region: str)->str:
         """Get paragraph analysis from image"""
-        prompt = paragraph_analysis(self.region)
+        prompt = paragraph_analysis(region)
+        config = llm_registry.current
 
-        contents = self.image_llm.llm_contents(
-            key=self.key,
-            name=self.name,
+        contents = config.image_client.llm_contents(
+            key=config.main.key,
+            name=config.main.name,
             prompt=prompt,
             image_data=image_path_or_data,
             max_tokens=4000  # Reduced from 8000 to 4000
         )
 
-        output = self.image_llm.get_output(url=self.url, llm_contents=contents)
+        output = config.image_client.get_output(url=config.main.url, llm_contents=contents)
         return output
 
     def _convert_to_json(self, paragraph_response: str)->dict:
         """Convert paragraph response to JSON format using optimized prompts"""
         prompt = json_information(paragraph_response)
-        generator = Generate()
-        json_response = generator(
+        json_response = generate(
             prompt=prompt,
             system_prompt=None,
             max_tokens=4000,  # Reduced from 8000 to 4000
@@ -122,51 +228,45 @@ class Imager:
         )
         return self.parse_llm_response(json_response)
 
+    def _extract_json(self, response_text: str)->dict:
+        """Extract the JSON object from an LLM response; raises json.JSONDecodeError"""
+        # Find the first JSON block enclosed in ```json ... ``` or just ``` ... ```
+        code_block_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response_text, re.DOTALL)
+        if code_block_match:
+            cleaned_response = code_block_match.group(1)
+        else:
+            # Fallback: try to find the first outer { and last }
+            start_idx = response_text.find('{')
+            end_idx = response_text.rfind('}')
+            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+                cleaned_response = response_text[start_idx:end_idx+1]
+            else:
+                cleaned_response = response_text
+
+        # Clean up cleanup response
+        cleaned_response = cleaned_response.strip()
+        # Remove any non-printable characters that might interfere
+        cleaned_response = re.sub(r'[\x00-\x1f\x7f-\x9f]', ' ', cleaned_response)
+
+        parsed = json.loads(cleaned_response)
+        if not isinstance(parsed, dict):
+            raise json.JSONDecodeError("Expected a JSON object", cleaned_response, 0)
+        return parsed
+
     def parse_llm_response(self, response_text: str)->dict:
         """Parse LLM response and extract JSON content"""
         try:
             print(f"DEBUG - Parsing response text length: {len(response_text)}")
-            
-            # Check for HTTP Error explicit strings from llm_framework
-            if response_text.startswith("HTTP Error") or "Error:" in response_text[:50]:
-                print(f"DEBUG - LLM API Error: {response_text}")
-                return {
-                    "specieIdentified": "API Error",
-                    "nativeRegion": "Unknown",
-                    "invasiveOrNot": False,
-                    "invasiveEffects": f"API Error: {response_text[:200]}...",
-                    "nativeAlternatives": [],
-                    "removeInstructions": "Check API configuration."
-                }
-
-            # Find the first JSON block enclosed in ```json ... ``` or just ``` ... ```
-            code_block_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response_text, re.DOTALL)
-            if code_block_match:
-                cleaned_response = code_block_match.group(1)
-            else:
-                # Fallback: try to find the first outer { and last }
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}')
-                if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                    cleaned_response = response_text[start_idx:end_idx+1]
-                else:
-                    cleaned_response = response_text
-
-            # Clean up cleanup response
-            cleaned_response = cleaned_response.strip()
-            # Remove any non-printable characters that might interfere
-            cleaned_response = re.sub(r'[\x00-\x1f\x7f-\x9f]', ' ', cleaned_response)
-            
-            return json.loads(cleaned_response)
+            return self._extract_json(response_text)
 
         except json.JSONDecodeError as e:
             print(f"DEBUG - JSON parsing failed: {e}")
-            print(f"DEBUG - Failed JSON content: {cleaned_response[:500]}...")
+            print(f"DEBUG - Failed JSON content: {response_text[:500]}...")
             return {
                 "specieIdentified": "Parsing error",
                 "nativeRegion": "Unknown",
                 "invasiveOrNot": False,
-                "invasiveEffects": f"Unable to parse the analysis response. Raw error: {cleaned_response[:200]}...",
+                "invasiveEffects": f"Unable to parse the analysis response. Raw error: {response_text[:200]}...",
                 "nativeAlternatives": [],
                 "removeInstructions": "Unable to provide removal instructions due to parsing error."
             }
@@ -0,0 +1,155 @@
+"""
+Chat Answer Cache
+
+Expert-chat questions repeat heavily ("how do I remove it?", "what native
+alternatives?") for the same species, region and user role, and each one used
+to cost a full generation. Answers are cached in-process keyed on the
+normalized question plus the context fields plant_expert_chat uses (species,
+region, userRole, invasiveOrNot), with LRU eviction at CHAT_CACHE_MAX_ENTRIES
+and a CHAT_CACHE_TTL expiry.
+
+Optional fuzzy matching (CHAT_CACHE_FUZZY_SIMILARITY, off by default) answers a
+question from a cached one with the same context whose word shingles overlap by
+at least that Jaccard similarity. Questions are only compared within their own
+context, which holds a handful of entries, so the comparison is exact rather
+than MinHash-estimated.
+
+- CHAT_CACHE_ENABLED: cache chat answers at all (default: true)
+- CHAT_CACHE_MAX_ENTRIES: answers kept before the least recently used is dropped (default: 2000)
+- CHAT_CACHE_TTL: seconds an answer is served for (default: 86400)
+- CHAT_CACHE_FUZZY_SIMILARITY: 0-1 shingle Jaccard similarity for near-duplicate questions (default: off)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Context fields that change the chat prompt, with plant_expert_chat's defaults
+CONTEXT_FIELDS = (("species", "this plant"), ("region", "Texas"), ("userRole", "Student"), ("invasiveOrNot", False))
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase words only: 'How do I remove it?' and 'how do i remove it' are the same question"""
+    return " ".join(re.findall(r"[a-z0-9']+", (question or "").lower()))
+
+
+def context_key(context: Optional[dict]) -> Tuple:
+    if not context:
+        return ("no context",)
+    key = []
+    for field, default in CONTEXT_FIELDS:
+        value = context.get(field) or default
+        key.append(" ".join(str(value).lower().split()) if isinstance(value, str) else bool(value))
+    return tuple(key)
+
+
+def shingles(normalized: str) -> FrozenSet[str]:
+    """Words and adjacent word pairs of a normalized question"""
+    words = normalized.split()
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+class ChatCache:
+    def __init__(self, max_entries: int = 2000, ttl: float = 86400, fuzzy_similarity: Optional[float] = None, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_similarity = fuzzy_similarity
+        self.enabled = enabled
+        # (context key, normalized question) -> (answer, stored at); most recently used last
+        self._entries: "OrderedDict[Tuple[Tuple, str], Tuple[str, float]]" = OrderedDict()
+        # context key -> {normalized question: shingles}, for fuzzy lookups
+        self._by_context: Dict[Tuple, Dict[str, FrozenSet[str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key: Tuple[Tuple, str]):
+        del self._entries[key]
+        questions = self._by_context[key[0]]
+        del questions[key[1]]
+        if not questions:
+            del self._by_context[key[0]]
+
+    def _nearest(self, context: Tuple, question: str) -> Optional[str]:
+        candidates = self._by_context.get(context)
+        if not candidates or not self.fuzzy_similarity:
+            return None
+        wanted = shingles(question)
+        best, best_similarity = None, self.fuzzy_similarity
+        for other, other_shingles in candidates.items():
+            similarity = len(wanted & other_shingles) / len(wanted | other_shingles) if wanted or other_shingles else 1.0
+            if similarity >= best_similarity:
+                best, best_similarity = other, similarity
+        return best
+
+    def get(self, question: str, context: Optional[dict] = None) -> Optional[str]:
+        """Cached answer for this question in this context, or None"""
+        if not self.enabled:
+            return None
+        context, question = context_key(context), normalize_question(question)
+        now = time.time()
+        with self._lock:
+            key = (context, question)
+            fuzzy = key not in self._entries
+            if fuzzy:
+                nearest = self._nearest(context, question)
+                key = (context, nearest) if nearest is not None else key
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.fuzzy_hits += fuzzy
+            return entry[0]
+
+    def put(self, question: str, context: Optional[dict], answer: str):
+        if not self.enabled or not answer or not answer.strip():
+            return
+        context, question = context_key(context), normalize_question(question)
+        with self._lock:
+            key = (context, question)
+            self._entries[key] = (answer, time.time())
+            self._entries.move_to_end(key)
+            self._by_context.setdefault(context, {})[question] = shingles(question)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def _chat_cache_from_env() -> ChatCache:
+    fuzzy = os.getenv("CHAT_CACHE_FUZZY_SIMILARITY")
+    return ChatCache(
+        max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", 2000)),
+        ttl=float(os.getenv("CHAT_CACHE_TTL", 86400)),
+        fuzzy_similarity=float(fuzzy) if fuzzy else None,
+        enabled=os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true",
+    )
+
+# Global chat answer cache for this process
+chat_cache = _chat_cache_from_env()
@@ -0,0 +1,214 @@
+"""
+Chat Sessions
+
+Server-side multi-turn state for /api/chat, so follow-up questions keep the
+earlier conversation without the client resending it.
+
+- Sessions live in a bounded in-memory LRU (CHAT_SESSION_MAX_SESSIONS); the
+  least recently used are dropped beyond it.
+- When CHAT_SESSION_SPILL_DIR is set, every session is also written there as
+  JSON after each answer, so sessions pushed out of memory are loaded back on
+  their next message, and a follow-up that lands on another worker sees the
+  latest turns. Without it sessions are per worker.
+- Sessions idle for CHAT_SESSION_IDLE_TTL seconds are evicted from memory and disk.
+- The history sent with each message is bounded by CHAT_HISTORY_TOKEN_BUDGET
+  (estimated at 4 characters per token): the newest turns that fit three
+  quarters of it are sent verbatim, and the questions of older turns are folded
+  into a summary capped at the remaining quarter, so the prompt stays the
+  same size however long the conversation gets.
+"""
+
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHARS_PER_TOKEN = 4
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class ChatTurn:
+    question: str
+    answer: str
+
+
+@dataclass
+class ChatHistory:
+    """What the model sees of a conversation before the current question"""
+    turns: List[ChatTurn] = field(default_factory=list)
+    summary: str = ""
+
+    def __bool__(self):
+        return bool(self.turns or self.summary)
+
+
+@dataclass
+class ChatSession:
+    id: str
+    owner: str
+    turns: List[ChatTurn] = field(default_factory=list)
+    summary: str = ""  # questions of turns that no longer fit the budget, oldest first
+    context: Optional[dict] = None
+    last_used: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatSession":
+        data = dict(data, turns=[ChatTurn(**turn) for turn in data.get("turns", [])])
+        return cls(**data)
+
+
+class ChatSessionStore:
+    # Spilled sessions are swept for idleness once every this many opens per process
+    CLEANUP_INTERVAL = 1000
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 3600, token_budget: int = 1000,
+                 spill_dir: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.spill_dir = spill_dir
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        # session id -> mtime of the spill file this process last wrote or read
+        self._spilled_mtime: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._opens = 0
+        self.loaded = 0
+        self.evicted = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    def _load_spilled(self, session_id: str, cached: Optional[ChatSession]) -> Optional[ChatSession]:
+        """The spilled copy when it is newer than the one in memory (caller holds the lock)"""
+        if not self.spill_dir:
+            return cached
+        path = self._spill_path(session_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if cached is not None and self._spilled_mtime.get(session_id) == mtime:
+                return cached
+            with open(path) as f:
+                session = ChatSession.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return cached
+        self._spilled_mtime[session_id] = mtime
+        self.loaded += 1
+        return session
+
+    def _spill(self, session: ChatSession):
+        path = self._spill_path(session.id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(asdict(session), f)
+        os.replace(tmp, path)
+        self._spilled_mtime[session.id] = os.stat(path).st_mtime_ns
+
+    def _forget(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._spilled_mtime.pop(session_id, None)
+
+    def _evict(self, now: float):
+        """Drop idle sessions and the least recently used beyond max_sessions (caller holds the lock)"""
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.idle_ttl:
+                break
+            self._forget(oldest.id)
+            self.evicted += 1
+        while len(self._sessions) > self.max_sessions:
+            self._forget(next(iter(self._sessions)))
+        self._opens += 1
+        if self.spill_dir and self._opens % self.CLEANUP_INTERVAL == 0:
+            self.cleanup_spilled(now)
+
+    def cleanup_spilled(self, now: Optional[float] = None):
+        """Delete spilled sessions that have been idle longer than idle_ttl"""
+        cutoff = (now or time.time()) - self.idle_ttl
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    self.evicted += 1
+            except OSError:
+                pass
+
+    def open(self, session_id: Optional[str], owner: str) -> ChatSession:
+        """The caller's session with this id, or a new one (unknown, expired or someone else's id)"""
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            session = None
+            if session_id and SESSION_ID_PATTERN.match(session_id):
+                session = self._load_spilled(session_id, self._sessions.get(session_id))
+            if session is None or session.owner != owner or now - session.last_used > self.idle_ttl:
+                session = ChatSession(id=secrets.token_urlsafe(16), owner=owner)
+            session.last_used = now
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            return session
+
+    def history(self, session: ChatSession) -> ChatHistory:
+        """Newest turns that fit the token budget, with older questions folded into the summary"""
+        with self._lock:
+            summary_budget = self.token_budget // 4
+            budget = self.token_budget - summary_budget
+            kept: List[ChatTurn] = []
+            for turn in reversed(session.turns):
+                cost = estimate_tokens(turn.question) + estimate_tokens(turn.answer)
+                if cost > budget:
+                    break
+                budget -= cost
+                kept.append(turn)
+            kept.reverse()
+            dropped = session.turns[:len(session.turns) - len(kept)]
+            if dropped:
+                questions = [session.summary] if session.summary else []
+                questions += [turn.question.strip() for turn in dropped]
+                session.summary = "; ".join(questions)
+                session.turns = kept
+            # Keep the newest questions of the summary within its share of the budget
+            limit = summary_budget * CHARS_PER_TOKEN
+            if len(session.summary) > limit:
+                session.summary = "..." + session.summary[-(limit - 3):]
+            return ChatHistory(list(kept), session.summary)
+
+    def record(self, session: ChatSession, question: str, answer: str, context: Optional[dict] = None):
+        with self._lock:
+            session.turns.append(ChatTurn(question, answer))
+            if context:
+                session.context = context
+            session.last_used = time.time()
+            if self.spill_dir:
+                self._spill(session)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "loaded_from_disk": self.loaded, "evicted": self.evicted}
+
+
+def _chat_sessions_from_env() -> ChatSessionStore:
+    return ChatSessionStore(
+        max_sessions=int(os.getenv("CHAT_SESSION_MAX_SESSIONS", 1000)),
+        idle_ttl=float(os.getenv("CHAT_SESSION_IDLE_TTL", 3600)),
+        token_budget=int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 1000)),
+        spill_dir=os.getenv("CHAT_SESSION_SPILL_DIR") or None,
+    )
+
+# Global chat session store for this process
+chat_sessions = _chat_sessions_from_env()
@@ -13,13 +13,18 @@ import os
 from typing import Dict, List, Optional
 from datetime import datetime
 from app.schemas import CollectionItem, PlantInfo
+from app.startup import LazyResource
+
+def _create_firestore_client():
+    """Firestore client via Firebase Admin SDK, or None when unavailable"""
+    try:
+        from app.auth import initialize_firebase
+        initialize_firebase()
+        from firebase_admin import firestore
+        return firestore.client()
+    except Exception:
+        return None
 
-# Try to initialize Firestore client via Firebase Admin SDK
-try:
-    from firebase_admin import firestore
-    _firestore_client = firestore.client()
-except Exception as _e:
-    _firestore_client = None
 
 class FileCollectionManager:
     def __init__(self, storage_file: str = "user_collections.json"):
@@ -269,19 +274,20 @@ class FirestoreCollectionManager:
             print(f"Error clearing Firestore user collection: {e}")
             return False
 
-# Global collection manager instance: prefer Firestore when available and reachable,
-# otherwise fall back to file-based storage.
-collection_manager = None  # type: ignore[assignment]
-
-if _firestore_client is not None:
-    try:
-        # Lightweight connectivity check similar to rewards.py
-        _firestore_client.collection("user_collections").limit(1).get()
-        print("✅ Firestore connection successful, using FirestoreCollectionManager")
-        collection_manager = FirestoreCollectionManager(_firestore_client)
-    except Exception as e:
-        print(f"⚠️ Firestore connection failed ({e}), falling back to FileCollectionManager")
-        collection_manager = FileCollectionManager()
-else:
+def _create_collection_manager():
+    """Prefer Firestore when available and reachable, otherwise fall back to file-based storage"""
+    firestore_client = _create_firestore_client()
+    if firestore_client is not None:
+        try:
+            # Lightweight connectivity check similar to rewards.py
+            firestore_client.collection("user_collections").limit(1).get()
+            print("✅ Firestore connection successful, using FirestoreCollectionManager")
+            return FirestoreCollectionManager(firestore_client)
+        except Exception as e:
+            print(f"⚠️ Firestore connection failed ({e}), falling back to FileCollectionManager")
+            return FileCollectionManager()
     print("Using FileCollectionManager (Firestore client not available)")
-    collection_manager = FileCollectionManager()
+    return FileCollectionManager()
+
+# Global collection manager instance, resolved by the startup warm-up task or on first use
+collection_manager = LazyResource("collection_manager", _create_collection_manager)
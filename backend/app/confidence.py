@@ -0,0 +1,21 @@
+"""
+Confidence Score
+
+The prompts ask for confidenceScore on a 0-100 scale. Tier routing, the species
+caches and the distillation harvester all read it through confidence_score().
+"""
+
+from typing import Optional
+
+
+def confidence_score(analysis: dict) -> Optional[float]:
+    """
+    confidenceScore on the prompt's 0-100 scale, or None when missing or malformed.
+    Some answers use a 0-1 fraction despite the prompt; only values strictly between
+    0 and 1 are read that way, so a genuine 1 (%) stays 1 and is not promoted to 100.
+    """
+    try:
+        score = float(analysis.get("confidenceScore"))
+    except (TypeError, ValueError):
+        return None
+    return score * 100 if 0 < score < 1 else score
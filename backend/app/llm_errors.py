@@ -0,0 +1,52 @@
+"""
+LLM Error Types
+
+Typed failures raised by the LLM clients instead of returning error strings,
+so callers can tell "retry later" apart from "this request is bad".
+"""
+
+from typing import Optional
+
+# Statuses worth retrying: throttling and transient upstream failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Base class for every LLM client failure"""
+    retryable = False
+
+
+class LLMTimeoutError(LLMError):
+    """The upstream did not answer within the attempt timeout"""
+    retryable = True
+
+
+class LLMConnectionError(LLMError):
+    """The upstream could not be reached"""
+    retryable = True
+
+
+class LLMHTTPError(LLMError):
+    """The upstream answered with a non-2xx status"""
+
+    def __init__(self, status_code: int, body: str = "", retry_after: Optional[float] = None):
+        super().__init__(f"LLM API returned HTTP {status_code}: {body[:300]}")
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRYABLE_STATUS_CODES
+
+
+class LLMResponseError(LLMError):
+    """The upstream answered but the payload had no usable text (blocked, truncated, malformed)"""
+
+
+class LLMOverloadedError(LLMError):
+    """A call could not get a local concurrency slot before its deadline"""
+
+
+class LLMCircuitOpenError(LLMError):
+    """The circuit breaker is open; the upstream is considered down and no call was made"""
@@ -4,6 +4,61 @@ import requests
 #TODO: get environment variables without dotenv package
 from dotenv import load_dotenv
 from typing import Optional
+from app.llm_governor import llm_governor, THROTTLE_STATUS_CODES
+from app.llm_resilience import llm_resilience
+from app.llm_errors import LLMTimeoutError, LLMConnectionError, LLMHTTPError, LLMResponseError
+
+def _post_once(url, payload, headers, timeout):
+    """One upstream attempt through the concurrency governor; raises typed LLM errors"""
+    with llm_governor.slot() as ticket:
+        try:
+            response = requests.post(url, json=payload, headers=headers, timeout=timeout)
+        except requests.exceptions.Timeout:
+            # An upstream that stops answering is overloaded too
+            ticket.throttled = True
+            raise LLMTimeoutError(f"LLM request timed out after {timeout:.0f} seconds")
+        except requests.exceptions.ConnectionError as e:
+            raise LLMConnectionError(f"Could not reach LLM API: {e}")
+        except requests.exceptions.RequestException as e:
+            # Broken or truncated responses (ChunkedEncodingError, ...) are transient transport failures too
+            raise LLMConnectionError(f"LLM request failed: {e}")
+
+        if response.status_code in THROTTLE_STATUS_CODES:
+            ticket.throttled = True
+        if not response.ok:
+            retry_after = response.headers.get("Retry-After")
+            raise LLMHTTPError(
+                response.status_code,
+                response.text,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        ticket.succeeded = True
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise LLMResponseError(f"LLM API returned invalid JSON: {e}")
+
+def send_request(url, payload, headers):
+    """POST to the LLM API with retries, optional hedging and circuit breaking; returns the JSON body"""
+    return llm_resilience.call(url, lambda timeout: _post_once(url, payload, headers, timeout))
+
+def _gemini_text(result, require_parts=False):
+    """Extract the generated text from a Gemini generateContent response"""
+    if "candidates" not in result or not result["candidates"]:
+        raise LLMResponseError(f"No candidates returned. Safety settings might have blocked it. Response: {result}")
+
+    candidate = result["candidates"][0]
+    if "content" not in candidate:
+        raise LLMResponseError(f"No content in candidate. Finish reason: {candidate.get('finishReason', 'unknown')}")
+
+    if require_parts and "parts" not in candidate["content"]:
+        raise LLMResponseError(f"No content parts in response. Finish reason: {candidate.get('finishReason', 'unknown')}")
+
+    try:
+        return str(candidate["content"]["parts"][0]["text"])
+    except (KeyError, IndexError) as e:
+        raise LLMResponseError(f"Error parsing API response: {e}\nResponse JSON: {result}")
 
 class LLM:
     def __init__(self):
@@ -37,13 +92,18 @@ class LLM:
     Act accordingly to character]
     """
 
-    def llm_contents(self, key, name, prompt, system_prompt=None, max_tokens=None)->list:
+    def llm_contents(self, key, name, prompt, system_prompt=None, max_tokens=None, history=None)->list:
+        """history: earlier (question, answer) turns of the conversation, oldest first"""
         payload = {
             "model": name,
             "messages": [],
         }
         if system_prompt:
             payload["messages"].append({"role": "system", "content": system_prompt})
+
+        for question, answer in history or []:
+            payload["messages"].append({"role": "user", "content": question})
+            payload["messages"].append({"role": "assistant", "content": answer})
         
         payload["messages"].append({"role": "user", "content": prompt})
 
@@ -59,31 +119,16 @@ class LLM:
 
     def get_output(self, url, llm_contents, mode='default'):
         payload, headers = llm_contents[0], llm_contents[1]
-        
+        result = send_request(url, payload, headers)
+
+        if mode == 'gemini':
+            return _gemini_text(result)
+
+        # Default mode for OpenAI-like APIs
         try:
-            # Add timeout to prevent hanging - 180 seconds should be sufficient for most LLM responses
-            response = requests.post(url, json=payload, headers=headers, timeout=180)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if mode == 'gemini':
-                if "candidates" not in result or not result["candidates"]:
-                    return f"Error: Prompt may have been blocked by safety settings. Response: {result}"
-                output = result["candidates"][0]["content"]["parts"][0]["text"]
-            else:  # Default mode for OpenAI-like APIs
-                output = result["choices"][0]["message"]["content"]
-                
-            return str(output)
-            
-        except requests.exceptions.HTTPError as e:
-            return f"HTTP Error: {e}\nResponse Content: {e.response.text}"
-        except requests.exceptions.Timeout:
-            return f"Request timed out after 180 seconds. The LLM service may be overloaded. Please try again later."
+            return str(result["choices"][0]["message"]["content"])
         except (KeyError, IndexError) as e:
-            return f"Error parsing API response: {e}\nResponse JSON: {result}"
-        except Exception as e:
-            return f'An unexpected error occurred: {e}'
+            raise LLMResponseError(f"Error parsing API response: {e}\nResponse JSON: {result}")
 
 class ImageLLM:
     def llm_contents(self, key, name, prompt, image_data=None, system_prompt=None, max_tokens=None)->list:
@@ -157,53 +202,24 @@ class ImageLLM:
 
     def get_output(self, url, llm_contents, mode='default'):
         payload, headers = llm_contents[0], llm_contents[1]
-        try:
-            # Add timeout to prevent hanging - 180 seconds for slower image analysis
-            response = requests.post(url, json=payload, headers=headers, timeout=180)
-            response.raise_for_status()
-
-            result = response.json()
-            
-            # Check if response was truncated due to token limit
-            if "candidates" in result and result["candidates"] and result["candidates"][0].get("finishReason") == "MAX_TOKENS":
-                # Still try to get content even if truncated
-                pass
-            
-            # Check if parts exist in the response
-            if "candidates" not in result or not result["candidates"]:
-                 return f"Error: No candidates returned. Safety settings might have blocked it. Response: {result}"
+        result = send_request(url, payload, headers)
 
-            if "content" not in result["candidates"][0]:
-                 return f"Error: No content in candidate. Finish reason: {result['candidates'][0].get('finishReason', 'unknown')}"
-            
-            if "parts" not in result["candidates"][0]["content"]:
-                return f"No content parts in response. Finish reason: {result['candidates'][0].get('finishReason', 'unknown')}"
-            
-            output = result["candidates"][0]["content"]["parts"][0]["text"]
-            return str(output)
-
-        except requests.exceptions.HTTPError as e:
-            error_msg = f"HTTP Error: {e}"
-            if e.response is not None:
-                error_msg += f"\nResponse Content: {e.response.text}"
-            return error_msg
-        except requests.exceptions.Timeout:
-            return f"Request timed out after 180 seconds. The LLM service may be overloaded. Please try again later."
-        except (KeyError, IndexError) as e:
-            return f"Error parsing API response: {e}\nResponse JSON: {result}"
-        except Exception as e:
-            return f'An unexpected error occurred: {e}'
+        # A MAX_TOKENS finish reason still carries usable (truncated) content
+        return _gemini_text(result, require_parts=True)
 
 class Gemini:
-    def llm_contents(self, key, name, prompt, system_prompt=None, max_tokens=None)->list:
+    def llm_contents(self, key, name, prompt, system_prompt=None, max_tokens=None, history=None)->list:
+        """history: earlier (question, answer) turns of the conversation, oldest first"""
         if system_prompt:
                 prompt = f"{system_prompt}\n\nUser Question: {prompt}"
         
         payload = {
-            "contents": [
-                {"role": "user", "parts": [{"text": prompt}]}
-            ],
+            "contents": [],
         }
+        for question, answer in history or []:
+            payload["contents"].append({"role": "user", "parts": [{"text": question}]})
+            payload["contents"].append({"role": "model", "parts": [{"text": answer}]})
+        payload["contents"].append({"role": "user", "parts": [{"text": prompt}]})
         
         payload["generationConfig"] = {
             "temperature": 0.2,
@@ -237,31 +253,5 @@ class Gemini:
     
     def get_output(self, url, llm_contents, mode='default'):
         payload, headers = llm_contents[0], llm_contents[1]
-        try:
-            # Add timeout to prevent hanging - 180 seconds
-            response = requests.post(url, json=payload, headers=headers, timeout=180)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if "candidates" not in result or not result["candidates"]:
-                 return f"Error: No candidates returned. Safety settings might have blocked it. Response: {result}"
-
-            if "content" not in result["candidates"][0]:
-                 return f"Error: No content in candidate. Finish reason: {result['candidates'][0].get('finishReason', 'unknown')}"
-
-            output = result["candidates"][0]["content"]["parts"][0]["text"]
-                
-            return str(output)
-            
-        except requests.exceptions.HTTPError as e:
-            error_msg = f"HTTP Error: {e}"
-            if e.response is not None:
-                error_msg += f"\nResponse Content: {e.response.text}"
-            return error_msg
-        except requests.exceptions.Timeout:
-            return f"Request timed out after 180 seconds. The LLM service may be overloaded. Please try again later."
-        except (KeyError, IndexError) as e:
-            return f"Error parsing API response: {e}\nResponse JSON: {result}"
-        except Exception as e:
-            return f'An unexpected error occurred: {e}'
+        result = send_request(url, payload, headers)
+        return _gemini_text(result)
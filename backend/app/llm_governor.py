@@ -0,0 +1,142 @@
+"""
+LLM Concurrency Governor
+
+Process-wide cap on simultaneous upstream LLM calls.
+
+The cap adapts AIMD-style (like TCP congestion control):
+- every successful call grows the limit by 1/limit, i.e. about +1 per "round" of calls
+- an upstream throttle (429/503) halves it, at most once per observed call latency,
+  so one burst of rejections from calls already in flight only counts once
+Callers beyond the limit wait in a queue until a slot frees up or their deadline
+passes, at which point they are shed with LLMOverloadedError instead of piling
+onto an upstream that is already rejecting work.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from dotenv import load_dotenv
+from app.llm_errors import LLMOverloadedError
+
+load_dotenv()
+
+# Upstream statuses that mean "slow down" rather than "this request is bad"
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+class GovernorTicket:
+    """Handed to the caller for one call; mark throttled=True on a 429/503"""
+
+    def __init__(self):
+        self.throttled = False
+        self.succeeded = False
+
+
+class ConcurrencyGovernor:
+    def __init__(self,
+                 initial_limit: float = 4,
+                 min_limit: float = 1,
+                 max_limit: float = 32,
+                 queue_timeout: float = 30.0,
+                 max_queue: int = 100,
+                 decrease_factor: float = 0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.decrease_factor = decrease_factor
+
+        self.in_flight = 0
+        self.queued = 0
+        self.shed_count = 0
+        self.throttled_count = 0
+        self.completed_count = 0
+        self._avg_latency = 1.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None):
+        """Block until a slot is free; raise LLMOverloadedError once the deadline passes"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            if self.queued >= self.max_queue:
+                self.shed_count += 1
+                raise LLMOverloadedError(f"LLM queue is full ({self.queued} waiting)")
+
+            self.queued += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed_count += 1
+                        raise LLMOverloadedError(f"No LLM slot available within {timeout:.0f}s (limit {int(self.limit)})")
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.queued -= 1
+
+    def release(self, throttled: bool = False, succeeded: bool = False, latency: Optional[float] = None):
+        """Free a slot and adapt the limit to the outcome of the call"""
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            if latency is not None:
+                self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+            if throttled:
+                self.throttled_count += 1
+                # Only back off once per latency period: calls that were already
+                # in flight when upstream started throttling report the same event
+                if now - self._last_decrease >= self._avg_latency:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    print(f"🐢 LLM throttled upstream, concurrency limit reduced to {int(self.limit)}")
+            elif succeeded:
+                self.completed_count += 1
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[GovernorTicket]:
+        """Hold one concurrency slot for the duration of an upstream call"""
+        self.acquire(timeout)
+        ticket = GovernorTicket()
+        start = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            self.release(throttled=ticket.throttled, succeeded=ticket.succeeded, latency=time.monotonic() - start)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "limit_exact": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "shed": self.shed_count,
+                "throttled": self.throttled_count,
+                "completed": self.completed_count,
+                "avg_latency_seconds": round(self._avg_latency, 3),
+            }
+
+
+def _governor_from_env() -> ConcurrencyGovernor:
+    return ConcurrencyGovernor(
+        initial_limit=float(os.getenv("LLM_INITIAL_CONCURRENCY", 4)),
+        min_limit=float(os.getenv("LLM_MIN_CONCURRENCY", 1)),
+        max_limit=float(os.getenv("LLM_MAX_CONCURRENCY", 32)),
+        queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", 30)),
+        max_queue=int(os.getenv("LLM_MAX_QUEUE", 100)),
+    )
+
+# Global governor shared by every LLM client in the process
+llm_governor = _governor_from_env()
@@ -0,0 +1,94 @@
+"""
+LLM Client Registry
+
+Builds the LLM endpoints and clients once from configuration and hands out an
+immutable snapshot, so the request hot path never re-reads .env or constructs
+clients. Sending SIGHUP to the process re-reads .env and atomically swaps in a
+new snapshot; calls already in flight keep the snapshot they started with.
+"""
+
+import os
+import signal
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+from app.llm_framework import LLM, Gemini, ImageLLM
+
+
+@dataclass(frozen=True)
+class LLMEndpoint:
+    key: Optional[str]
+    name: Optional[str]
+    url: Optional[str]
+
+    @property
+    def is_gemini(self) -> bool:
+        return "generativelanguage.googleapis.com" in (self.url or "")
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    main: LLMEndpoint
+    fast: Optional[LLMEndpoint]  # optional cheaper tier tried before main
+    escalation_confidence: float  # fast-tier answers below this confidenceScore (0-100) escalate
+    text_client: LLM  # OpenAI-compatible chat client
+    gemini_client: Gemini
+    image_client: ImageLLM
+
+    def chat_client(self, mode: str = "default"):
+        """Client for text generation against the main endpoint"""
+        if mode == "gemini" or self.main.is_gemini:
+            return self.gemini_client
+        return self.text_client
+
+
+def load_llm_config() -> LLMConfig:
+    """Read LLM settings from the environment (and .env) into a new snapshot"""
+    load_dotenv(override=True)
+    main = LLMEndpoint(os.getenv('LLM_KEY'), os.getenv('LLM_NAME'), os.getenv('LLM_URL'))
+    fast = None
+    if os.getenv('LLM_FAST_URL'):
+        fast = LLMEndpoint(os.getenv('LLM_FAST_KEY') or main.key, os.getenv('LLM_FAST_NAME'), os.getenv('LLM_FAST_URL'))
+
+    return LLMConfig(
+        main=main,
+        fast=fast,
+        escalation_confidence=float(os.getenv('LLM_ESCALATION_CONFIDENCE', 70)),
+        text_client=LLM(),
+        gemini_client=Gemini(),
+        image_client=ImageLLM(),
+    )
+
+
+class LLMRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = load_llm_config()
+
+    @property
+    def current(self) -> LLMConfig:
+        return self._current
+
+    def reload(self) -> LLMConfig:
+        """Re-read configuration and swap the snapshot in one reference assignment"""
+        with self._lock:
+            try:
+                self._current = load_llm_config()
+                print(f"🔄 LLM configuration reloaded (main: {self._current.main.name}, fast: {self._current.fast.name if self._current.fast else 'none'})")
+            except Exception as e:
+                print(f"⚠️ LLM configuration reload failed, keeping previous settings: {e}")
+            return self._current
+
+    def install_sighup_handler(self):
+        """Reload on SIGHUP. Must be called from the main thread; a no-op where SIGHUP does not exist."""
+        if not hasattr(signal, "SIGHUP"):
+            return
+        try:
+            # Reload off the signal handler so a second SIGHUP cannot deadlock on the lock
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.reload, daemon=True).start())
+        except ValueError as e:
+            print(f"⚠️ Could not install SIGHUP handler for LLM reload: {e}")
+
+# Global registry, built once at import
+llm_registry = LLMRegistry()
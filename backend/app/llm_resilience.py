@@ -0,0 +1,252 @@
+"""
+LLM Resilience Layer
+
+Wraps a single upstream attempt with:
+- a per-endpoint circuit breaker that fails fast while the upstream is down
+- jittered exponential retries for retryable failures, within a total time budget
+- optional hedging: if the first attempt is slower than the recent p95 latency,
+  a second identical attempt is started and whichever answers first wins
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Deque, Dict, Optional, TypeVar
+from dotenv import load_dotenv
+from app.llm_errors import LLMError, LLMHTTPError, LLMCircuitOpenError, LLMOverloadedError
+
+load_dotenv()
+
+T = TypeVar("T")
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe through after a cooldown"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Give back a half-open probe that never reached the upstream"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔌 LLM circuit opened after {self.consecutive_failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of recent successful attempt latencies"""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self.samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 attempt_timeout: float = 90.0,
+                 total_timeout: float = 180.0,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 hedge: bool = False,
+                 hedge_min_samples: int = 20,
+                 hedge_max_workers: int = 16):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedged_count = 0
+        self.hedge_wins = 0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=hedge_max_workers, thread_name_prefix="llm-hedge") if hedge else None
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._latencies[endpoint] = LatencyTracker()
+            return self._breakers[endpoint]
+
+    def is_available(self, endpoint: str) -> bool:
+        """False while the endpoint's circuit is open (a half-open probe is not consumed)"""
+        breaker = self.breaker(endpoint)
+        return breaker.state != CircuitBreaker.OPEN or time.monotonic() - breaker.opened_at >= breaker.reset_timeout
+
+    def _backoff(self, attempt: int, error: LLMError) -> float:
+        # Full jitter keeps synchronized clients from retrying in lockstep
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if isinstance(error, LLMHTTPError) and error.retry_after:
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def call(self, endpoint: str, attempt_fn: Callable[[float], T]) -> T:
+        """
+        Run attempt_fn(timeout) until it succeeds, a non-retryable error occurs,
+        attempts run out or the total budget is spent. Raises LLMError subclasses only.
+        """
+        breaker = self.breaker(endpoint)
+        deadline = time.monotonic() + self.total_timeout
+        last_error: Optional[LLMError] = None
+
+        for attempt in range(self.max_attempts):
+            if not breaker.allow():
+                raise LLMCircuitOpenError(f"LLM circuit is open for {endpoint}; skipping call") from last_error
+            recorded = False
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                result = self._attempt(endpoint, attempt_fn, min(self.attempt_timeout, remaining))
+                breaker.record_success()
+                recorded = True
+                return result
+            except LLMOverloadedError:
+                # Local back-pressure says nothing about upstream health
+                raise
+            except LLMError as e:
+                last_error = e
+                recorded = True
+                if not e.retryable:
+                    # The upstream is up; the request itself is bad
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+            finally:
+                # Every exit that says nothing about the upstream gives a half-open probe back,
+                # otherwise the breaker would refuse all later calls
+                if not recorded:
+                    breaker.release_probe()
+
+            delay = self._backoff(attempt, last_error)
+            if attempt + 1 >= self.max_attempts or time.monotonic() + delay >= deadline:
+                break
+            print(f"🔁 LLM attempt {attempt + 1} failed ({last_error}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        raise last_error or LLMError("LLM call budget exhausted before any attempt")
+
+    def _attempt(self, endpoint: str, attempt_fn: Callable[[float], T], timeout: float) -> T:
+        tracker = self._latencies[endpoint]
+        hedge_delay = tracker.percentile(0.95) if (self._pool and len(tracker.samples) >= self.hedge_min_samples) else None
+
+        if hedge_delay is None:
+            start = time.monotonic()
+            result = attempt_fn(timeout)
+            tracker.record(time.monotonic() - start)
+            return result
+
+        start = time.monotonic()
+        primary = self._pool.submit(attempt_fn, timeout)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            result = primary.result()
+            tracker.record(time.monotonic() - start)
+            return result
+
+        self.hedged_count += 1
+        hedge = self._pool.submit(attempt_fn, max(0.1, timeout - hedge_delay))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.hedge_wins += 1
+                    tracker.record(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self) -> Dict:
+        with self._lock:
+            endpoints = dict(self._breakers)
+        return {
+            "hedging": self.hedge,
+            "hedged": self.hedged_count,
+            "hedge_wins": self.hedge_wins,
+            "circuits": {
+                endpoint: {
+                    "state": breaker.state,
+                    "consecutive_failures": breaker.consecutive_failures,
+                    "p95_latency_seconds": self._latencies[endpoint].percentile(0.95),
+                }
+                for endpoint, breaker in endpoints.items()
+            },
+        }
+
+
+def _caller_from_env() -> ResilientCaller:
+    return ResilientCaller(
+        max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", 3)),
+        base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+        max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 8)),
+        attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", 90)),
+        total_timeout=float(os.getenv("LLM_TOTAL_TIMEOUT", 180)),
+        failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_TIMEOUT", 30)),
+        hedge=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+    )
+
+# Global resilience layer shared by every LLM client in the process
+llm_resilience = _caller_from_env()
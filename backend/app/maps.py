@@ -2,19 +2,67 @@
 Map Markers Management Module
 
 This module handles map marker storage and retrieval.
+
+Incremental sync:
+- Every change bumps a monotonically increasing revision; each marker and each
+  removal tombstone records the revision it was written at
+- Markers and tombstones are kept in append order, so "what changed since X"
+  is a binary search over the parallel key lists instead of a scan
+- The current revision doubles as the ETag of the full marker list
 """
 
 import json
 import os
 import uuid
-from typing import Dict, List, Optional
+import zlib
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
-from app.schemas import MapMarker, CreateMarkerRequest
+from app.schemas import MapMarker, CreateMarkerRequest, MapMarkersDelta
+
+# Oldest tombstones are dropped beyond this; clients behind that point get a full resync
+MAX_TOMBSTONES = 1000
+
+# Export tuning: bytes buffered per yielded chunk
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _parse_timestamp(value) -> datetime:
+    """Coerce a stored timestamp into a naive local datetime for ordering"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    True when an If-None-Match header matches etag. Uses the weak comparison
+    If-None-Match calls for, so W/"..." validators (as rewritten by compressing
+    proxies) match, and "*" matches any current list.
+    """
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
 
 class MapManager:
     def __init__(self, storage_file: str = "map_markers.json"):
         self.storage_file = storage_file
         self.markers: List[Dict] = []
+        self.tombstones: List[Dict] = []
+        self.revision = 0
+        # Highest revision whose tombstone has been discarded
+        self.tombstone_floor = 0
+        # Parallel, append-ordered sort keys for bisect lookups
+        self._marker_revs: List[int] = []
+        self._marker_times: List[datetime] = []
+        self._tombstone_revs: List[int] = []
+        self._tombstone_times: List[datetime] = []
+        self._lock = threading.RLock()
         self.load_markers()
 
     def load_markers(self):
@@ -23,19 +71,68 @@ class MapManager:
             if os.path.exists(self.storage_file):
                 with open(self.storage_file, 'r') as f:
                     data = json.load(f)
-                    self.markers = data
+                # Legacy files hold a bare list of markers
+                if isinstance(data, list):
+                    data = {"revision": 0, "markers": data, "tombstones": []}
+                self.markers = data.get("markers", [])
+                self.tombstones = data.get("tombstones", [])
+                self.revision = int(data.get("revision", 0))
+                self.tombstone_floor = int(data.get("tombstone_floor", 0))
+            self._rebuild_index()
         except Exception as e:
             print(f"Error loading markers: {e}")
             self.markers = []
+            self.tombstones = []
+            self.revision = 0
+            self.tombstone_floor = 0
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Assign revisions to legacy markers, drop unreadable records and rebuild the bisect keys"""
+        markers = []
+        for m in self.markers:
+            try:
+                m['timestamp'] = _parse_timestamp(m['timestamp'])
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                print(f"Skipping stored marker {m.get('id')} without a valid timestamp: {e!r}")
+                continue
+            if 'rev' not in m:
+                self.revision += 1
+                m['rev'] = self.revision
+            markers.append(m)
+        tombstones = []
+        for t in self.tombstones:
+            try:
+                t['removed_at'] = _parse_timestamp(t['removed_at'])
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                print(f"Skipping stored tombstone {t.get('id')} without a valid removal time: {e!r}")
+                continue
+            tombstones.append(t)
+        self.markers, self.tombstones = markers, tombstones
+        self.revision = max([self.revision] + [m['rev'] for m in self.markers] + [t['rev'] for t in self.tombstones])
+        self._marker_revs = [m['rev'] for m in self.markers]
+        self._marker_times = [m['timestamp'] for m in self.markers]
+        self._tombstone_revs = [t['rev'] for t in self.tombstones]
+        self._tombstone_times = [t['removed_at'] for t in self.tombstones]
 
     def save_markers(self):
         """Save markers to JSON file"""
         try:
             with open(self.storage_file, 'w') as f:
-                json.dump(self.markers, f, default=str, indent=2)
+                json.dump({
+                    "revision": self.revision,
+                    "tombstone_floor": self.tombstone_floor,
+                    "markers": self.markers,
+                    "tombstones": self.tombstones
+                }, f, default=str, indent=2)
         except Exception as e:
             print(f"Error saving markers: {e}")
 
+    @property
+    def etag(self) -> str:
+        """Entity tag of the full marker list; changes whenever the list does"""
+        return f'"markers-{self.revision}"'
+
     def add_marker(self, user_id: str, user_name: str, marker_data: CreateMarkerRequest) -> Optional[MapMarker]:
         """Add a new marker to the map"""
         try:
@@ -45,13 +142,13 @@ class MapManager:
             TEXAS_MIN_LON = -106.646641
             TEXAS_MAX_LON = -93.508039
 
-            if not (TEXAS_MIN_LAT <= marker_data.latitude <= TEXAS_MAX_LAT and 
+            if not (TEXAS_MIN_LAT <= marker_data.latitude <= TEXAS_MAX_LAT and
                     TEXAS_MIN_LON <= marker_data.longitude <= TEXAS_MAX_LON):
                 raise ValueError("Location is outside of Texas. Markers can only be placed within Texas.")
 
             marker_id = str(uuid.uuid4())
             timestamp = datetime.now()
-            
+
             new_marker = MapMarker(
                 id=marker_id,
                 user_id=user_id,
@@ -63,12 +160,17 @@ class MapManager:
                 timestamp=timestamp,
                 scan_id=marker_data.scan_id
             )
-            
+
             # Convert to dict for storage
             marker_dict = new_marker.dict()
-            self.markers.append(marker_dict)
-            self.save_markers()
-            
+            with self._lock:
+                self.revision += 1
+                marker_dict['rev'] = self.revision
+                self.markers.append(marker_dict)
+                self._marker_revs.append(self.revision)
+                self._marker_times.append(timestamp)
+                self.save_markers()
+
             return new_marker
         except ValueError:
             # Re-raise ValueError for API handling
@@ -77,19 +179,169 @@ class MapManager:
             print(f"Error adding marker: {e}")
             return None
 
+    def remove_marker(self, marker_id: str, user_id: str) -> bool:
+        """Remove a marker owned by user_id, leaving a tombstone for delta sync"""
+        with self._lock:
+            for i, m in enumerate(self.markers):
+                if m.get('id') != marker_id:
+                    continue
+                if m.get('user_id') != user_id:
+                    raise PermissionError("Markers can only be removed by the user who placed them.")
+
+                del self.markers[i]
+                del self._marker_revs[i]
+                del self._marker_times[i]
+
+                self.revision += 1
+                removed_at = datetime.now()
+                self.tombstones.append({"id": marker_id, "rev": self.revision, "removed_at": removed_at})
+                self._tombstone_revs.append(self.revision)
+                self._tombstone_times.append(removed_at)
+                if len(self.tombstones) > MAX_TOMBSTONES:
+                    drop = len(self.tombstones) - MAX_TOMBSTONES
+                    self.tombstone_floor = self._tombstone_revs[drop - 1]
+                    del self.tombstones[:drop]
+                    del self._tombstone_revs[:drop]
+                    del self._tombstone_times[:drop]
+
+                self.save_markers()
+                return True
+        return False
+
     def get_all_markers(self) -> List[MapMarker]:
         """Get all map markers"""
         try:
-            markers_list = []
-            for m in self.markers:
-                # Handle datetime conversion if needed
-                if isinstance(m.get('timestamp'), str):
-                    m['timestamp'] = datetime.fromisoformat(m['timestamp'].replace('Z', '+00:00'))
-                markers_list.append(MapMarker(**m))
-            return markers_list
+            with self._lock:
+                markers = list(self.markers)
+            return [self._to_marker(m) for m in markers]
         except Exception as e:
             print(f"Error getting markers: {e}")
             return []
 
+    def get_all_markers_with_etag(self) -> Tuple[List[MapMarker], str]:
+        """Get all markers together with the ETag of that exact snapshot"""
+        with self._lock:
+            markers = list(self.markers)
+            etag = self.etag
+        return [self._to_marker(m) for m in markers], etag
+
+    def get_markers_delta(self, cursor: Optional[int] = None, since: Optional[datetime] = None) -> MapMarkersDelta:
+        """
+        Get markers added and removed after a revision cursor or a timestamp.
+        The returned cursor is what the client should send on its next poll.
+        """
+        with self._lock:
+            if cursor is None and since is None:
+                cursor = 0
+
+            if cursor is not None:
+                # A cursor from a newer store (e.g. file was reset) or one older than
+                # the retained tombstones cannot be served incrementally
+                if cursor > self.revision or cursor < self.tombstone_floor:
+                    cursor = 0
+                reset = cursor == 0
+                added = self.markers[bisect_right(self._marker_revs, cursor):]
+                removed = [] if cursor == 0 else self.tombstones[bisect_right(self._tombstone_revs, cursor):]
+            else:
+                since = _parse_timestamp(since)
+                # Removals older than the retained tombstones are unknown, so resync
+                reset = self.tombstone_floor > 0 and since < self._tombstone_times[0]
+                if reset:
+                    added, removed = self.markers, []
+                else:
+                    added = self.markers[bisect_right(self._marker_times, since):]
+                    removed = self.tombstones[bisect_right(self._tombstone_times, since):]
+
+            return MapMarkersDelta(
+                added=[self._to_marker(m) for m in added],
+                removed=[t['id'] for t in removed],
+                cursor=self.revision,
+                reset=reset
+            )
+
+    def iter_markers(self) -> Iterator[Dict]:
+        """
+        Yield stored marker dicts in insertion order from one consistent snapshot.
+        Only the list of references is copied under the lock (stored dicts are never
+        mutated), so a removal during a long export cannot shift markers past it.
+        """
+        with self._lock:
+            snapshot = list(self.markers)
+        yield from snapshot
+
+    def _to_marker(self, m: Dict) -> MapMarker:
+        return MapMarker(**{k: v for k, v in m.items() if k != 'rev'})
+
+def _export_properties(m: Dict) -> Dict:
+    ts = m.get('timestamp')
+    return {
+        "id": m.get('id'),
+        "user_id": m.get('user_id'),
+        "user_name": m.get('user_name'),
+        "plant_name": m.get('plant_name'),
+        "is_invasive": m.get('is_invasive'),
+        "timestamp": ts.isoformat() if isinstance(ts, datetime) else ts,
+        "scan_id": m.get('scan_id'),
+    }
+
+
+def _iter_geojson(markers: Iterator[Dict]) -> Iterator[str]:
+    yield '{"type":"FeatureCollection","features":['
+    separator = ''
+    for m in markers:
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [m.get('longitude'), m.get('latitude')]},
+            "properties": _export_properties(m),
+        }
+        yield separator + json.dumps(feature, default=str)
+        separator = ','
+    yield ']}\n'
+
+
+def _iter_ndjson(markers: Iterator[Dict]) -> Iterator[str]:
+    for m in markers:
+        record = _export_properties(m)
+        record["latitude"] = m.get('latitude')
+        record["longitude"] = m.get('longitude')
+        yield json.dumps(record, default=str) + '\n'
+
+
+EXPORT_FORMATS = {
+    "geojson": (_iter_geojson, "application/geo+json"),
+    "ndjson": (_iter_ndjson, "application/x-ndjson"),
+}
+
+
+def export_markers(manager: "MapManager", fmt: str = "geojson", compress: bool = False) -> Iterator[bytes]:
+    """
+    Stream every marker as GeoJSON or NDJSON bytes, optionally gzip-compressed.
+    Records are serialized straight from storage and flushed in bounded chunks,
+    so memory use does not grow with the number of markers.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    serializer, _ = EXPORT_FORMATS[fmt]
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 -> gzip container
+
+    buffer: List[bytes] = []
+    buffered = 0
+    for piece in serializer(manager.iter_markers()):
+        data = piece.encode('utf-8')
+        if compressor:
+            data = compressor.compress(data)
+            if not data:
+                continue
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= EXPORT_CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+
+    if compressor:
+        buffer.append(compressor.flush())
+    if buffer:
+        yield b''.join(buffer)
+
 # Singleton instance
 map_manager = MapManager()
@@ -1,10 +1,16 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.transforms as transforms
-from PIL import Image
-import io
+import hashlib
+import json
 import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+import numpy as np
+from app.preprocessing import PreparedImage, preprocessor
+from app.torch_serving import configure_torch
 
 # 1. Define your CNN Architecture
 class PlantClassifier(nn.Module):
@@ -25,7 +31,8 @@ class PlantClassifier(nn.Module):
         # Dropout regularization (needed to load state_dict even if not used in eval)
         self.dropout = nn.Dropout(0.5)
 
-    def forward(self, X):
+    def features(self, X):
+        """Penultimate activations (fc2, 67 values): the image embedding the species index compares"""
         # Conv1 -> ReLU -> MaxPool
         X = F.relu(self.conv1(X))
         X = F.max_pool2d(X, 2, 2) # 62x62 -> 31x31
@@ -35,42 +42,265 @@ class PlantClassifier(nn.Module):
         X = F.max_pool2d(X, 2, 2) # 29x29 -> 14x14
         
         # Flatten
-        X = X.view(-1, 16 * 14 * 14) # 3136
+        X = X.reshape(-1, 16 * 14 * 14) # 3136 (reshape: quantized convs return channels-last tensors)
         
         # FC Layers with Dropout
         X = F.relu(self.fc1(X))
         X = self.dropout(X) # Dropout
-        X = F.relu(self.fc2(X))
+        return F.relu(self.fc2(X))
+
+    def forward(self, X):
+        X = self.features(X)
         X = self.dropout(X) # Dropout
         X = self.fc3(X)
         return X
 
+# Runtime backends
+# Each backend wraps one way of executing the classifier and maps a normalized
+# (N, 3, 64, 64) float tensor to (N, 2) logits. PLANT_CLASSIFIER_RUNTIME picks
+# one of "eager", "torchscript", "onnx" or "int8"; "auto" (default) takes the
+# fastest float runtime available on this machine and falls back down the list.
+# int8 (see quantize_model.py) trades a little accuracy, so it is opt-in only.
+INPUT_SHAPE = (1, 3, 64, 64)
+EMBEDDING_DIM = 67  # PlantClassifier.features() width
+RUNTIME_PREFERENCE = ("onnx", "torchscript", "eager")
+DEFAULT_MODEL_PATH = "models/plant_classifier.pth"
+INT8_METADATA = "quantization.json"  # extra file inside the int8 TorchScript archive
+# SHA-256 of the .pth an artifact was exported from: a TorchScript extra file and
+# an ONNX metadata property. Artifacts whose digest does not match the current
+# weights (retrained, or exported before digests were recorded) are not served.
+WEIGHTS_DIGEST = "weights.sha256"
+
+
+def artifact_paths(weights_path: str) -> dict:
+    """Artifacts live next to the state dict: plant_classifier.{torchscript.pt,onnx,int8.pt,thresholds.json,...}"""
+    stem, _ = os.path.splitext(weights_path)
+    return {
+        "torchscript": f"{stem}.torchscript.pt",
+        "onnx": f"{stem}.onnx",
+        "int8": f"{stem}.int8.pt",
+        "thresholds": f"{stem}.thresholds.json",
+        "species_similarity": f"{stem}.species_similarity.json",
+    }
+
+
+def weights_digest(weights_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(weights_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# abspath -> state dict whose storages live in shared memory (see preload_weights)
+_shared_weights = {}
+
+
+def preload_weights(model_path: str = DEFAULT_MODEL_PATH) -> dict:
+    """
+    Load the state dict into shared memory in the parent process (gunicorn master
+    with preload_app). Eager models built in workers forked afterwards
+    (load_eager_model) adopt these same pages instead of each reading and holding
+    a private copy. TorchScript freezing and ONNX/int8 artifacts always hold their
+    own weights, so they gain nothing from preloading.
+    """
+    path = os.path.abspath(_resolve_model_path(model_path))
+    if path not in _shared_weights:
+        state_dict = torch.load(path, map_location="cpu")
+        for tensor in state_dict.values():
+            tensor.share_memory_()
+        _shared_weights[path] = state_dict
+        print(f"📌 Plant Classifier weights preloaded into shared memory from {path}")
+    return _shared_weights[path]
+
+
+def load_eager_model(weights_path: str) -> PlantClassifier:
+    net = PlantClassifier()
+    shared = _shared_weights.get(os.path.abspath(weights_path))
+    if shared is not None:
+        # assign=True adopts the shared tensors as parameters rather than copying into new ones
+        net.load_state_dict(shared, assign=True)
+    else:
+        net.load_state_dict(torch.load(weights_path, map_location="cpu"))
+    return net.eval()
+
+
+def to_torchscript(net: nn.Module) -> torch.jit.ScriptModule:
+    """Trace and freeze: weights become constants and dropout is dropped from the graph"""
+    net = net.eval()
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(net, torch.zeros(INPUT_SHAPE)))
+
+
+def export_torchscript(net: nn.Module, path: str, digest: str = "") -> str:
+    """digest is weights_digest() of the .pth net was loaded from"""
+    # Saved frozen but not optimized: optimize_for_inference rewrites to
+    # machine-specific ops that do not survive save/load, so it runs at load time
+    torch.jit.save(to_torchscript(net), path, _extra_files={WEIGHTS_DIGEST: digest})
+    return path
+
+
+def export_onnx(net: nn.Module, path: str, digest: str = "") -> str:
+    """ONNX graph with a dynamic batch axis, for onnxruntime; digest as for export_torchscript"""
+    import onnx  # required by torch.onnx.export anyway
+    torch.onnx.export(
+        net.eval(), torch.zeros(INPUT_SHAPE), path,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17, dynamo=False,
+    )
+    graph = onnx.load(path)
+    onnx.helper.set_model_props(graph, {WEIGHTS_DIGEST: digest})
+    onnx.save(graph, path)
+    return path
+
+
+class EagerRuntime:
+    name = "eager"
+
+    def __init__(self, weights_path: str):
+        self.model = load_eager_model(weights_path).to(device)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(batch.to(device))
+
+
+class TorchScriptRuntime:
+    name = "torchscript"
+
+    def __init__(self, weights_path: str):
+        path = artifact_paths(weights_path)["torchscript"]
+        frozen = None
+        if os.path.exists(path):
+            extra_files = {WEIGHTS_DIGEST: ""}
+            frozen = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+            self.source = path
+            exported_from = extra_files[WEIGHTS_DIGEST]
+            if isinstance(exported_from, bytes):
+                exported_from = exported_from.decode()
+            if exported_from != weights_digest(weights_path):
+                print(f"⚠️ {path} was not exported from the current {weights_path}, ignoring it")
+                frozen = None
+        if frozen is None:
+            # No up-to-date exported artifact: freezing in-process is cheap for this network
+            frozen = to_torchscript(load_eager_model(weights_path))
+            self.source = f"{weights_path} (traced at startup)"
+        self.model = torch.jit.optimize_for_inference(frozen)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(batch.cpu())
+
+
+class OnnxRuntime:
+    name = "onnx"
+
+    def __init__(self, weights_path: str):
+        import onnxruntime as ort  # optional dependency
+        path = artifact_paths(weights_path)["onnx"]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found (run `python train_model.py --export`)")
+        config = configure_torch()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = config.intra_op_threads
+        options.inter_op_num_threads = config.inter_op_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        if self.session.get_modelmeta().custom_metadata_map.get(WEIGHTS_DIGEST) != weights_digest(weights_path):
+            raise ValueError(f"{path} was not exported from the current {weights_path} (run `python train_model.py --export`)")
+        self.source = path
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        logits = self.session.run(None, {"input": batch.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+class Int8Runtime:
+    name = "int8"
+
+    def __init__(self, weights_path: str):
+        path = artifact_paths(weights_path)["int8"]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found (run `python quantize_model.py`)")
+        extra_files = {INT8_METADATA: ""}
+        self.model = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+        self.metadata = json.loads(extra_files[INT8_METADATA] or "{}")
+        # Kernels must come from the engine the model was quantized for
+        engine = self.metadata.get("engine")
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+        self.source = f"{path} ({self.metadata.get('mode', 'unknown')} quantization)"
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(batch.cpu())
+
+
+RUNTIMES = {"eager": EagerRuntime, "torchscript": TorchScriptRuntime, "onnx": OnnxRuntime, "int8": Int8Runtime}
+
+
+def create_runtime(weights_path: str, name: str = "auto"):
+    """Build the requested runtime; "auto" tries RUNTIME_PREFERENCE in order"""
+    if name != "auto":
+        return RUNTIMES[name](weights_path)
+    for candidate in RUNTIME_PREFERENCE:
+        try:
+            return RUNTIMES[candidate](weights_path)
+        except Exception as e:
+            print(f"⚠️ Plant Classifier runtime '{candidate}' unavailable: {e}")
+    raise RuntimeError("No plant classifier runtime could be loaded")
+
+
+def warm_up_runtime(runtime, iterations: int) -> float:
+    """Run a few dummy batches so lazy initialisation (allocators, TorchScript
+    profiling runs, ORT kernel setup) happens before the first real request.
+    Returns the slowest pass in seconds."""
+    slowest = 0.0
+    batch = torch.zeros(INPUT_SHAPE)
+    for _ in range(iterations):
+        start = time.perf_counter()
+        runtime(batch)
+        slowest = max(slowest, time.perf_counter() - start)
+    return slowest
+
+
 # Global instance
 model = None
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-def load_model(model_path="models/plant_classifier.pth"):
+def _resolve_model_path(model_path: str) -> str:
+    # Check if we are running from backend directory or root
+    if not os.path.exists(model_path):
+        # Try absolute path based on current file location
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        # app/ -> backend/ -> models/
+        alt_path = os.path.join(current_dir, "..", "models", "plant_classifier.pth")
+        if os.path.exists(alt_path):
+            return alt_path
+    return model_path
+
+def load_model(model_path=DEFAULT_MODEL_PATH, runtime=None):
     """
-    Loads the trained model weights.
-    Call this on application startup.
+    Loads the trained model with the configured runtime (PLANT_CLASSIFIER_RUNTIME)
+    and warms it up. Call this on application startup.
     """
-    global model
+    global model, thresholds
+    runtime = runtime or os.getenv("PLANT_CLASSIFIER_RUNTIME", "auto").lower()
+    if device.type != "cpu" and runtime == "auto":
+        runtime = "eager"  # the exported CPU artifacts would leave the GPU idle
     try:
-        # Check if we are running from backend directory or root
-        if not os.path.exists(model_path):
-            # Try absolute path based on current file location
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            # app/ -> backend/ -> models/
-            alt_path = os.path.join(current_dir, "..", "models", "plant_classifier.pth")
-            if os.path.exists(alt_path):
-                model_path = alt_path
-
-        model = PlantClassifier()
+        config = configure_torch()
+        model_path = _resolve_model_path(model_path)
+
         if os.path.exists(model_path):
-            model.load_state_dict(torch.load(model_path, map_location=device))
-            model.to(device)
-            model.eval()
-            print(f"✅ Plant Classifier loaded from {model_path}")
+            loaded = create_runtime(model_path, runtime)
+            slowest = warm_up_runtime(loaded, config.warmup_iterations)
+            thresholds = load_thresholds(model_path)
+            model = loaded
+            print(f"✅ Plant Classifier loaded from {getattr(model, 'source', model_path)} ({model.name} runtime, "
+                  f"warm-up {config.warmup_iterations} passes, slowest {slowest * 1000:.1f} ms)")
+            print(f"🎚️ Plant thresholds: accept >= {thresholds.accept}, reject < {thresholds.reject} ({thresholds.source})")
         else:
             print(f"⚠️ Warning: Model file not found at {model_path}. Classifier will not work.")
             model = None
@@ -78,52 +308,154 @@ def load_model(model_path="models/plant_classifier.pth"):
         print(f"❌ Failed to load Plant Classifier: {e}")
         model = None
 
-def is_plant(image_bytes: bytes) -> bool:
+# Three-way verdict on the plant probability:
+#   p >= accept            -> PLANT      (CNN vouches for the image; LLM identifies the species)
+#   p <  reject            -> NOT_PLANT  (rejected here, the LLM is never called)
+#   reject <= p < accept   -> UNCERTAIN  (gray band: no CNN verdict, the LLM decides)
+# Thresholds come from models/plant_classifier.thresholds.json (tune_thresholds.py)
+# and can be overridden with PLANT_ACCEPT_THRESHOLD / PLANT_REJECT_THRESHOLD.
+PLANT = "plant"
+NOT_PLANT = "not_plant"
+UNCERTAIN = "uncertain"
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    accept: float = 0.5
+    reject: float = 0.5  # equal to accept: no gray band, the original 0.5 cut-off
+    source: str = "default"
+
+    def verdict(self, plant_probability: float) -> str:
+        if plant_probability >= self.accept:
+            return PLANT
+        if plant_probability < self.reject:
+            return NOT_PLANT
+        return UNCERTAIN
+
+
+@dataclass
+class PlantPrediction:
+    verdict: str
+    plant_probability: Optional[float]  # None when the classifier could not run
+    latency_ms: float
+    runtime: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def is_plant(self) -> bool:
+        """Whether the image may proceed to analysis (accepted or gray band)"""
+        return self.verdict != NOT_PLANT
+
+    def to_dict(self) -> dict:
+        result = {
+            "verdict": self.verdict,
+            "plantProbability": self.plant_probability,
+            "latencyMs": round(self.latency_ms, 2),
+            "runtime": self.runtime,
+        }
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+def load_thresholds(model_path: str = DEFAULT_MODEL_PATH) -> Thresholds:
+    values, source = {}, "default"
+    path = artifact_paths(_resolve_model_path(model_path))["thresholds"]
+    if os.path.exists(path):
+        with open(path) as f:
+            values = json.load(f)
+        source = path
+    accept = float(os.getenv("PLANT_ACCEPT_THRESHOLD", values.get("accept", Thresholds.accept)))
+    reject = float(os.getenv("PLANT_REJECT_THRESHOLD", values.get("reject", Thresholds.reject)))
+    if os.getenv("PLANT_ACCEPT_THRESHOLD") or os.getenv("PLANT_REJECT_THRESHOLD"):
+        source = "environment"
+    if reject > accept:
+        print(f"⚠️ PLANT_REJECT_THRESHOLD {reject} is above PLANT_ACCEPT_THRESHOLD {accept}; using {accept} for both")
+        reject = accept
+    return Thresholds(accept=accept, reject=reject, source=source)
+
+
+thresholds = Thresholds()
+
+
+def load_species_similarity(model_path: str = DEFAULT_MODEL_PATH) -> Optional[float]:
+    """
+    Cosine similarity the species index may trust for these weights, from
+    models/plant_classifier.species_similarity.json (calibrate_species_index.py).
+    None when there is no calibration or it was measured on other weights.
+    """
+    model_path = _resolve_model_path(model_path)
+    path = artifact_paths(model_path)["species_similarity"]
+    if not os.path.exists(path) or not os.path.exists(model_path):
+        return None
+    with open(path) as f:
+        calibration = json.load(f)
+    if calibration.get(WEIGHTS_DIGEST) != weights_digest(model_path):
+        print(f"⚠️ {path} was calibrated on other weights; re-run calibrate_species_index.py")
+        return None
+    return float(calibration["similarity"])
+
+
+def classify(image: Union[bytes, PreparedImage]) -> PlantPrediction:
     """
-    Takes raw image bytes, preprocesses them, and runs inference.
-    Returns True if the image is a plant, False otherwise.
+    Takes raw image bytes (or an image already decoded by prepare_image),
+    preprocesses it, and runs inference.
+    Returns the plant probability, the verdict under the current thresholds and the latency.
+    If the classifier cannot run, the verdict is UNCERTAIN so the LLM decides.
     """
+    start = time.perf_counter()
     if model is None:
-        print("⚠️ Model not loaded, skipping plant detection (defaulting to True)")
-        return True # Fail open if model is missing
+        print("⚠️ Model not loaded, skipping plant detection (deferring to the LLM)")
+        return PlantPrediction(UNCERTAIN, None, 0.0, error="model not loaded")
 
     try:
         # 1. Preprocess the image
-        # MUST match the training transforms: RGB, 64x64
-        transform = transforms.Compose([
-            # transforms.Grayscale(num_output_channels=1), # Removed
-            transforms.Resize((64, 64)),
-            transforms.ToTensor(),
-            # Normalization matching the training data (RGB)
-            transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)) 
-        ])
-        
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB") # Ensure RGB
-        image_tensor = transform(image).unsqueeze(0).to(device) # Add batch dimension
+        # MUST match the training transforms: RGB, 64x64, normalized to [-1, 1]
+        if isinstance(image, PreparedImage):
+            if image.image is None:
+                raise ValueError(image.error)
+            image_tensor = preprocessor.to_tensor(image.image)
+        else:
+            image_tensor = preprocessor(image)
 
         # 2. Run Inference
         with torch.no_grad():
             outputs = model(image_tensor)
-            # Output is [score_class_0, score_class_1]
-            
-            # Apply Softmax to get probabilities
-            probs = F.softmax(outputs, dim=1)
-            prob_not_plant = probs[0][0].item()
-            prob_plant = probs[0][1].item()
-            
-            print(f"🔍 Plant Detection Confidence: Plant={prob_plant:.4f}, Not Plant={prob_not_plant:.4f}")
-
-            # Strict Threshold Logic:
-            # We require the model to be at least 50% confident it IS a plant.
-            # This filters out non-plants effectively, though it may reject poor quality plant images.
-            
-            if prob_plant < 0.5:
-                print(f"❌ Rejected as Not Plant (Confidence: {prob_not_plant:.2%})")
-                return False
-            else:
-                print(f"✅ Accepted as Plant (Confidence: {prob_plant:.2%})")
-                return True
-            
+            # Output is [score_class_0, score_class_1]; softmax gives probabilities
+            prob_plant = F.softmax(outputs, dim=1)[0][1].item()
     except Exception as e:
         print(f"Error during plant detection: {e}")
-        return True # Fail open on error
+        return PlantPrediction(UNCERTAIN, None, (time.perf_counter() - start) * 1000, model.name, error=str(e))
+
+    prediction = PlantPrediction(thresholds.verdict(prob_plant), prob_plant, (time.perf_counter() - start) * 1000, model.name)
+    print(f"🔍 Plant Detection: Plant={prob_plant:.4f} -> {prediction.verdict} "
+          f"(accept >= {thresholds.accept}, reject < {thresholds.reject}, {prediction.latency_ms:.1f} ms)")
+    return prediction
+
+
+def is_plant(image: Union[bytes, PreparedImage]) -> bool:
+    """True unless the classifier confidently rejects the image"""
+    return classify(image).is_plant
+
+
+# Embeddings come from a separate eager copy of the network (the serving runtimes
+# only expose logits); it is built on first use and shares the preloaded weights.
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def embed(image: PreparedImage, model_path: str = DEFAULT_MODEL_PATH) -> Optional[np.ndarray]:
+    """L2-normalised float32 embedding of a decoded upload, or None when the weights or image are unavailable"""
+    global _embedder
+    if image.image is None:
+        return None
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                path = _resolve_model_path(model_path)
+                if not os.path.exists(path):
+                    return None
+                _embedder = load_eager_model(path)
+    with torch.no_grad():
+        features = _embedder.features(preprocessor.to_tensor(image.image))
+        return F.normalize(features, dim=1)[0].numpy().astype(np.float32)
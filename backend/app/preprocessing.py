@@ -0,0 +1,106 @@
+"""
+Image Preprocessing Module
+
+Turns an upload into the classifier's (1, 3, 64, 64) input with as little work as possible:
+- JPEGs are decoded with PIL draft mode, so libjpeg's DCT scaling only produces
+  a reduced resolution (up to 1/8 per side) instead of the full multi-megapixel image
+- the resize/normalize pipeline is fixed at import; nothing is rebuilt per call
+- the normalized pixels are written into a preallocated per-thread tensor
+
+prepare_image() decodes an upload once into a PreparedImage that the rest of the
+request (classifier, LLM payload) shares instead of re-reading the bytes.
+"""
+
+import base64
+import io
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+INPUT_SIZE = (64, 64)  # (height, width) expected by PlantClassifier
+MEAN = (0.5, 0.5, 0.5)
+STD = (0.5, 0.5, 0.5)
+
+# Dataset-side equivalent (PIL in, tensor out) for evaluation and calibration
+EVAL_TRANSFORM = transforms.Compose([
+    transforms.Resize(INPUT_SIZE),
+    transforms.ToTensor(),
+    transforms.Normalize(MEAN, STD),
+])
+
+
+@dataclass
+class PreparedImage:
+    """An upload decoded once per request; `image` is None when the bytes could not be decoded"""
+    data: bytes
+    content_type: str
+    image: Optional[Image.Image] = None
+    original_size: Optional[Tuple[int, int]] = None  # (width, height) before draft scaling
+    error: Optional[str] = None
+    _data_uri: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def data_uri(self) -> str:
+        """base64 data URI of the original bytes, as sent to the LLM"""
+        if self._data_uri is None:
+            self._data_uri = f"data:{self.content_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+        return self._data_uri
+
+
+def decode(image_bytes: bytes, size: Tuple[int, int] = INPUT_SIZE) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Decode to RGB at the smallest resolution that still covers `size`"""
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    if image.format == "JPEG":
+        # draft() takes (width, height) and picks the largest DCT downscale that stays >= it
+        image.draft("RGB", (size[1], size[0]))
+    return image.convert("RGB"), original_size
+
+
+def prepare_image(image_bytes: bytes, content_type: str = "image/jpeg") -> PreparedImage:
+    try:
+        image, original_size = decode(image_bytes)
+        return PreparedImage(image_bytes, content_type, image=image, original_size=original_size)
+    except Exception as e:
+        return PreparedImage(image_bytes, content_type, error=str(e))
+
+
+class Preprocessor:
+    """Resize + normalize into a reusable input tensor (one buffer per thread)"""
+
+    def __init__(self, size: Tuple[int, int] = INPUT_SIZE):
+        self.size = size
+        # (x / 255 - mean) / std folded into a single multiply-add
+        self._scale = torch.tensor([1 / (255 * s) for s in STD]).view(3, 1, 1)
+        self._shift = torch.tensor([-m / s for m, s in zip(MEAN, STD)]).view(3, 1, 1)
+        self._local = threading.local()
+
+    def _buffer(self) -> torch.Tensor:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = torch.empty((1, 3) + self.size)
+        return buffer
+
+    def to_tensor(self, image: Image.Image) -> torch.Tensor:
+        """
+        Normalized (1, 3, H, W) batch for `image`. The tensor is this thread's
+        buffer and is overwritten by the next call on the same thread.
+        """
+        resized = image.resize((self.size[1], self.size[0]), Image.BILINEAR)
+        buffer = self._buffer()
+        # HWC uint8 -> CHW float straight into the buffer (numpy view shares its memory)
+        np.copyto(buffer[0].numpy(), np.asarray(resized).transpose(2, 0, 1), casting="unsafe")
+        buffer[0].mul_(self._scale).add_(self._shift)
+        return buffer
+
+    def __call__(self, image_bytes: bytes) -> torch.Tensor:
+        image, _ = decode(image_bytes, self.size)
+        return self.to_tensor(image)
+
+# Global preprocessor shared by the classifier
+preprocessor = Preprocessor()
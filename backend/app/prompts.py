@@ -75,8 +75,8 @@ Return ONLY valid JSON:
 
     JSON only, no explanations."""
 
-def plant_expert_chat(question, context=None):
-    """Generate a response as a plant expert"""
+def plant_expert_chat(question, context=None, earlier_questions=None):
+    """Generate a response as a plant expert; earlier_questions summarizes turns no longer sent verbatim"""
     plant_context = ""
     target_region = "Texas" # Default region
     user_role = "Student" # Default role
@@ -93,6 +93,9 @@ def plant_expert_chat(question, context=None):
         is_invasive = context.get('invasiveOrNot', False)
         plant_context = f"The user is currently viewing details about {species}, which is classified as {'invasive' if is_invasive else 'not invasive'} in {target_region}."
 
+    if earlier_questions:
+        plant_context += f"\nEarlier in this conversation the user also asked: {earlier_questions}"
+
     role_instruction = ""
     if user_role == "Homeowner":
         role_instruction = "- Frame your answer for a homeowner: focus on property value, garden maintenance, aesthetics, and cost-effective control methods."
@@ -123,3 +126,44 @@ Provide a concise, direct, and helpful response.
 
 Keep it short and to the point.
 """
+
+def identification_analysis(region, date=None, season=None):
+    """Identification-only prompt: species and confidence, the rest comes from the species knowledge cache"""
+
+    context = f"Region: {region}"
+    if date:
+        context += f", Date: {date}"
+    if season:
+        context += f", Season: {season}"
+
+    return f"""Expert botanist for {region} invasive species. Identify the plant in the image with context: {context}. Return ONLY valid JSON:
+
+{{
+  "specieIdentified": "Common English name followed by scientific Latin name in parentheses, for example 'Live Oak (Quercus virginiana)'. Use null only if the species truly cannot be identified.",
+  "commonName": "Common English Name (e.g., Live Oak)",
+  "scientificName": "Scientific Latin Name (e.g., Quercus virginiana)",
+  "confidenceScore": 0-100,
+  "confidenceReasoning": "brief explanation for confidence score based on visual traits and context"
+}}
+
+Always include the common English name and the scientific Latin name in 'Genus species' order. Consider the season and date for identification accuracy. JSON only."""
+
+def species_facts(species, region):
+    """Photo-independent facts about one species in one region (background refresh of cached knowledge)"""
+    return f"""Expert botanist for {region} invasive species. For the plant species {species}, return ONLY valid JSON:
+
+{{
+  "nativeRegion": "native region/country",
+  "invasiveOrNot": boolean (invasive in {region}),
+  "invasiveEffects": "brief key effects or empty string",
+  "nativeAlternatives": [
+    {{
+      "commonName": "name",
+      "scientificName": "scientific name",
+      "characteristics": "very brief description"
+    }}
+  ],
+  "removeInstructions": "concise removal steps or empty string"
+}}
+
+Keep descriptions concise and to the point. JSON only."""
@@ -1,133 +1,379 @@
+import os
 import time
+import sqlite3
+import threading
+from collections import OrderedDict
 from typing import Dict, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from fastapi import HTTPException
 
+@dataclass
+class RateLimitPolicy:
+    """Token-bucket limits for one class of endpoints"""
+    requests_per_minute: int
+    burst: Optional[int] = None  # bucket capacity; defaults to requests_per_minute
+
+    @property
+    def capacity(self) -> float:
+        return float(self.burst if self.burst is not None else self.requests_per_minute)
+
+    @property
+    def refill_rate(self) -> float:
+        """Tokens added per second"""
+        return self.requests_per_minute / 60.0
+
+@dataclass
+class TokenBucket:
+    tokens: float
+    updated: float
+
 @dataclass
 class RateLimitInfo:
     """Information about rate limiting for a specific key"""
     last_request_time: float
-    request_count: int
-    failure_count: int
+    failure_count: int = 0
     last_failure_time: Optional[float] = None
     is_blocked: bool = False
     block_until: Optional[float] = None
+    buckets: Dict[str, TokenBucket] = field(default_factory=dict)
+
+def _policy_from_env(endpoint: str, default_per_minute: int) -> RateLimitPolicy:
+    prefix = f"RATE_LIMIT_{endpoint.upper()}"
+    per_minute = int(os.getenv(f"{prefix}_PER_MINUTE", default_per_minute))
+    burst = os.getenv(f"{prefix}_BURST")
+    return RateLimitPolicy(requests_per_minute=per_minute, burst=int(burst) if burst else None)
 
 class RateLimiter:
-    """Rate limiter to prevent excessive API calls and handle failures gracefully"""
-    
-    def __init__(self):
-        self.requests: Dict[str, RateLimitInfo] = {}
-        
+    """
+    Rate limiter to prevent excessive API calls and handle failures gracefully.
+
+    Each key gets one token bucket per endpoint class, so checks are O(1) and a
+    burst at a window edge can never exceed the bucket capacity. Keys live in an
+    LRU-ordered map: the least recently seen key is always at the front, so idle
+    keys are evicted from there as new traffic arrives and the map never grows
+    past max_keys.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, RateLimitPolicy]] = None, max_keys: int = 10000, idle_ttl: float = 3600):
+        self.requests: "OrderedDict[str, RateLimitInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
         # Configuration
-        self.max_requests_per_minute = 30  # Increased limit for dev
+        self.policies: Dict[str, RateLimitPolicy] = policies or {
+            "analysis": _policy_from_env("analysis", 30),
+            "chat": _policy_from_env("chat", 30),
+            "check": _policy_from_env("check", 60),
+        }
+        self.default_endpoint = "analysis"
         self.max_failures_before_block = 10  # Increased failure tolerance
         self.failure_block_duration = 10  # Short block duration
-        self.request_window = 60  # 1 minute window for rate limiting
-        
+        self.max_keys = max_keys  # Upper bound on tracked keys
+        self.idle_ttl = idle_ttl  # Keys unseen for this long are evicted
+
     def get_rate_limit_key(self, user_identifier: str, ip_address: str = "unknown") -> str:
         """Generate a unique key for rate limiting based on user and IP"""
         return f"{user_identifier}:{ip_address}"
-    
-    def check_rate_limit(self, key: str) -> bool:
+
+    def _get_info(self, key: str, current_time: float) -> RateLimitInfo:
+        """Fetch (or create) the entry for key and mark it most recently used. Caller holds the lock."""
+        self._evict(current_time)
+        rate_info = self.requests.get(key)
+        if rate_info is None:
+            if len(self.requests) >= self.max_keys:
+                self.requests.popitem(last=False)
+            rate_info = RateLimitInfo(last_request_time=current_time)
+            self.requests[key] = rate_info
+        else:
+            self.requests.move_to_end(key)
+        return rate_info
+
+    def _evict(self, current_time: float):
+        """Drop idle keys from the LRU front; the front is always the least recently seen key. Caller holds the lock."""
+        while self.requests:
+            oldest = next(iter(self.requests.values()))
+            if current_time - oldest.last_request_time <= self.idle_ttl:
+                break
+            if oldest.is_blocked and oldest.block_until and current_time < oldest.block_until:
+                break
+            self.requests.popitem(last=False)
+
+    def _refill(self, bucket: TokenBucket, policy: RateLimitPolicy, current_time: float):
+        elapsed = max(0.0, current_time - bucket.updated)
+        bucket.tokens = min(policy.capacity, bucket.tokens + elapsed * policy.refill_rate)
+        bucket.updated = current_time
+
+    def check_rate_limit(self, key: str, endpoint: Optional[str] = None) -> bool:
         """Check if the request should be allowed based on rate limiting rules"""
+        endpoint = endpoint or self.default_endpoint
+        policy = self.policies[endpoint]
         current_time = time.time()
-        
-        if key not in self.requests:
-            self.requests[key] = RateLimitInfo(
-                last_request_time=current_time,
-                request_count=1,
-                failure_count=0
-            )
-            return True
-        
-        rate_info = self.requests[key]
-        
-        # Check if currently blocked due to failures
-        if rate_info.is_blocked and rate_info.block_until:
-            if current_time < rate_info.block_until:
-                remaining_time = int(rate_info.block_until - current_time)
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Too many failed requests. Please try again in {remaining_time} seconds."
-                )
+
+        with self._lock:
+            rate_info = self._get_info(key, current_time)
+
+            # Check if currently blocked due to failures
+            if rate_info.is_blocked and rate_info.block_until:
+                if current_time < rate_info.block_until:
+                    remaining_time = int(rate_info.block_until - current_time)
+                    raise HTTPException(
+                        status_code=429,
+                        detail=f"Too many failed requests. Please try again in {remaining_time} seconds."
+                    )
+                else:
+                    # Unblock the user
+                    rate_info.is_blocked = False
+                    rate_info.block_until = None
+                    rate_info.failure_count = 0
+
+            # Check request rate limiting
+            bucket = rate_info.buckets.get(endpoint)
+            if bucket is None:
+                bucket = TokenBucket(tokens=policy.capacity, updated=current_time)
+                rate_info.buckets[endpoint] = bucket
             else:
-                # Unblock the user
-                rate_info.is_blocked = False
-                rate_info.block_until = None
-                rate_info.failure_count = 0
-        
-        # Check request rate limiting
-        time_since_last_request = current_time - rate_info.last_request_time
-        
-        if time_since_last_request < self.request_window:
-            # Within the rate limiting window
-            if rate_info.request_count >= self.max_requests_per_minute:
+                self._refill(bucket, policy, current_time)
+
+            rate_info.last_request_time = current_time
+            if bucket.tokens < 1.0:
+                retry_after = max(1, int((1.0 - bucket.tokens) / policy.refill_rate + 0.999))
                 raise HTTPException(
                     status_code=429,
-                    detail=f"Rate limit exceeded. Maximum {self.max_requests_per_minute} requests per minute allowed."
+                    detail=f"Rate limit exceeded. Maximum {policy.requests_per_minute} requests per minute allowed.",
+                    headers={"Retry-After": str(retry_after)}
                 )
-            rate_info.request_count += 1
-        else:
-            # Reset the counter for new window
-            rate_info.request_count = 1
-        
-        rate_info.last_request_time = current_time
-        return True
-    
+            bucket.tokens -= 1.0
+            return True
+
     def record_success(self, key: str):
         """Record a successful request to reset failure count"""
-        if key in self.requests:
-            self.requests[key].failure_count = 0
-            self.requests[key].last_failure_time = None
-    
+        with self._lock:
+            if key in self.requests:
+                self.requests[key].failure_count = 0
+                self.requests[key].last_failure_time = None
+
     def record_failure(self, key: str):
         """Record a failed request and potentially block the user"""
         current_time = time.time()
-        
-        if key not in self.requests:
-            self.requests[key] = RateLimitInfo(
-                last_request_time=current_time,
-                request_count=1,
-                failure_count=1,
-                last_failure_time=current_time
-            )
-        else:
-            rate_info = self.requests[key]
+
+        with self._lock:
+            rate_info = self._get_info(key, current_time)
+            rate_info.last_request_time = current_time
             rate_info.failure_count += 1
             rate_info.last_failure_time = current_time
-            
+
             # Block user if too many consecutive failures
             if rate_info.failure_count >= self.max_failures_before_block:
                 rate_info.is_blocked = True
                 rate_info.block_until = current_time + self.failure_block_duration
                 print(f"🚫 User {key} blocked for {self.failure_block_duration} seconds due to {rate_info.failure_count} consecutive failures")
-    
-    def get_remaining_requests(self, key: str) -> int:
+
+    def get_remaining_requests(self, key: str, endpoint: Optional[str] = None) -> int:
         """Get the number of remaining requests for a key"""
-        if key not in self.requests:
-            return self.max_requests_per_minute
-        
-        rate_info = self.requests[key]
-        current_time = time.time()
-        
-        if current_time - rate_info.last_request_time >= self.request_window:
-            return self.max_requests_per_minute
-        
-        return max(0, self.max_requests_per_minute - rate_info.request_count)
-    
+        endpoint = endpoint or self.default_endpoint
+        policy = self.policies[endpoint]
+
+        with self._lock:
+            rate_info = self.requests.get(key)
+            if rate_info is None or endpoint not in rate_info.buckets:
+                return int(policy.capacity)
+
+            bucket = rate_info.buckets[endpoint]
+            self._refill(bucket, policy, time.time())
+            return int(bucket.tokens)
+
     def cleanup_old_entries(self):
         """Clean up old rate limiting entries to prevent memory leaks"""
+        with self._lock:
+            self._evict(time.time())
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Rate limiter whose state lives in a SQLite database shared by every worker
+    process on the box, so limits and failure blocks hold across uvicorn workers.
+
+    Each check is a single atomic UPSERT ... RETURNING on a WAL-mode database with
+    synchronous=OFF (counters may be lost on power failure, never corrupted), which
+    costs tens of microseconds. Connections are opened lazily per thread and per
+    process, so forked workers never share a handle. Requires SQLite >= 3.35.
+
+    Every CLEANUP_INTERVAL checks a worker purges idle rows and then the least
+    recently seen keys beyond max_keys (never an active block), so the tables
+    exceed max_keys by at most the keys first seen between two purges.
+    """
+
+    # Idle rows and keys beyond max_keys are purged once every this many checks per process
+    CLEANUP_INTERVAL = 1000
+
+    def __init__(self, db_path: str, policies: Optional[Dict[str, RateLimitPolicy]] = None, max_keys: int = 10000, idle_ttl: float = 3600):
+        super().__init__(policies=policies, max_keys=max_keys, idle_ttl=idle_ttl)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._checks = 0
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (key, endpoint)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS buckets_updated ON buckets(updated);
+            CREATE TABLE IF NOT EXISTS failures (
+                key TEXT PRIMARY KEY,
+                failure_count INTEGER NOT NULL,
+                last_failure_time REAL,
+                block_until REAL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def check_rate_limit(self, key: str, endpoint: Optional[str] = None) -> bool:
+        """Check if the request should be allowed based on rate limiting rules"""
+        endpoint = endpoint or self.default_endpoint
+        policy = self.policies[endpoint]
+        current_time = time.time()
+        conn = self._conn()
+
+        # Check if currently blocked due to failures
+        row = conn.execute("SELECT block_until FROM failures WHERE key = ?", (key,)).fetchone()
+        if row and row[0] is not None:
+            if current_time < row[0]:
+                remaining_time = int(row[0] - current_time)
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Too many failed requests. Please try again in {remaining_time} seconds."
+                )
+            # Unblock the user
+            conn.execute(
+                "UPDATE failures SET block_until = NULL, failure_count = 0 WHERE key = ? AND block_until <= ?",
+                (key, current_time)
+            )
+
+        # Refill and take a token in one statement; no row comes back when the bucket is empty
+        taken = conn.execute(
+            """
+            INSERT INTO buckets (key, endpoint, tokens, updated) VALUES (:key, :endpoint, :capacity - 1, :now)
+            ON CONFLICT (key, endpoint) DO UPDATE SET
+                tokens = MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) - 1,
+                updated = :now
+            WHERE MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) >= 1
+            RETURNING tokens
+            """,
+            {"key": key, "endpoint": endpoint, "capacity": policy.capacity, "rate": policy.refill_rate, "now": current_time}
+        ).fetchone()
+
+        with self._lock:  # checks run on many threadpool threads
+            self._checks += 1
+            cleanup = self._checks % self.CLEANUP_INTERVAL == 0
+        if cleanup:
+            self.cleanup_old_entries()
+
+        if taken is None:
+            remaining = self.get_remaining_tokens(key, endpoint, current_time)
+            retry_after = max(1, int((1.0 - remaining) / policy.refill_rate + 0.999))
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded. Maximum {policy.requests_per_minute} requests per minute allowed.",
+                headers={"Retry-After": str(retry_after)}
+            )
+        return True
+
+    def get_remaining_tokens(self, key: str, endpoint: str, current_time: float) -> float:
+        policy = self.policies[endpoint]
+        row = self._conn().execute(
+            "SELECT tokens, updated FROM buckets WHERE key = ? AND endpoint = ?", (key, endpoint)
+        ).fetchone()
+        if row is None:
+            return policy.capacity
+        return min(policy.capacity, row[0] + max(0.0, current_time - row[1]) * policy.refill_rate)
+
+    def record_success(self, key: str):
+        """Record a successful request to reset failure count"""
+        self._conn().execute(
+            "UPDATE failures SET failure_count = 0, last_failure_time = NULL WHERE key = ?", (key,)
+        )
+
+    def record_failure(self, key: str):
+        """Record a failed request and potentially block the user"""
         current_time = time.time()
-        keys_to_remove = []
-        
-        for key, rate_info in self.requests.items():
-            # Remove entries older than 1 hour
-            if current_time - rate_info.last_request_time > 3600:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.requests[key]
+        failure_count, block_until = self._conn().execute(
+            """
+            INSERT INTO failures (key, failure_count, last_failure_time, block_until, updated)
+            VALUES (:key, 1, :now, CASE WHEN 1 >= :max_failures THEN :block_until END, :now)
+            ON CONFLICT (key) DO UPDATE SET
+                failure_count = failure_count + 1,
+                last_failure_time = :now,
+                updated = :now,
+                block_until = CASE WHEN failure_count + 1 >= :max_failures THEN :block_until ELSE block_until END
+            RETURNING failure_count, block_until
+            """,
+            {
+                "key": key,
+                "now": current_time,
+                "max_failures": self.max_failures_before_block,
+                "block_until": current_time + self.failure_block_duration,
+            }
+        ).fetchone()
+
+        if block_until is not None and failure_count >= self.max_failures_before_block:
+            print(f"🚫 User {key} blocked for {self.failure_block_duration} seconds due to {failure_count} consecutive failures")
+
+    def get_remaining_requests(self, key: str, endpoint: Optional[str] = None) -> int:
+        """Get the number of remaining requests for a key"""
+        endpoint = endpoint or self.default_endpoint
+        return int(self.get_remaining_tokens(key, endpoint, time.time()))
+
+    def cleanup_old_entries(self):
+        """Clean up idle entries, then the least recently seen keys past max_keys, to keep the shared tables bounded"""
+        conn = self._conn()
+        now = time.time()
+        cutoff = now - self.idle_ttl
+        conn.execute("DELETE FROM buckets WHERE updated < ?", (cutoff,))
+        conn.execute(
+            "DELETE FROM failures WHERE updated < ? AND (block_until IS NULL OR block_until < ?)",
+            (cutoff, now)
+        )
+        # A dropped bucket only comes back full, which is what any new key gets anyway
+        conn.execute(
+            """
+            DELETE FROM buckets WHERE key IN (
+                SELECT key FROM buckets GROUP BY key ORDER BY MAX(updated) DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_keys,)
+        )
+        conn.execute(
+            """
+            DELETE FROM failures WHERE key IN (
+                SELECT key FROM failures WHERE block_until IS NULL OR block_until < :now
+                ORDER BY updated DESC LIMIT -1 OFFSET :max_keys
+            )
+            """,
+            {"now": now, "max_keys": self.max_keys}
+        )
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the limiter selected by RATE_LIMIT_BACKEND ('memory' or 'sqlite')"""
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        db_path = os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.sqlite3")
+        try:
+            limiter = SQLiteRateLimiter(db_path)
+            print(f"✅ Using shared SQLite rate limiter at {db_path}")
+            return limiter
+        except Exception as e:
+            print(f"⚠️ SQLite rate limiter unavailable ({e}), falling back to in-process RateLimiter")
+    return RateLimiter()
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
\ No newline at end of file
+rate_limiter = create_rate_limiter()
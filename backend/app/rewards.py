@@ -11,13 +11,17 @@ Production-grade persistence:
 import json
 import os
 from typing import Dict, List, Optional, Tuple
+from app.startup import LazyResource
 
-# Try to initialize Firestore client via Firebase Admin SDK
-try:
-    from firebase_admin import firestore
-    _firestore_client = firestore.client()
-except Exception:
-    _firestore_client = None
+def _create_firestore_client():
+    """Firestore client via Firebase Admin SDK, or None when unavailable"""
+    try:
+        from app.auth import initialize_firebase
+        initialize_firebase()
+        from firebase_admin import firestore
+        return firestore.client()
+    except Exception:
+        return None
 
 
 class FileRewardsManager:
@@ -147,19 +151,21 @@ class FirestoreRewardsManager:
             return False, 0
 
 
-# Global instance: prefer Firestore, fallback to file-based JSON storage
-rewards_manager = None
-
-if _firestore_client is not None:
-    try:
-        # Test connection by attempting to read a document (doesn't need to exist)
-        # We use a dummy query that should succeed if permissions are correct
-        _firestore_client.collection("user_rewards").limit(1).get()
-        print("✅ Firestore connection successful, using FirestoreRewardsManager")
-        rewards_manager = FirestoreRewardsManager(_firestore_client)
-    except Exception as e:
-        print(f"⚠️ Firestore connection failed ({e}), falling back to FileRewardsManager")
-        rewards_manager = FileRewardsManager()
-else:
+def _create_rewards_manager():
+    """Prefer Firestore, fallback to file-based JSON storage"""
+    firestore_client = _create_firestore_client()
+    if firestore_client is not None:
+        try:
+            # Test connection by attempting to read a document (doesn't need to exist)
+            # We use a dummy query that should succeed if permissions are correct
+            firestore_client.collection("user_rewards").limit(1).get()
+            print("✅ Firestore connection successful, using FirestoreRewardsManager")
+            return FirestoreRewardsManager(firestore_client)
+        except Exception as e:
+            print(f"⚠️ Firestore connection failed ({e}), falling back to FileRewardsManager")
+            return FileRewardsManager()
     print("Using FileRewardsManager (Firestore client not available)")
-    rewards_manager = FileRewardsManager()
+    return FileRewardsManager()
+
+# Global instance, resolved by the startup warm-up task or on first use
+rewards_manager = LazyResource("rewards_manager", _create_rewards_manager)
@@ -8,6 +8,7 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     context: Optional[Dict[str, Any]] = None
+    sessionId: Optional[str] = None  # from a previous /api/chat response; omitted starts a new conversation
 
 class PlantAnalysisRequest(BaseModel):
     region: Optional[str] = "North America"
@@ -51,6 +52,7 @@ class PlantInfo(BaseModel):
     invasiveEffects: str = ""
     nativeAlternatives: List[Dict[str, str]] = []
     removeInstructions: str = ""
+    source: Optional[str] = None  # "species_index" / "species_knowledge" when the answer did not come from the LLM itself
 
 class FeedbackRequest(BaseModel):
     plantId: Optional[str] = None
@@ -98,6 +100,12 @@ class MapMarker(BaseModel):
     timestamp: datetime
     scan_id: Optional[str] = None
 
+class MapMarkersDelta(BaseModel):
+    added: List[MapMarker]
+    removed: List[str]  # ids of markers removed since the cursor
+    cursor: int  # pass back as ?cursor= on the next poll
+    reset: bool = False  # True when 'added' is the full list and the client should replace its copy
+
 class CreateMarkerRequest(BaseModel):
     latitude: float
     longitude: float
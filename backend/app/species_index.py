@@ -0,0 +1,277 @@
+"""
+Species Embedding Index
+
+Remembers the classifier embedding of every upload the LLM identified with high
+confidence, together with that analysis. When a new upload's nearest neighbours
+from the same region all agree on one species above the similarity threshold,
+the stored analysis for that species is returned and the LLM is not called.
+
+Storage (SPECIES_INDEX_DIR) is three append-only files shared by all workers:
+- vectors.f32: float32 embeddings, one row per remembered upload, memory-mapped
+  for search (pages live in the OS cache, not the Python heap)
+- rows.jsonl: species and region of each row
+- analyses.jsonl: latest analysis per (species, region); later lines win
+Appends take an exclusive file lock; readers pick up other workers' rows by
+reading past their last offset. Once SPECIES_INDEX_MAX_ENTRIES rows exist the
+files are compacted to the newest half, so disk and memory stay bounded.
+
+Search is exact brute force (one matrix-vector product over the mapped rows):
+at the default bound of 20k x 67 floats it takes about a millisecond, so no
+approximate structure is needed.
+
+A wrong match hands out another species' verdict and removal steps without the
+LLM ever seeing the photo, so the index only starts when the embedding has been
+shown to separate species: calibrate_species_index.py measures same-species and
+different-species similarities on held-out photos and writes the threshold a
+neighbour must reach, tied to the digest of the weights. Without a calibration
+for the current weights the index stays disabled. The binary plant classifier's
+features do not pass that check (unrelated photos score above 0.97).
+
+- SPECIES_INDEX_ENABLED: use the fast path at all (default: false)
+- SPECIES_INDEX_DIR: storage directory (default: species_index)
+- SPECIES_INDEX_NEIGHBOURS / SPECIES_INDEX_MIN_VOTES: neighbours examined and how
+  many must agree (default: 5 / 3)
+- SPECIES_INDEX_MIN_CONFIDENCE: LLM confidenceScore (0-100) needed to remember an analysis (default: 90)
+- SPECIES_INDEX_MAX_ENTRIES: row bound before compaction (default: 20000)
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.confidence import confidence_score
+from app.startup import LazyResource
+
+# Fields of an analysis that depend only on the species (and region), not on the photo
+ANALYSIS_FIELDS = (
+    "specieIdentified", "commonName", "scientificName", "nativeRegion", "invasiveOrNot",
+    "confidenceScore", "confidenceReasoning", "invasiveEffects", "nativeAlternatives", "removeInstructions",
+)
+# Re-uploads of the same photo embed (almost) identically and must not add votes
+DUPLICATE_SIMILARITY = 0.9999
+NOT_A_SPECIES = {"", "unidentified plant", "not a plant", "error", "parsing error", "unknown"}
+
+
+def species_key(analysis: dict) -> Optional[str]:
+    """'Genus species' from scientificName or the '(Genus species)' part of specieIdentified"""
+    name = (analysis.get("scientificName") or "").strip()
+    if not name:
+        identified = (analysis.get("specieIdentified") or "").strip()
+        if identified.lower() in NOT_A_SPECIES:
+            return None
+        match = re.search(r"\(([^)]+)\)", identified)
+        name = match.group(1) if match else identified
+    words = re.sub(r"[^A-Za-z\s.-]", " ", name).split()
+    if not words:
+        return None
+    return " ".join([words[0].capitalize()] + [w.lower() for w in words[1:2]])
+
+
+def region_key(region: str) -> str:
+    return " ".join((region or "").lower().split())
+
+
+@dataclass
+class SpeciesMatch:
+    species: str
+    similarity: float  # lowest similarity among the agreeing neighbours
+    votes: int
+    analysis: dict
+
+    def to_dict(self) -> dict:
+        return {"source": "species_index", "species": self.species,
+                "similarity": round(self.similarity, 4), "votes": self.votes}
+
+
+class SpeciesIndex:
+    def __init__(self, directory: str, similarity: float, dim: int = 67, neighbours: int = 5,
+                 min_votes: int = 3, min_confidence: float = 90.0, max_entries: int = 20000, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self.dim = dim
+        self.similarity = similarity
+        self.neighbours = neighbours
+        self.min_votes = min_votes
+        self.min_confidence = min_confidence
+        self.max_entries = max_entries
+        self._paths = {name: os.path.join(directory, name) for name in ("vectors.f32", "rows.jsonl", "analyses.jsonl")}
+        self._lock = threading.Lock()
+        self._reset()
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            self.refresh()
+
+    def _reset(self):
+        self._species: List[str] = []
+        self._regions: List[str] = []
+        self._by_region: Dict[str, List[int]] = {}
+        self._analyses: Dict[Tuple[str, str], dict] = {}
+        self._offsets = {"rows.jsonl": 0, "analyses.jsonl": 0}
+        self._identity = None
+        self._vectors: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self._species)
+
+    def _read_new_lines(self, name: str):
+        """Complete lines appended to `name` since the last read"""
+        path = self._paths[name]
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            f.seek(self._offsets[name])
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a line still being written is read next time
+        self._offsets[name] += end
+        return [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+
+    def _rows_identity(self):
+        rows_path = self._paths["rows.jsonl"]
+        return os.stat(rows_path).st_ino if os.path.exists(rows_path) else None
+
+    def refresh(self):
+        """Pick up rows added by other workers (and reload everything after a compaction)"""
+        with self._lock:
+            if not self._sync():
+                # Another worker compacted while the files were being read: start over on the new ones,
+                # and if that races too, serve nothing until the next refresh rather than misaligned rows
+                self._reset()
+                if not self._sync():
+                    self._reset()
+
+    def _sync(self) -> bool:
+        """Read new rows and map their vectors; False if the files were replaced underneath (caller holds _lock)"""
+        identity = self._rows_identity()
+        if identity != self._identity:
+            self._reset()
+            self._identity = identity
+        try:
+            for row in self._read_new_lines("rows.jsonl"):
+                self._by_region.setdefault(row["region"], []).append(len(self._species))
+                self._species.append(row["species"])
+                self._regions.append(row["region"])
+            for entry in self._read_new_lines("analyses.jsonl"):
+                self._analyses[(entry["species"], entry["region"])] = entry["analysis"]
+            count = len(self._species)
+            if count and (self._vectors is None or len(self._vectors) != count):
+                self._vectors = np.memmap(self._paths["vectors.f32"], dtype=np.float32, mode="r", shape=(count, self.dim))
+        except ValueError:
+            # Old offsets into a new file (JSONDecodeError) or the compacted vectors.f32
+            # being shorter than the rows read from the old rows.jsonl (memmap length)
+            return False
+        # vectors.f32 is replaced before rows.jsonl: rows from the old file must not be paired with new vectors
+        return self._rows_identity() == identity
+
+    def match(self, embedding: np.ndarray, region: str) -> Optional[SpeciesMatch]:
+        """The stored analysis when the nearest same-region neighbours agree on a species"""
+        if not self.enabled:
+            return None
+        self.refresh()
+        with self._lock:
+            vectors, species = self._vectors, self._species
+            region = region_key(region)
+            candidates = np.asarray(self._by_region.get(region, []), dtype=np.int64)
+            if vectors is None or len(candidates) < self.min_votes:
+                return None
+            similarities = vectors[candidates] @ embedding
+            k = min(self.neighbours, len(candidates))
+            nearest = np.argpartition(-similarities, k - 1)[:k]
+            close = [(float(similarities[i]), species[candidates[i]]) for i in nearest if similarities[i] >= self.similarity]
+            names = {name for _, name in close}
+            if len(close) < self.min_votes or len(names) != 1:
+                return None
+            name = names.pop()
+            analysis = self._analyses.get((name, region))
+            if analysis is None:
+                return None
+            return SpeciesMatch(name, min(similarity for similarity, _ in close), len(close), dict(analysis))
+
+    def _nearest_similarity(self, embedding: np.ndarray, region: str) -> float:
+        self.refresh()
+        with self._lock:
+            candidates = self._by_region.get(region)
+            if self._vectors is None or not candidates:
+                return -1.0
+            return float(np.max(self._vectors[np.asarray(candidates)] @ embedding))
+
+    def add(self, embedding: np.ndarray, region: str, analysis: dict) -> bool:
+        """Remember a confident LLM analysis for this upload; False if it does not qualify"""
+        if not self.enabled:
+            return False
+        species = species_key(analysis)
+        confidence = confidence_score(analysis)
+        if species is None or confidence is None or confidence < self.min_confidence or analysis.get("analysisDegraded"):
+            return False
+        region = region_key(region)
+        if self._nearest_similarity(embedding, region) >= DUPLICATE_SIMILARITY:
+            return False
+        stored = {field: analysis[field] for field in ANALYSIS_FIELDS if field in analysis}
+        with open(os.path.join(self.directory, "index.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Vector first: a row line is only ever read once its vector is on disk
+            with open(self._paths["vectors.f32"], "ab") as f:
+                f.write(np.asarray(embedding, dtype=np.float32).reshape(self.dim).tobytes())
+            with open(self._paths["rows.jsonl"], "a") as f:
+                f.write(json.dumps({"species": species, "region": region}) + "\n")
+            if self._analyses.get((species, region)) != stored:
+                with open(self._paths["analyses.jsonl"], "a") as f:
+                    f.write(json.dumps({"species": species, "region": region, "analysis": stored}) + "\n")
+            self.refresh()
+            if len(self) > self.max_entries:
+                self._compact()
+        return True
+
+    def _compact(self):
+        """Keep the newest half of the rows (caller holds the file lock)"""
+        keep = self.max_entries // 2
+        with self._lock:
+            vectors = np.array(self._vectors[-keep:])
+            rows = list(zip(self._species[-keep:], self._regions[-keep:]))
+            kept = set(rows)
+            analyses = {key: value for key, value in self._analyses.items() if key in kept}
+        tmp = {name: path + ".tmp" for name, path in self._paths.items()}
+        vectors.tofile(tmp["vectors.f32"])
+        with open(tmp["rows.jsonl"], "w") as f:
+            f.writelines(json.dumps({"species": s, "region": r}) + "\n" for s, r in rows)
+        with open(tmp["analyses.jsonl"], "w") as f:
+            f.writelines(json.dumps({"species": s, "region": r, "analysis": a}) + "\n" for (s, r), a in analyses.items())
+        # rows.jsonl last: its new inode is what tells readers to reload
+        for name in ("vectors.f32", "analyses.jsonl", "rows.jsonl"):
+            os.replace(tmp[name], self._paths[name])
+        print(f"🗜️ Species index compacted to {keep} rows")
+        self.refresh()
+
+
+def _create_species_index() -> SpeciesIndex:
+    from app.plant_classifier import EMBEDDING_DIM, load_species_similarity
+    enabled = os.getenv("SPECIES_INDEX_ENABLED", "false").lower() == "true"
+    similarity = load_species_similarity() if enabled else None
+    if enabled and similarity is None:
+        print("⚠️ Species index disabled: no species similarity calibrated for the current classifier weights "
+              "(run calibrate_species_index.py)")
+        enabled = False
+    index = SpeciesIndex(
+        os.getenv("SPECIES_INDEX_DIR", "species_index"),
+        similarity=similarity if similarity is not None else 1.0,
+        dim=EMBEDDING_DIM,
+        neighbours=int(os.getenv("SPECIES_INDEX_NEIGHBOURS", 5)),
+        min_votes=int(os.getenv("SPECIES_INDEX_MIN_VOTES", 3)),
+        min_confidence=float(os.getenv("SPECIES_INDEX_MIN_CONFIDENCE", 90)),
+        max_entries=int(os.getenv("SPECIES_INDEX_MAX_ENTRIES", 20000)),
+        enabled=enabled,
+    )
+    if index.enabled:
+        print(f"🗂️ Species index: {len(index)} remembered uploads in {index.directory} (similarity >= {index.similarity:.4f})")
+    else:
+        print("ℹ️ Species index disabled (SPECIES_INDEX_ENABLED)")
+    return index
+
+
+# Global index, resolved on first use
+species_index = LazyResource("species_index", _create_species_index)
@@ -0,0 +1,265 @@
+"""
+Species Knowledge Cache
+
+Most of an analysis (native region, invasiveness, effects, native alternatives,
+removal steps) depends only on the species and the region, not on the photo.
+Every confident full analysis stores those fields under (species, region). When
+a region's uploads are mostly cached species, the LLM is first asked only to
+identify the plant (a few dozen output tokens) and, when it names a cached
+species confidently enough, the rest of the answer comes from the cache.
+
+A miss pays for the identification call and then the full analysis, so the
+identification path is only taken while the region's measured hit rate is at
+least SPECIES_KNOWLEDGE_MIN_HIT_RATE. The rate is a decayed per-region average
+(SQLite, shared by workers) fed by every analysis: identification attempts
+record whether they hit, and full analyses record whether their species was
+already cached, so a region that falls back to the full prompt keeps being
+measured and switches back when its uploads start repeating. The time spent on
+misses is reported by stats() (in /api/llm/status).
+
+Entries older than SPECIES_KNOWLEDGE_TTL are still served, and a background
+thread refreshes them with a text-only prompt (no image). The store is a SQLite
+table shared by all workers on the box; one worker claims each refresh.
+
+- SPECIES_KNOWLEDGE_ENABLED: use the identification-only path at all (default: true)
+- SPECIES_KNOWLEDGE_DB_PATH: SQLite file (default: species_knowledge.sqlite3)
+- SPECIES_KNOWLEDGE_TTL: seconds before an entry is refreshed (default: 30 days)
+- SPECIES_KNOWLEDGE_MIN_CONFIDENCE: confidenceScore (0-100) needed to store an analysis,
+  and for an identification to be answered from the cache (default: 80)
+- SPECIES_KNOWLEDGE_MIN_HIT_RATE: hit rate a region needs before identifying first (default: 0.5)
+- SPECIES_KNOWLEDGE_MIN_SAMPLES: analyses a region needs before its hit rate is trusted (default: 5)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.confidence import confidence_score
+from app.species_index import region_key, species_key
+from app.startup import LazyResource
+
+# Fields that depend only on (species, region)
+KNOWLEDGE_FIELDS = ("nativeRegion", "invasiveOrNot", "invasiveEffects", "nativeAlternatives", "removeInstructions")
+# A claimed refresh that has not finished after this long may be claimed again
+REFRESH_TIMEOUT = 300
+# Weight of older lookups in a region's hit rate (about the last 50 analyses count)
+HIT_RATE_DECAY = 0.98
+
+
+class SpeciesKnowledge:
+    """Photo-independent analysis fields per (species, region), with stale-while-refresh"""
+
+    def __init__(self, db_path: str, ttl: float = 30 * 86400, min_confidence: float = 80.0, enabled: bool = True,
+                 min_hit_rate: float = 0.5, min_samples: int = 5):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self.min_hit_rate = min_hit_rate
+        self.min_samples = min_samples
+        self._local = threading.local()
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="species-knowledge")
+        self._stats_lock = threading.Lock()
+        self.identification_hits = 0
+        self.identification_misses = 0
+        self.miss_seconds = 0.0
+        if enabled:
+            self._conn().execute("""
+                CREATE TABLE IF NOT EXISTS knowledge (
+                    species TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    fields TEXT NOT NULL,
+                    updated REAL NOT NULL,
+                    refreshing_until REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (species, region)
+                ) WITHOUT ROWID
+            """)
+            self._conn().execute("""
+                CREATE TABLE IF NOT EXISTS lookups (
+                    region TEXT PRIMARY KEY,
+                    samples REAL NOT NULL,
+                    hits REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit_rate(self, region: str) -> Optional[float]:
+        """Decayed share of the region's analyses whose species was cached; None until min_samples"""
+        if not self.enabled:
+            return None
+        row = self._conn().execute("SELECT samples, hits FROM lookups WHERE region = ?", (region_key(region),)).fetchone()
+        if row is None or row[0] < self.min_samples:
+            return None
+        return row[1] / row[0]
+
+    def worth_identifying(self, region: str) -> bool:
+        """True when enough of the region's uploads are cached species for identifying first to pay off"""
+        rate = self.hit_rate(region)
+        return rate is not None and rate >= self.min_hit_rate
+
+    def _record_lookup(self, region: str, hit: bool):
+        # Decayed counts, so samples approaches 1 / (1 - HIT_RATE_DECAY) and old traffic fades out
+        self._conn().execute(
+            """
+            INSERT INTO lookups (region, samples, hits) VALUES (?, 1, ?)
+            ON CONFLICT (region) DO UPDATE SET
+                samples = samples * ? + 1, hits = hits * ? + excluded.hits
+            """,
+            (region_key(region), float(hit), HIT_RATE_DECAY, HIT_RATE_DECAY)
+        )
+
+    def record_identification(self, region: str, hit: bool, seconds: float):
+        """Count an identification attempt; on a miss, seconds is the time it added before the full analysis"""
+        if not self.enabled:
+            return
+        self._record_lookup(region, hit)
+        with self._stats_lock:
+            if hit:
+                self.identification_hits += 1
+            else:
+                self.identification_misses += 1
+                self.miss_seconds += seconds
+
+    def observe(self, analysis: dict, region: str):
+        """Count a full analysis as a hit when its species was already cached for the region"""
+        if not self.enabled:
+            return
+        species = species_key(analysis)
+        cached = species is not None and self._conn().execute(
+            "SELECT 1 FROM knowledge WHERE species = ? AND region = ?", (species, region_key(region))
+        ).fetchone() is not None
+        self._record_lookup(region, cached)
+
+    def remember(self, analysis: dict, region: str) -> bool:
+        """Store the species fields of a confident full analysis; False if it does not qualify"""
+        if not self.enabled or analysis.get("analysisDegraded"):
+            return False
+        species = species_key(analysis)
+        confidence = confidence_score(analysis)
+        fields = {field: analysis[field] for field in KNOWLEDGE_FIELDS if field in analysis}
+        if species is None or confidence is None or confidence < self.min_confidence or len(fields) < len(KNOWLEDGE_FIELDS):
+            return False
+        self._store(species, region_key(region), fields)
+        return True
+
+    def _store(self, species: str, region: str, fields: dict):
+        self._conn().execute(
+            """
+            INSERT INTO knowledge (species, region, fields, updated) VALUES (?, ?, ?, ?)
+            ON CONFLICT (species, region) DO UPDATE SET
+                fields = excluded.fields, updated = excluded.updated, refreshing_until = 0
+            """,
+            (species, region, json.dumps(fields), time.time())
+        )
+
+    def complete(self, identification: dict, region: str, refresh: Optional[Callable[[str, str], dict]] = None) -> Optional[dict]:
+        """
+        identification filled in with the cached fields of its species, or None when
+        the identification is not confident enough or the species is not cached.
+        Stale entries are served and refreshed in the background with refresh(species, region).
+        """
+        if not self.enabled:
+            return None
+        species = species_key(identification)
+        confidence = confidence_score(identification)
+        if species is None or confidence is None or confidence < self.min_confidence:
+            return None
+        region = region_key(region)
+        row = self._conn().execute(
+            "SELECT fields, updated FROM knowledge WHERE species = ? AND region = ?", (species, region)
+        ).fetchone()
+        if row is None:
+            return None
+        fields, updated = json.loads(row[0]), row[1]
+        age = time.time() - updated
+        refreshing = age > self.ttl and refresh is not None and self._claim_refresh(species, region)
+        if refreshing:
+            self._refresher.submit(self._refresh, species, region, refresh)
+        result = dict(identification)
+        result.update(fields)
+        result["knowledge"] = {"source": "species_knowledge", "species": species, "age": round(age), "refreshing": refreshing}
+        result["source"] = "species_knowledge"
+        return result
+
+    def _claim_refresh(self, species: str, region: str) -> bool:
+        """Atomically mark a stale entry as being refreshed, so only one worker regenerates it"""
+        now = time.time()
+        claimed = self._conn().execute(
+            """
+            UPDATE knowledge SET refreshing_until = ?
+            WHERE species = ? AND region = ? AND updated < ? AND refreshing_until < ?
+            RETURNING species
+            """,
+            (now + REFRESH_TIMEOUT, species, region, now - self.ttl, now)
+        ).fetchone()
+        return claimed is not None
+
+    def _refresh(self, species: str, region: str, refresh: Callable[[str, str], dict]):
+        try:
+            fields = refresh(species, region)
+            fields = {field: fields[field] for field in KNOWLEDGE_FIELDS if field in fields}
+            if len(fields) < len(KNOWLEDGE_FIELDS):
+                raise ValueError(f"missing fields: {set(KNOWLEDGE_FIELDS) - set(fields)}")
+            self._store(species, region, fields)
+            print(f"🔄 Refreshed species knowledge for {species} ({region})")
+        except Exception as e:
+            # The stale entry keeps being served; the claim expires after REFRESH_TIMEOUT
+            print(f"⚠️ Species knowledge refresh for {species} ({region}) failed: {e}")
+
+    def __len__(self):
+        if not self.enabled:
+            return 0
+        return self._conn().execute("SELECT COUNT(*) FROM knowledge").fetchone()[0]
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        regions = {
+            region: round(hits / samples, 3)
+            for region, samples, hits in self._conn().execute(
+                "SELECT region, samples, hits FROM lookups WHERE samples >= ?", (self.min_samples,))
+        }
+        with self._stats_lock:
+            return {
+                "enabled": True,
+                "entries": len(self),
+                "region_hit_rates": regions,
+                "identification_hits": self.identification_hits,
+                "identification_misses": self.identification_misses,
+                "miss_seconds": round(self.miss_seconds, 3),
+            }
+
+
+def _create_species_knowledge() -> SpeciesKnowledge:
+    enabled = os.getenv("SPECIES_KNOWLEDGE_ENABLED", "true").lower() == "true"
+    db_path = os.getenv("SPECIES_KNOWLEDGE_DB_PATH", "species_knowledge.sqlite3")
+    ttl = float(os.getenv("SPECIES_KNOWLEDGE_TTL", 30 * 86400))
+    min_confidence = float(os.getenv("SPECIES_KNOWLEDGE_MIN_CONFIDENCE", 80))
+    min_hit_rate = float(os.getenv("SPECIES_KNOWLEDGE_MIN_HIT_RATE", 0.5))
+    min_samples = int(os.getenv("SPECIES_KNOWLEDGE_MIN_SAMPLES", 5))
+    if enabled:
+        try:
+            knowledge = SpeciesKnowledge(db_path, ttl, min_confidence, min_hit_rate=min_hit_rate, min_samples=min_samples)
+            print(f"📚 Species knowledge cache: {len(knowledge)} (species, region) entries in {db_path}")
+            return knowledge
+        except Exception as e:
+            print(f"⚠️ Species knowledge cache unavailable ({e}), every analysis uses the full prompt")
+    else:
+        print("ℹ️ Species knowledge cache disabled (SPECIES_KNOWLEDGE_ENABLED)")
+    return SpeciesKnowledge(db_path, ttl, min_confidence, enabled=False)
+
+
+# Global cache, resolved on first use
+species_knowledge = LazyResource("species_knowledge", _create_species_knowledge)
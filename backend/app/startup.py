@@ -0,0 +1,103 @@
+"""
+Application Startup Module
+
+Keeps `import main` cheap: heavy imports (torch, firebase_admin) and remote
+probes (Firestore connectivity) are deferred until first use or run in a
+background warm-up task after the server is already accepting connections.
+
+- LazyResource: a stand-in for a module-level singleton that is built on first
+  attribute access, or ahead of time by the warm-up task
+- warm_up(): runs every startup step concurrently in worker threads and records
+  per-step status and duration for the readiness probe
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class LazyResource:
+    """Builds its target with factory() on first use and delegates attribute access to it"""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    @property
+    def resolved(self) -> bool:
+        return self._target is not None
+
+    def resolve(self) -> Any:
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyResource {self._name} ({'resolved' if self.resolved else 'pending'})>"
+
+
+# step name -> {"status": "pending" | "ok" | "failed", "seconds": float, "error": str}
+startup_status: Dict[str, Dict[str, Any]] = {}
+
+
+def _run_step(name: str, step: Callable[[], Any]):
+    startup_status[name] = {"status": "pending"}
+    start = time.perf_counter()
+    try:
+        step()
+        startup_status[name] = {"status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        startup_status[name] = {"status": "failed", "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+        print(f"❌ Startup step '{name}' failed: {e}")
+
+
+def _load_classifier():
+    from app.plant_classifier import load_model
+    load_model()
+
+
+def _init_firebase():
+    from app.auth import initialize_firebase
+    initialize_firebase()
+
+
+def _resolve_storage():
+    # Both probes need Firebase; run them side by side once it is up
+    from app.collections import collection_manager
+    from app.rewards import rewards_manager
+    threads = [threading.Thread(target=m.resolve) for m in (collection_manager, rewards_manager)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+
+def _firebase_then_storage():
+    _run_step("firebase", _init_firebase)
+    _run_step("storage", _resolve_storage)
+
+
+STEPS = ("classifier", "firebase", "storage")
+
+
+async def warm_up():
+    """Run every startup step concurrently without blocking the event loop"""
+    for name in STEPS:
+        startup_status[name] = {"status": "pending"}
+    start = time.perf_counter()
+    await asyncio.gather(
+        asyncio.to_thread(_run_step, "classifier", _load_classifier),
+        asyncio.to_thread(_firebase_then_storage),
+    )
+    print(f"✅ Startup warm-up finished in {time.perf_counter() - start:.2f}s: {startup_status}")
+
+
+def is_ready() -> bool:
+    """True once every startup step has finished (failed steps degrade but do not block readiness)"""
+    return bool(startup_status) and all(s["status"] != "pending" for s in startup_status.values())
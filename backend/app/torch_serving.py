@@ -0,0 +1,73 @@
+"""
+Classifier Serving Configuration
+
+Per-process CPU settings for classifier inference. Several workers per box each
+using torch's default (one thread per core) oversubscribe the CPU, so by default
+the cores are divided between WEB_CONCURRENCY workers.
+
+- PLANT_CLASSIFIER_INTRA_OP_THREADS: threads per operator (default: cores / workers)
+- PLANT_CLASSIFIER_INTER_OP_THREADS: operators run concurrently (default: 1; the
+  network is a single chain of ops)
+- PLANT_CLASSIFIER_FLUSH_DENORMAL: treat denormal floats as zero (default: true)
+- PLANT_CLASSIFIER_WARMUP_ITERATIONS: inference passes run right after loading (default: 3)
+"""
+
+import os
+from dataclasses import dataclass
+
+import torch
+
+
+@dataclass(frozen=True)
+class ServingConfig:
+    intra_op_threads: int
+    inter_op_threads: int = 1
+    flush_denormal: bool = True
+    warmup_iterations: int = 3
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # respects cgroup/taskset CPU pinning
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _config_from_env() -> ServingConfig:
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+    return ServingConfig(
+        intra_op_threads=int(os.getenv("PLANT_CLASSIFIER_INTRA_OP_THREADS", max(1, available_cpus() // workers))),
+        inter_op_threads=int(os.getenv("PLANT_CLASSIFIER_INTER_OP_THREADS", 1)),
+        flush_denormal=os.getenv("PLANT_CLASSIFIER_FLUSH_DENORMAL", "true").lower() == "true",
+        warmup_iterations=int(os.getenv("PLANT_CLASSIFIER_WARMUP_ITERATIONS", 3)),
+    )
+
+
+_configured_pid = None
+_applied: ServingConfig = None
+
+
+def configure_torch(config: ServingConfig = None) -> ServingConfig:
+    """
+    Apply the thread and denormal settings once per process (again in each
+    forked worker) and return the settings in effect. Must run before the first
+    inference in the process.
+    """
+    global _configured_pid, _applied
+    if _configured_pid == os.getpid():
+        return _applied
+    config = config or _config_from_env()
+
+    torch.set_num_threads(config.intra_op_threads)
+    try:
+        torch.set_num_interop_threads(config.inter_op_threads)
+    except RuntimeError as e:
+        # Only settable before any inter-op work has started in this process
+        print(f"⚠️ Could not set inter-op threads: {e}")
+    if config.flush_denormal and not torch.set_flush_denormal(True):
+        print("⚠️ Denormal flushing is not supported on this CPU")
+
+    _configured_pid, _applied = os.getpid(), config
+    print(f"🧵 Classifier threads for pid {_configured_pid}: intra-op {config.intra_op_threads}, "
+          f"inter-op {config.inter_op_threads}, flush denormal {config.flush_denormal}")
+    return config
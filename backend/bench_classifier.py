@@ -0,0 +1,67 @@
+"""
+Plant classifier runtime benchmark.
+
+Compares images/sec of every available runtime (eager, TorchScript, ONNX Runtime)
+at several batch sizes, so PLANT_CLASSIFIER_RUNTIME=auto can be checked against
+what is actually fastest on this machine.
+
+Usage (from the backend directory, after `python train_model.py --export`):
+    python bench_classifier.py [--seconds 2] [--batch-sizes 1 8 32]
+"""
+
+import argparse
+import os
+import time
+
+import torch
+
+import app.plant_classifier as pc
+
+
+def throughput(runtime, batch_size: int, seconds: float) -> dict:
+    batch = torch.randn(batch_size, 3, 64, 64)
+    for _ in range(10):
+        runtime(batch)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        runtime(batch)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "images_per_sec": batch_size * len(latencies) / sum(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=os.path.join("models", "plant_classifier.pth"))
+    parser.add_argument("--seconds", type=float, default=2.0, help="measurement time per runtime and batch size")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    print("Plant Classifier Runtime Benchmark")
+    print("=" * 60)
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} intra-op threads")
+
+    runtimes = {}
+    for name, runtime_cls in pc.RUNTIMES.items():
+        try:
+            runtimes[name] = runtime_cls(args.weights)
+        except Exception as e:
+            print(f"⚠️ {name}: unavailable ({e})")
+
+    for batch_size in args.batch_sizes:
+        print(f"\nBatch size {batch_size}:")
+        baseline = None
+        for name, runtime in runtimes.items():
+            result = throughput(runtime, batch_size, args.seconds)
+            baseline = baseline or result["images_per_sec"]
+            print(f"   {name:<12} {result['images_per_sec']:9.0f} img/s  p50 {result['p50_ms']:6.2f} ms  "
+                  f"p95 {result['p95_ms']:6.2f} ms  ({result['images_per_sec'] / baseline:.2f}x eager)")
+
+    chosen = pc.create_runtime(args.weights, "auto")
+    print(f"\nauto selects: {chosen.name}")
@@ -0,0 +1,71 @@
+"""
+Preprocessing benchmark.
+
+Compares the old is_plant preprocessing (transforms.Compose built per call, full
+decode of the upload) with app.preprocessing (draft-mode JPEG decode, fixed
+pipeline, reused input tensor) on synthetic uploads of several sizes.
+
+Usage (from the backend directory):
+    python bench_preprocessing.py [--iterations 30]
+"""
+
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+
+from app.preprocessing import decode, preprocessor
+
+SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+
+
+def legacy(image_bytes: bytes):
+    transform = transforms.Compose([
+        transforms.Resize((64, 64)),
+        transforms.ToTensor(),
+        transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
+    ])
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    return transform(image).unsqueeze(0)
+
+
+def upload(width: int, height: int, fmt: str) -> bytes:
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, rng.integers(0, 40, (height, width))], axis=-1).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def measure(fn, data: bytes, iterations: int) -> dict:
+    fn(data)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    print("Preprocessing Benchmark")
+    print("=" * 60)
+    for fmt in ("JPEG", "PNG"):
+        for width, height in SIZES:
+            data = upload(width, height, fmt)
+            decoded, _ = decode(data)
+            old, new = measure(legacy, data, args.iterations), measure(preprocessor, data, args.iterations)
+            print(f"{fmt:<4} {width}x{height} ({len(data) / 1024:.0f} KB upload)")
+            # Decoded RGB size is the dominant per-request allocation
+            print(f"   legacy:  {old:8.2f} ms  decoded {width}x{height} ({width * height * 3 / 2**20:.1f} MB RGB)")
+            print(f"   new:     {new:8.2f} ms  decoded {decoded.size[0]}x{decoded.size[1]} "
+                  f"({decoded.size[0] * decoded.size[1] * 3 / 2**20:.1f} MB RGB)  -> {old / new:.1f}x faster")
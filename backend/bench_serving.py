@@ -0,0 +1,67 @@
+"""
+Classifier serving throughput benchmark.
+
+Forks N worker processes the way gunicorn does (weights preloaded into shared
+memory in the parent, which only the eager runtime reuses) and measures aggregate batch-1 images/sec, comparing
+torch/onnxruntime default threading (every worker uses every core) with the
+per-worker split applied by app.torch_serving.
+
+Usage (from the backend directory):
+    python bench_serving.py [--workers 1 2 4] [--seconds 3] [--runtime auto]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import torch
+
+import app.plant_classifier as pc
+from app.torch_serving import ServingConfig, available_cpus, configure_torch
+
+
+def worker(runtime_name: str, config: ServingConfig, seconds: float, barrier, results):
+    configure_torch(config)
+    runtime = pc.create_runtime(pc._resolve_model_path(pc.DEFAULT_MODEL_PATH), runtime_name)
+    pc.warm_up_runtime(runtime, config.warmup_iterations)
+    batch = torch.randn(pc.INPUT_SHAPE)
+    barrier.wait()
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        runtime(batch)
+        count += 1
+    results.put((runtime.name, count))
+
+
+def run(workers: int, config: ServingConfig, runtime_name: str, seconds: float):
+    ctx = mp.get_context("fork")
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(runtime_name, config, seconds, barrier, results)) for _ in range(workers)]
+    [p.start() for p in processes]
+    counts = [results.get() for _ in processes]
+    [p.join() for p in processes]
+    return counts[0][0], sum(count for _, count in counts) / seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpus = available_cpus()
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, max(1, cpus // 2), cpus, cpus * 2}))
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--runtime", default=os.getenv("PLANT_CLASSIFIER_RUNTIME", "auto"))
+    args = parser.parse_args()
+
+    print("Classifier Serving Benchmark")
+    print("=" * 60)
+    print(f"{cpus} CPUs available")
+    pc.preload_weights()
+
+    for workers in args.workers:
+        default = ServingConfig(intra_op_threads=cpus, inter_op_threads=cpus, flush_denormal=False)
+        tuned = ServingConfig(intra_op_threads=max(1, cpus // workers))
+        name, default_rate = run(workers, default, args.runtime, args.seconds)
+        _, tuned_rate = run(workers, tuned, args.runtime, args.seconds)
+        print(f"{workers:>2} workers ({name}): default threads {default_rate:8.0f} img/s   "
+              f"{tuned.intra_op_threads} thread(s)/worker {tuned_rate:8.0f} img/s   ({tuned_rate / default_rate:.2f}x)")
@@ -0,0 +1,98 @@
+"""
+Startup-time benchmark.
+
+Reports the cost of `import main` broken down per module (via `python -X importtime`),
+then how long the background warm-up takes until /readyz reports ready.
+
+Usage (from the backend directory):
+    python bench_startup.py [--top 20] [--runs 3]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+# Packages worth calling out even when they are not imported at module load
+WATCHED = ("torch", "torchvision", "firebase_admin", "google.cloud.firestore", "PIL", "numpy", "fastapi", "requests")
+
+
+def measure_import(runs: int):
+    """Return (wall seconds per run, {module: (self_us, cumulative_us, depth)} from the last run)"""
+    walls = []
+    modules = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        walls.append(time.perf_counter() - start)
+        modules = {}
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                modules[name] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return walls, modules
+
+
+def measure_ready() -> dict:
+    """Time from app startup until warm-up reports ready, with per-step durations"""
+    from fastapi.testclient import TestClient
+    start = time.perf_counter()
+    import main
+    import_seconds = time.perf_counter() - start
+
+    from app.startup import is_ready, startup_status
+    with TestClient(main.app) as client:
+        first_response = time.perf_counter() - start
+        assert client.get("/healthz").status_code == 200
+        while not is_ready():
+            time.sleep(0.01)
+        ready_seconds = time.perf_counter() - start
+    return {
+        "import": import_seconds,
+        "first_response": first_response,
+        "ready": ready_seconds,
+        "steps": dict(startup_status),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20, help="how many modules to list")
+    parser.add_argument("--runs", type=int, default=3, help="cold `import main` runs to average")
+    args = parser.parse_args()
+
+    print("Startup Benchmark")
+    print("=" * 60)
+    walls, modules = measure_import(args.runs)
+    print(f"`import main` wall time: median {statistics.median(walls) * 1000:.0f} ms over {len(walls)} runs (interpreter start included)")
+
+    print(f"\nApplication modules (cumulative import cost):")
+    for name, (self_us, cumulative_us, _) in sorted(modules.items(), key=lambda kv: -kv[1][1]):
+        if name == "main" or name.startswith("app."):
+            print(f"   {cumulative_us / 1000:8.1f} ms  {name}  (self {self_us / 1000:.1f} ms)")
+
+    print(f"\nTop {args.top} top-level imports by cumulative cost:")
+    top_level = [(name, data) for name, data in modules.items() if data[2] <= 1]
+    for name, (self_us, cumulative_us, _) in sorted(top_level, key=lambda kv: -kv[1][1])[:args.top]:
+        print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+
+    print("\nHeavy packages loaded by `import main`:")
+    for name in WATCHED:
+        status = f"{modules[name][1] / 1000:.1f} ms" if name in modules else "deferred"
+        print(f"   {name:<24} {status}")
+
+    print("\nWarm-up (in-process):")
+    ready = measure_ready()
+    print(f"   import main:        {ready['import'] * 1000:8.0f} ms")
+    print(f"   serving (liveness): {ready['first_response'] * 1000:8.0f} ms")
+    print(f"   ready (readiness):  {ready['ready'] * 1000:8.0f} ms")
+    for step, info in ready["steps"].items():
+        print(f"      {step:<12} {info['status']:<8} {info.get('seconds', 0) * 1000:8.0f} ms")
@@ -0,0 +1,69 @@
+"""
+Training step benchmark.
+
+Times PlantCNN training epochs under each TrainingMode (fp32 / bf16 autocast,
+NCHW / channels-last) on an in-memory synthetic set, so the numbers measure
+the compute side only (data loading is covered by the per-epoch data-wait
+readout in train_model.py). bf16 only pays off on CPUs with native bfloat16
+support (AVX512-BF16 / AMX); elsewhere it is emulated and usually slower.
+
+Usage (from the backend directory):
+    python bench_training.py [--images 4096] [--epochs 3] [--threads N]
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import TensorDataset
+
+from train_model import BATCH_SIZE, LEARNING_RATE, PlantCNN, TrainingMode, make_loader, train_one_epoch
+
+MODES = [
+    TrainingMode(),
+    TrainingMode(channels_last=True),
+    TrainingMode(bf16=True),
+    TrainingMode(bf16=True, channels_last=True),
+]
+
+
+def epoch_time(mode: TrainingMode, dataset, epochs: int) -> float:
+    """Median seconds per epoch (after one warm-up epoch)"""
+    torch.manual_seed(0)
+    device = torch.device("cpu")
+    model = mode.prepare(PlantCNN())
+    optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    loader = make_loader(dataset, True, device, num_workers=0)
+    criterion = nn.CrossEntropyLoss()
+    train_one_epoch(model, loader, criterion, optimizer, device, mode)
+    timings = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        train_one_epoch(model, loader, criterion, optimizer, device, mode)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=4096)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    dataset = TensorDataset(torch.randn(args.images, 3, 64, 64), torch.randint(0, 2, (args.images,)))
+
+    print("Training Step Benchmark")
+    print("=" * 60)
+    print(f"{args.images} images, batch {BATCH_SIZE}, {torch.get_num_threads()} threads, "
+          f"CPU capability {torch.backends.cpu.get_cpu_capability()}")
+
+    baseline = None
+    for mode in MODES:
+        seconds = epoch_time(mode, dataset, args.epochs)
+        baseline = baseline or seconds
+        print(f"{mode.name:>22}: {seconds:6.2f} s/epoch  {args.images / seconds:7.0f} img/s  {baseline / seconds:5.2f}x")
@@ -0,0 +1,131 @@
+"""
+Offline calibration of the species index similarity threshold.
+
+The species index (app/species_index.py) answers an upload from its nearest
+neighbours, so it is only safe with an embedding that puts photos of one species
+closer together than photos of different species. This script measures that on
+held-out photos the embedding was never trained on: every pair of images is
+scored by cosine similarity and labelled same-species or different-species, and
+the lowest threshold is picked at which every stricter cut still keeps at least
+--precision of the pairs above it same-species.
+
+If no threshold reaches the target (or too few same-species pairs pass it) the
+embedding does not separate species and nothing is written; the index then stays
+disabled. The binary plant/not-plant classifier's features fail this check: they
+score unrelated photos (and noise) as similar as two photos of one species.
+
+The result is written to models/plant_classifier.species_similarity.json together
+with the digest of the weights it was measured on; a retrained model needs a new
+calibration before the index will start.
+
+Usage (from the backend directory):
+    python calibrate_species_index.py --species DIR [--precision 0.99] [--min-recall 0.2] [--dry-run]
+where DIR holds one subdirectory of held-out photos per species.
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+import app.plant_classifier as pc
+from app.preprocessing import prepare_image
+from dataset_scanner import IMAGE_EXTENSIONS
+from train_model import MODEL_SAVE_PATH
+
+CURVE_POINTS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 0.98, 0.99, 0.995]
+
+
+def collect_embeddings(species_dir: str, weights: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Embedding and species label of every readable image under species_dir/<species>/"""
+    embeddings, labels = [], []
+    for label, species in enumerate(sorted(os.listdir(species_dir))):
+        folder = os.path.join(species_dir, species)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            with open(os.path.join(folder, name), "rb") as f:
+                image = prepare_image(f.read(), mimetypes.guess_type(name)[0] or "image/jpeg")
+            embedding = pc.embed(image, weights)
+            if embedding is not None:
+                embeddings.append(embedding)
+                labels.append(label)
+    return np.asarray(embeddings, dtype=np.float32).reshape(-1, pc.EMBEDDING_DIM), np.asarray(labels)
+
+
+def pair_similarities(embeddings: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Cosine similarity and same-species flag of every unordered pair of images"""
+    first, second = np.triu_indices(len(labels), k=1)
+    similarities = np.einsum("ij,ij->i", embeddings[first], embeddings[second])
+    return similarities, labels[first] == labels[second]
+
+
+def choose_similarity(similarities: np.ndarray, same: np.ndarray, precision: float) -> Optional[float]:
+    """
+    Lowest threshold at which this and every stricter cut keep at least `precision`
+    same-species pairs among the pairs at or above it; None when there is none.
+    """
+    order = np.argsort(similarities)
+    ordered, is_same = similarities[order], same[order].astype(np.int64)
+    candidates = np.unique(ordered)
+    below = np.searchsorted(ordered, candidates, side="left")
+    same_above = is_same.sum() - np.concatenate([[0], np.cumsum(is_same)])[below]
+    precisions = same_above / (len(ordered) - below)
+    # Precision is not monotonic in the threshold; only trust a cut if nothing stricter is worse
+    safe = np.minimum.accumulate(precisions[::-1])[::-1] >= precision
+    return float(candidates[safe].min()) if safe.any() else None
+
+
+def recall_at(similarities: np.ndarray, same: np.ndarray, threshold: float) -> float:
+    """Share of same-species pairs at or above the threshold"""
+    return float((similarities[same] >= threshold).mean()) if same.any() else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--species", required=True, help="held-out photos, one subdirectory per species")
+    parser.add_argument("--weights", default=MODEL_SAVE_PATH)
+    parser.add_argument("--precision", type=float, default=0.99, help="same-species share required above the threshold")
+    parser.add_argument("--min-recall", type=float, default=0.2, help="same-species pairs that must pass for the index to be useful")
+    parser.add_argument("--dry-run", action="store_true", help="print the curve without writing the calibration")
+    args = parser.parse_args()
+
+    embeddings, labels = collect_embeddings(args.species, args.weights)
+    if len(np.unique(labels)) < 2:
+        print("❌ Need held-out photos of at least two species. Exiting.")
+        raise SystemExit(1)
+    similarities, same = pair_similarities(embeddings, labels)
+    print(f"📊 {len(labels)} held-out images of {len(np.unique(labels))} species: "
+          f"{int(same.sum())} same-species and {int((~same).sum())} different-species pairs")
+
+    print(f"\n{'threshold':>9} {'precision':>10} {'recall':>8} {'pairs':>8}")
+    for t in CURVE_POINTS:
+        above = similarities >= t
+        precision = same[above].mean() if above.any() else float("nan")
+        print(f"{t:9.3f} {precision:10.3f} {recall_at(similarities, same, t):8.3f} {int(above.sum()):8d}")
+
+    similarity = choose_similarity(similarities, same, args.precision)
+    recall = recall_at(similarities, same, similarity) if similarity is not None else 0.0
+    if similarity is None or recall < args.min_recall:
+        print(f"\n❌ No threshold keeps {args.precision:.0%} of the pairs above it same-species with recall >= {args.min_recall:.0%}: "
+              "this embedding does not separate species. The species index stays disabled.")
+        raise SystemExit(1)
+    print(f"\n🎚️ similarity >= {similarity:.4f}: precision >= {args.precision:.2%}, same-species recall {recall:.1%}")
+
+    if not args.dry_run:
+        path = pc.artifact_paths(args.weights)["species_similarity"]
+        with open(path, "w") as f:
+            json.dump({
+                "similarity": similarity,
+                "precision": args.precision,
+                "recall": recall,
+                "images": int(len(labels)),
+                "species": int(len(np.unique(labels))),
+                pc.WEIGHTS_DIGEST: pc.weights_digest(args.weights),
+            }, f, indent=2)
+        print(f"💾 Calibration written to {path}")
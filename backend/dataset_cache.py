@@ -0,0 +1,194 @@
+"""
+Decoded-image shard cache for training.
+
+Decoding full-size photos dominated every training epoch. build_cache() does it
+once: each image is decoded (JPEG draft mode), resized to the working resolution
+and stored as uint8 HWC rows in .npy shard files, with index.json mapping each
+source path to (shard, row). ShardedDataset memory-maps the shards and hands out
+zero-copy views, so an epoch only pays for the random augmentations.
+
+Rebuilding is incremental: paths already in the index are not decoded again
+unless the file changed. Every cached or failed path keeps the size and mtime it
+had when it was decoded; a file edited or replaced in place is decoded again
+(its old row stays behind as dead space in its shard), and a file that failed to
+decode is retried once it changes.
+
+Usage (from the backend directory):
+    python dataset_cache.py [--cache-dir data_cache] [--workers N]
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+
+from app.preprocessing import INPUT_SIZE, decode
+
+CACHE_DIR = "data_cache"
+INDEX_FILE = "index.json"
+SHARD_SIZE = 4096  # images per shard file (64x64x3 uint8 -> 48 MB)
+
+
+def _decode_resized(path: str, size: Tuple[int, int]) -> Optional[np.ndarray]:
+    """uint8 (H, W, 3) at the working resolution, or None if the file cannot be decoded"""
+    try:
+        with open(path, "rb") as f:
+            image, _ = decode(f.read(), size)
+        # Same resampling as transforms.Resize on PIL images
+        return np.asarray(image.resize((size[1], size[0]), Image.BILINEAR), dtype=np.uint8)
+    except Exception:
+        return None
+
+
+def _fingerprint(path: str) -> Optional[List[int]]:
+    """[size, mtime_ns] of a source file, or None if it is gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_index(cache_dir: str = CACHE_DIR) -> Optional[dict]:
+    path = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_index(cache_dir: str, index: dict):
+    # Write-then-rename so an interrupted build never leaves a truncated index
+    tmp = os.path.join(cache_dir, INDEX_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(cache_dir, INDEX_FILE))
+
+
+def build_cache(paths: Sequence[str], cache_dir: str = CACHE_DIR, size: Tuple[int, int] = INPUT_SIZE,
+                workers: Optional[int] = None, shard_size: int = SHARD_SIZE) -> dict:
+    """Decode every path not yet cached into new shards; returns the updated index"""
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_index(cache_dir)
+    if index is not None and tuple(index["size"]) != tuple(size):
+        print(f"ℹ️  Cache resolution changed to {size}; rebuilding {cache_dir}")
+        index = None
+    elif index is not None and "fingerprints" not in index:
+        print(f"ℹ️  Cache predates file fingerprints; rebuilding {cache_dir}")
+        index = None
+    if index is None:
+        index = {"size": list(size), "shards": [], "rows": {}, "failed": [], "fingerprints": {}}
+
+    fingerprints = {path: _fingerprint(path) for path in paths}  # unique, order kept
+    failed = set(index["failed"])
+    changed = {path for path, fingerprint in fingerprints.items()
+               if (path in index["rows"] or path in failed) and index["fingerprints"].get(path) != fingerprint}
+    if changed:
+        print(f"🔁 {len(changed)} cached images changed on disk and will be decoded again")
+        for path in changed:
+            index["rows"].pop(path, None)
+        index["failed"] = [path for path in index["failed"] if path not in changed]
+        failed -= changed
+    pending = [path for path in fingerprints if path not in index["rows"] and path not in failed]
+    if not pending:
+        print(f"✅ Image cache up to date ({len(index['rows'])} images in {len(index['shards'])} shards)")
+        return index
+    print(f"🗜️  Caching {len(pending)} new images at {size[1]}x{size[0]} into {cache_dir}...")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(pending), shard_size):
+            chunk = pending[start:start + shard_size]
+            arrays = list(pool.map(_decode_resized, chunk, repeat(size), chunksize=32))
+            decoded = [(path, array) for path, array in zip(chunk, arrays) if array is not None]
+            index["failed"].extend(path for path, array in zip(chunk, arrays) if array is None)
+            index["fingerprints"].update((path, fingerprints[path]) for path in chunk)
+            if not decoded:
+                continue
+
+            shard_id = len(index["shards"])
+            shard_file = f"shard-{shard_id:05d}.npy"
+            shard = np.lib.format.open_memmap(os.path.join(cache_dir, shard_file), mode="w+",
+                                              dtype=np.uint8, shape=(len(decoded), size[0], size[1], 3))
+            for row, (path, array) in enumerate(decoded):
+                shard[row] = array
+                index["rows"][path] = [shard_id, row]
+            shard.flush()
+            del shard
+            index["shards"].append({"file": shard_file, "count": len(decoded)})
+            # Persist after every shard so an interrupted build resumes where it stopped
+            _write_index(cache_dir, index)
+            print(f"   {shard_file}: {len(decoded)} images")
+
+    _write_index(cache_dir, index)
+    if index["failed"]:
+        print(f"⚠️ {len(index['failed'])} images could not be decoded and are excluded")
+    print(f"✅ Image cache ready ({len(index['rows'])} images in {len(index['shards'])} shards)")
+    return index
+
+
+class ShardedDataset(Dataset):
+    """
+    (paths, labels) served from the shard cache. Items are uint8 (3, H, W) tensor
+    views of the memory-mapped shards until `transform` turns them into model input.
+    Paths missing from the cache (undecodable images) are dropped.
+    """
+
+    def __init__(self, paths: Sequence[str], labels: Sequence[int], cache_dir: str = CACHE_DIR, transform=None):
+        index = load_index(cache_dir)
+        if index is None:
+            raise FileNotFoundError(f"No image cache in {cache_dir}; run build_cache() first")
+        self.cache_dir = cache_dir
+        self.transform = transform
+        self.shard_files: List[str] = [os.path.join(cache_dir, s["file"]) for s in index["shards"]]
+        self.rows: List[Tuple[int, int]] = []
+        self.labels: List[int] = []
+        self.paths: List[str] = []
+        for path, label in zip(paths, labels):
+            location = index["rows"].get(path)
+            if location is not None:
+                self.rows.append(tuple(location))
+                self.labels.append(label)
+                self.paths.append(path)
+        self._shards: Dict[int, np.ndarray] = {}
+
+    def __getstate__(self):
+        # DataLoader workers open their own maps instead of receiving pickled copies
+        state = dict(self.__dict__)
+        state["_shards"] = {}
+        return state
+
+    def _shard(self, shard_id: int) -> np.ndarray:
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            # Copy-on-write map: views are writable for torch without copying the file
+            shard = self._shards[shard_id] = np.load(self.shard_files[shard_id], mmap_mode="c")
+        return shard
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        shard_id, row = self.rows[idx]
+        image = torch.from_numpy(self._shard(shard_id)[row]).permute(2, 0, 1)
+        if self.transform:
+            image = self.transform(image)
+        return image, self.labels[idx]
+
+
+if __name__ == "__main__":
+    from train_model import BinaryDataset, PLANT_DIR, TREE_DIR, NON_PLANT_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="decode processes (default: all cores)")
+    args = parser.parse_args()
+
+    dataset = BinaryDataset(PLANT_DIR, TREE_DIR, NON_PLANT_DIR)
+    build_cache(dataset.image_paths, args.cache_dir, workers=args.workers)
@@ -0,0 +1,196 @@
+"""
+Training dataset scanner.
+
+Walks the source directories, validates every image once in a process pool
+(content hash, full decode, dimensions) and writes a CSV manifest:
+
+    path, label, source, size, mtime_ns, hash, width, height, error
+
+Training reads the manifest instead of walking the trees, and broken files are
+known up front instead of failing mid-epoch. Rescans are incremental: a file
+whose size and mtime are unchanged keeps its manifest row; only new or changed
+files are hashed and decoded again. The sources a manifest was scanned from are
+listed beside it (<manifest>.sources.json), so a source directory without images
+still counts as scanned.
+
+Usage (from the backend directory):
+    python dataset_scanner.py [--manifest data_manifest.csv] [--workers N] [--full]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+MANIFEST_PATH = "data_manifest.csv"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    label: int  # 0 non-plant, 1 plant
+    source: str  # which source directory the image came from (e.g. "plants", "extra_plants")
+    size: int
+    mtime_ns: int
+    hash: str = ""
+    width: int = 0
+    height: int = 0
+    error: str = ""  # non-empty: the image cannot be used
+
+    @property
+    def valid(self) -> bool:
+        return not self.error
+
+
+@dataclass(frozen=True)
+class Source:
+    name: str
+    directory: str
+    label: int
+
+
+def _walk(directory: str) -> Iterator[os.DirEntry]:
+    """Recursive scandir; DirEntry.stat() reuses the data the directory listing already returned"""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def content_hash(data: bytes) -> str:
+    """Identity of an image file's bytes; copies of one photo share it wherever they live"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _inspect(path: str) -> Tuple[str, int, int, str]:
+    """(hash, width, height, error) for one file; runs in a worker process"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = content_hash(data)
+    except OSError as e:
+        return "", 0, 0, f"unreadable: {e}"
+    try:
+        from app.preprocessing import decode
+        image, (width, height) = decode(data)
+        image.load()
+        return digest, width, height, ""
+    except Exception as e:
+        return digest, 0, 0, f"undecodable: {e}"
+
+
+def load_manifest(manifest_path: str = MANIFEST_PATH) -> List[ManifestEntry]:
+    if not os.path.exists(manifest_path):
+        return []
+    types = {f.name: f.type for f in fields(ManifestEntry)}
+    with open(manifest_path, newline="") as f:
+        return [
+            ManifestEntry(**{k: (int(v) if types[k] in (int, "int") else v) for k, v in row.items()})
+            for row in csv.DictReader(f)
+        ]
+
+
+def write_manifest(entries: Sequence[ManifestEntry], manifest_path: str = MANIFEST_PATH):
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(ManifestEntry)])
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow(asdict(entry))
+    os.replace(tmp, manifest_path)
+
+
+def _sources_path(manifest_path: str) -> str:
+    return manifest_path + ".sources.json"
+
+
+def scanned_sources(manifest_path: str = MANIFEST_PATH) -> Set[Tuple[str, str]]:
+    """(name, directory) of every existing source the manifest was last scanned from"""
+    try:
+        with open(_sources_path(manifest_path)) as f:
+            return {(s["name"], s["directory"]) for s in json.load(f)}
+    except (OSError, ValueError, KeyError, TypeError):
+        return set()
+
+
+def _write_sources(sources: Sequence[Source], manifest_path: str):
+    path = _sources_path(manifest_path)
+    with open(path + ".tmp", "w") as f:
+        json.dump([{"name": s.name, "directory": s.directory} for s in sources], f)
+    os.replace(path + ".tmp", path)
+
+
+def scan(sources: Sequence[Source], manifest_path: str = MANIFEST_PATH, workers: Optional[int] = None,
+         full: bool = False) -> List[ManifestEntry]:
+    """Rescan `sources`, re-inspecting only new or changed files (all files if full=True)"""
+    previous: Dict[str, ManifestEntry] = {} if full else {e.path: e for e in load_manifest(manifest_path)}
+    entries: List[ManifestEntry] = []
+    pending: List[ManifestEntry] = []
+    for source in sources:
+        if not os.path.exists(source.directory):
+            print(f"⚠️ Warning: {source.name} directory not found: {source.directory}")
+        for item in _walk(source.directory):
+            stat = item.stat()
+            old = previous.get(item.path)
+            if old and old.size == stat.st_size and old.mtime_ns == stat.st_mtime_ns:
+                old.label, old.source = source.label, source.name
+                entries.append(old)
+            else:
+                entry = ManifestEntry(item.path, source.label, source.name, stat.st_size, stat.st_mtime_ns)
+                entries.append(entry)
+                pending.append(entry)
+
+    if pending:
+        print(f"🔎 Inspecting {len(pending)} new or changed images ({len(entries) - len(pending)} unchanged)...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_inspect, [e.path for e in pending], chunksize=64)
+            for entry, (digest, width, height, error) in zip(pending, results):
+                entry.hash, entry.width, entry.height, entry.error = digest, width, height, error
+
+    write_manifest(entries, manifest_path)
+    # Written after the manifest: a crash in between only costs an extra rescan.
+    # Missing directories are left out so they are scanned once they appear.
+    _write_sources([s for s in sources if os.path.exists(s.directory)], manifest_path)
+    broken = [e for e in entries if not e.valid]
+    removed = len(set(previous) - {e.path for e in entries})
+    duplicates = sum(count - 1 for count in Counter(e.hash for e in entries if e.valid).values() if count > 1)
+    print(f"📋 Manifest {manifest_path}: {len(entries)} images, {len(pending)} inspected, {removed} removed, "
+          f"{len(broken)} broken, {duplicates} duplicate copies")
+    for entry in broken[:10]:
+        print(f"   ❌ {entry.path}: {entry.error}")
+    return entries
+
+
+def default_sources(plant_dir: str, tree_dir: str, non_plant_dir: str, extra_plant_dir: str = "extra_plants") -> List[Source]:
+    return [
+        Source("non_plants", non_plant_dir, 0),
+        Source("plants", plant_dir, 1),
+        Source("trees", tree_dir, 1),
+        Source("extra_plants", extra_plant_dir, 1),
+    ]
+
+
+if __name__ == "__main__":
+    from train_model import PLANT_DIR, TREE_DIR, NON_PLANT_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="inspection processes (default: all cores)")
+    parser.add_argument("--full", action="store_true", help="re-inspect every file, ignoring the existing manifest")
+    parser.add_argument("--plants", default=PLANT_DIR)
+    parser.add_argument("--trees", default=TREE_DIR)
+    parser.add_argument("--non-plants", default=NON_PLANT_DIR)
+    args = parser.parse_args()
+
+    scan(default_sources(args.plants, args.trees, args.non_plants), args.manifest, args.workers, args.full)
@@ -0,0 +1,169 @@
+"""
+Distillation set harvester.
+
+Every completed analysis a user saves to their collection carries the LLM's
+verdict (specieIdentified, invasiveOrNot, confidenceScore) next to the uploaded
+image (imageDataUrl). harvest() collects those (image, verdict) pairs from the
+collection store (Firestore when reachable, plus the local JSON file) into a
+training set for the student classifier (train_model.py --student):
+
+    distill_data/images/<hash>.<ext>
+    distill_data/labels.csv   path, hash, species, invasive, confidence, region
+
+Images are stored once per content hash, so re-harvesting only writes new ones.
+Degraded, unparsed or CNN-only results ("Not a Plant") are skipped, and so are
+answers served without the LLM looking at the photo (plant_data.source set by
+the species index or the species knowledge cache): only the teacher's own
+answers are distilled, and only those at or above --min-confidence.
+
+Usage (from the backend directory):
+    python distill_dataset.py [--out distill_data] [--min-confidence 70] [--no-firestore]
+"""
+
+import argparse
+import base64
+import binascii
+import csv
+import os
+import re
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Iterator, List, Optional
+
+from app.confidence import confidence_score
+from app.species_index import NOT_A_SPECIES, species_key
+from dataset_scanner import content_hash
+
+DISTILL_DIR = "distill_data"
+LABELS_FILE = "labels.csv"
+MIN_TEACHER_CONFIDENCE = 70.0  # confidenceScore (0-100) below which a verdict is not used
+COLLECTIONS_FILE = "user_collections.json"
+# plant_data.source of answers that were not the teacher's own (the student would learn our own mistakes)
+NOT_TEACHER_SOURCES = {"species_index", "species_knowledge"}
+
+EXTENSIONS = {"image/jpeg": "jpg", "image/jpg": "jpg", "image/png": "png", "image/webp": "webp",
+              "image/gif": "gif", "image/bmp": "bmp"}
+
+
+@dataclass
+class TeacherLabel:
+    path: str
+    hash: str
+    species: str  # normalized scientific name, e.g. "Pueraria montana"
+    invasive: bool
+    confidence: float  # teacher confidenceScore, 0-100
+    region: str = ""
+
+
+def teacher_label(item: dict, min_confidence: float = MIN_TEACHER_CONFIDENCE) -> Optional[dict]:
+    """{species, invasive, confidence, region} for a usable stored analysis, else None"""
+    plant_data = item.get("plant_data") or {}
+    if item.get("status") not in (None, "completed") or plant_data.get("analysisDegraded"):
+        return None
+    if plant_data.get("source") in NOT_TEACHER_SOURCES:
+        return None
+    if (plant_data.get("specieIdentified") or "").strip().lower() in NOT_A_SPECIES:
+        return None
+    species = species_key(plant_data)
+    confidence = confidence_score(plant_data)
+    if species is None or confidence is None or confidence < min_confidence:
+        return None
+    return {
+        "species": species,
+        "invasive": bool(plant_data.get("invasiveOrNot", False)),
+        "confidence": confidence,
+        "region": item.get("region") or "",
+    }
+
+
+def decode_data_url(url: str):
+    """(bytes, file extension) of a base64 image data URI, or None"""
+    match = re.match(r"data:(image/[\w.+-]+);base64,(.*)", url or "", re.DOTALL)
+    if not match or match.group(1) not in EXTENSIONS:
+        return None
+    try:
+        return base64.b64decode(match.group(2), validate=False), EXTENSIONS[match.group(1)]
+    except (binascii.Error, ValueError):
+        return None
+
+
+def iter_stored_analyses(storage_file: str = COLLECTIONS_FILE, use_firestore: bool = True) -> Iterator[dict]:
+    """Collection items from the local JSON store and, when reachable, Firestore"""
+    from app.collections import FileCollectionManager, _create_firestore_client
+
+    if os.path.exists(storage_file):
+        for items in FileCollectionManager(storage_file).collections.values():
+            yield from items
+
+    client = _create_firestore_client() if use_firestore else None
+    if client is None:
+        return
+    try:
+        for user_doc in client.collection("user_collections").stream():
+            # Legacy layout: the whole collection as an "items" array on the user document
+            yield from (user_doc.to_dict() or {}).get("items", [])
+            for doc in user_doc.reference.collection("items").stream():
+                yield doc.to_dict()
+    except Exception as e:
+        print(f"⚠️ Could not read Firestore collections: {e}")
+
+
+def load_labels(out_dir: str = DISTILL_DIR) -> List[TeacherLabel]:
+    path = os.path.join(out_dir, LABELS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as f:
+        return [
+            TeacherLabel(row["path"], row["hash"], row["species"], row["invasive"] == "True",
+                         float(row["confidence"]), row["region"])
+            for row in csv.DictReader(f)
+        ]
+
+
+def harvest(out_dir: str = DISTILL_DIR, storage_file: str = COLLECTIONS_FILE, use_firestore: bool = True,
+            min_confidence: float = MIN_TEACHER_CONFIDENCE, items=None) -> List[TeacherLabel]:
+    """Write every usable (image, verdict) pair under out_dir; returns the full label list"""
+    image_dir = os.path.join(out_dir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    labels: Dict[str, TeacherLabel] = {label.hash: label for label in load_labels(out_dir)}
+    seen = skipped = 0
+    for item in (iter_stored_analyses(storage_file, use_firestore) if items is None else items):
+        seen += 1
+        verdict = teacher_label(item, min_confidence)
+        decoded = decode_data_url(item.get("imageDataUrl")) if verdict else None
+        if decoded is None:
+            skipped += 1
+            continue
+        data, extension = decoded
+        digest = content_hash(data)
+        previous = labels.get(digest)
+        if previous and previous.confidence >= verdict["confidence"]:
+            continue  # the same photo saved again; keep the most confident verdict
+        path = os.path.join(image_dir, f"{digest}.{extension}")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        labels[digest] = TeacherLabel(path, digest, **verdict)
+
+    tmp = os.path.join(out_dir, LABELS_FILE + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(TeacherLabel)])
+        writer.writeheader()
+        for label in labels.values():
+            writer.writerow(asdict(label))
+    os.replace(tmp, os.path.join(out_dir, LABELS_FILE))
+
+    invasive = {label.species for label in labels.values() if label.invasive}
+    print(f"🎓 Harvested {len(labels)} teacher-labelled images from {seen} stored analyses "
+          f"({skipped} unusable); {len(invasive)} invasive species")
+    return list(labels.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=DISTILL_DIR)
+    parser.add_argument("--collections-file", default=COLLECTIONS_FILE, help="local collection store (FileCollectionManager)")
+    parser.add_argument("--min-confidence", type=float, default=MIN_TEACHER_CONFIDENCE)
+    parser.add_argument("--no-firestore", action="store_true", help="only read the local collection store")
+    args = parser.parse_args()
+
+    harvest(args.out, args.collections_file, not args.no_firestore, args.min_confidence)
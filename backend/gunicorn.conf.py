@@ -0,0 +1,37 @@
+"""
+Production server configuration: gunicorn managing uvicorn workers.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+preload_app imports the app once in the master, and when_ready loads the
+classifier weights into shared memory before any worker is forked. Only
+eager PyTorch models adopt those pages: the eager runtime
+(PLANT_CLASSIFIER_RUNTIME=eager) and the embedding model behind the species
+index. The onnx (the auto default), torchscript and int8 runtimes load or
+freeze their own copy of the weights in every worker. (`uvicorn --workers`
+spawns fresh interpreters and cannot share anything.) Each worker then
+applies its own thread settings after the fork; see app/torch_serving.py.
+"""
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+# Workers size their thread pools from WEB_CONCURRENCY
+os.environ.setdefault("WEB_CONCURRENCY", str(workers))
+
+
+def when_ready(server):
+    # Only read weights here: running inference in the master would start thread
+    # pools that do not survive fork
+    from app.plant_classifier import preload_weights
+    preload_weights()
+
+
+def post_fork(server, worker):
+    from app.torch_serving import configure_torch
+    configure_torch()
@@ -1,16 +1,22 @@
 # main.py
 
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.api import router
-from app.plant_classifier import load_model
+from app.llm_registry import llm_registry
+from app.startup import warm_up, is_ready, startup_status
 
 app = FastAPI()
 
 @app.on_event("startup")
 async def startup_event():
-    load_model()
+    # Model loading, Firebase init and Firestore probes run in the background so the
+    # server accepts connections immediately; /readyz reports when they are done
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+    # Re-read LLM settings from .env on `kill -HUP <pid>` without a restart
+    llm_registry.install_sighup_handler()
 
 # MUST BE CHANGED DURING PRODUCTION
 app.add_middleware(
@@ -46,4 +52,18 @@ async def root():
         }
     }
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: startup warm-up has finished"""
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "steps": startup_status}
+    )
+
 app.include_router(router)
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+INT8 quantization workflow for the plant classifier.
+
+Builds two quantized variants of models/plant_classifier.pth:
+- dynamic: Linear layers (fc1 is most of the network) get int8 weights,
+  activations are quantized on the fly
+- static: convolutions and Linear layers run in int8 with activation ranges
+  calibrated on images drawn from the training dataset
+
+Both are compared against the float model on a held-out split (accuracy, agreement
+with float predictions, latency, artifact size), and the chosen variant is saved as
+models/plant_classifier.int8.pt for PLANT_CLASSIFIER_RUNTIME=int8.
+
+Usage (from the backend directory):
+    python quantize_model.py [--serve static|dynamic] [--calibration-size 512]
+                             [--plants DIR --trees DIR --non-plants DIR]
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Subset
+
+import app.plant_classifier as pc
+from app.preprocessing import EVAL_TRANSFORM
+from train_model import BinaryDataset, PLANT_DIR, TREE_DIR, NON_PLANT_DIR, MODEL_SAVE_PATH, holdout_split
+
+ENGINE = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+
+
+def split_dataset(dataset, calibration_size: int):
+    """Calibration images come only from outside the held-out split"""
+    rest, holdout = holdout_split(dataset)
+    return Subset(dataset, rest[:calibration_size]), Subset(dataset, holdout)
+
+
+def quantize_dynamic_model(model: nn.Module) -> nn.Module:
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(copy.deepcopy(model).eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_model(model: nn.Module, calibration_batches) -> nn.Module:
+    """FX graph mode post-training quantization: insert observers, calibrate, convert"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = ENGINE
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(ENGINE), (torch.zeros(pc.INPUT_SHAPE),))
+    with torch.no_grad():
+        for inputs in calibration_batches:
+            prepared(inputs)
+    return convert_fx(prepared)
+
+
+def save_int8(model: nn.Module, path: str, mode: str) -> str:
+    """Freeze to TorchScript; the engine travels with the artifact so serving can match it"""
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(model.eval(), torch.zeros(pc.INPUT_SHAPE)))
+    meta = json.dumps({"mode": mode, "engine": ENGINE})
+    torch.jit.save(frozen, path, _extra_files={pc.INT8_METADATA: meta})
+    return path
+
+
+def serialized_size(model: nn.Module) -> int:
+    buffer = io.BytesIO()
+    with torch.no_grad():
+        torch.jit.save(torch.jit.freeze(torch.jit.trace(model.eval(), torch.zeros(pc.INPUT_SHAPE))), buffer)
+    return buffer.tell()
+
+
+def evaluate(model: nn.Module, loader, reference=None) -> dict:
+    """Accuracy on the loader, plus agreement with reference predictions when given"""
+    correct = total = 0
+    predictions = []
+    with torch.inference_mode():
+        for inputs, labels in loader:
+            predicted = model(inputs).argmax(dim=1)
+            correct += (predicted == labels).sum().item()
+            total += labels.size(0)
+            predictions.append(predicted)
+    predictions = torch.cat(predictions) if predictions else torch.empty(0, dtype=torch.long)
+    result = {"accuracy": 100 * correct / max(total, 1), "predictions": predictions}
+    if reference is not None and total:
+        result["agreement"] = 100 * (predictions == reference).float().mean().item()
+    return result
+
+
+def latency(model: nn.Module, batch_size: int, iterations: int = 200) -> float:
+    """Median milliseconds per batch"""
+    batch = torch.randn(batch_size, 3, 64, 64)
+    timings = []
+    with torch.inference_mode():
+        for _ in range(10):
+            model(batch)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(batch)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def report(variants: dict, holdout_loader) -> dict:
+    rows = {}
+    reference = None
+    for name, model in variants.items():
+        # Compare frozen graphs so the float row is not penalised for eager overhead
+        with torch.no_grad():
+            frozen = torch.jit.freeze(torch.jit.trace(model.eval(), torch.zeros(pc.INPUT_SHAPE)))
+        scores = evaluate(frozen, holdout_loader, reference)
+        if reference is None:
+            reference = scores["predictions"]
+        rows[name] = {
+            "accuracy": scores["accuracy"],
+            "agreement": scores.get("agreement", 100.0),
+            "latency_ms_b1": latency(frozen, 1),
+            "latency_ms_b32": latency(frozen, 32),
+            "size_kb": serialized_size(model) / 1024,
+        }
+
+    print(f"\n{'variant':<10} {'accuracy':>9} {'agree':>7} {'b=1 ms':>8} {'b=32 ms':>8} {'size KB':>9}")
+    for name, row in rows.items():
+        print(f"{name:<10} {row['accuracy']:8.2f}% {row['agreement']:6.2f}% {row['latency_ms_b1']:8.3f} "
+              f"{row['latency_ms_b32']:8.3f} {row['size_kb']:9.0f}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=MODEL_SAVE_PATH)
+    parser.add_argument("--serve", choices=["static", "dynamic"], default="static", help="variant to save as the int8 artifact")
+    parser.add_argument("--calibration-size", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--plants", default=PLANT_DIR)
+    parser.add_argument("--trees", default=TREE_DIR)
+    parser.add_argument("--non-plants", default=NON_PLANT_DIR)
+    args = parser.parse_args()
+
+    print(f"⚙️  Quantizing {args.weights} (engine: {ENGINE})")
+    model = pc.load_eager_model(args.weights)
+    dataset = BinaryDataset(args.plants, args.trees, args.non_plants, transform=EVAL_TRANSFORM)
+    if len(dataset) == 0:
+        print("❌ No images found for calibration and evaluation. Exiting.")
+        raise SystemExit(1)
+
+    calibration_set, holdout_set = split_dataset(dataset, args.calibration_size)
+    print(f"   Calibration: {len(calibration_set)} images, held-out: {len(holdout_set)} images")
+    calibration_loader = DataLoader(calibration_set, batch_size=args.batch_size, shuffle=False)
+    holdout_loader = DataLoader(holdout_set, batch_size=args.batch_size, shuffle=False)
+
+    variants = {
+        "float": model,
+        "dynamic": quantize_dynamic_model(model),
+        "static": quantize_static_model(model, (inputs for inputs, _ in calibration_loader)),
+    }
+    report(variants, holdout_loader)
+
+    path = save_int8(variants[args.serve], pc.artifact_paths(args.weights)["int8"], args.serve)
+    print(f"\n📦 Saved {args.serve} int8 model to {path} (serve with PLANT_CLASSIFIER_RUNTIME=int8)")
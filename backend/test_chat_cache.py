@@ -0,0 +1,69 @@
+import time
+
+import app.backend as backend
+from app.backend import Imager
+from app.chat_cache import ChatCache
+
+KUDZU = {"species": "Kudzu", "region": "Texas", "userRole": "Homeowner", "invasiveOrNot": True}
+
+
+def test_questions_are_normalized_and_scoped_to_context():
+    cache = ChatCache()
+    cache.put("How do I remove it?", KUDZU, "Dig out the crowns.")
+    assert cache.get("how do i  REMOVE it", KUDZU) == "Dig out the crowns."
+    assert cache.get("How do I remove it?", dict(KUDZU, region=" texas ")) == "Dig out the crowns."
+    assert cache.get("How do I remove it?", dict(KUDZU, userRole="Student")) is None, "role changes the answer"
+    assert cache.get("How do I remove it?", dict(KUDZU, species="Chinaberry")) is None
+    assert cache.get("How do I remove it?") is None
+    assert cache.get("What native alternatives are there?", KUDZU) is None
+    cache.put("Is it edible?", KUDZU, "")
+    assert cache.get("Is it edible?", KUDZU) is None, "empty answers are not cached"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 5, round(2 / 7, 3))
+    print("✅ Chat answers are keyed on the normalized question and plant context")
+
+
+def test_lru_ttl_and_fuzzy_matching():
+    cache = ChatCache(max_entries=2, ttl=60)
+    cache.put("q one", KUDZU, "a1")
+    cache.put("q two", KUDZU, "a2")
+    cache.get("q one", KUDZU)
+    cache.put("q three", KUDZU, "a3")
+    assert cache.get("q two", KUDZU) is None and cache.get("q one", KUDZU) == "a1", "least recently used goes first"
+    assert cache.stats()["evictions"] == 1
+
+    key = next(key for key in cache._entries if key[1] == "q one")
+    cache._entries[key] = ("a1", time.time() - 120)
+    assert cache.get("q one", KUDZU) is None and cache.stats()["entries"] == 1, "expired answers are dropped"
+
+    fuzzy = ChatCache(fuzzy_similarity=0.6)
+    fuzzy.put("what native alternatives can I plant instead", KUDZU, "Crossvine, coral honeysuckle, passionflower.")
+    assert fuzzy.get("what native alternatives can I plant instead of it", KUDZU)
+    assert fuzzy.get("how much does it cost to remove", KUDZU) is None
+    assert fuzzy.stats()["fuzzy_hits"] == 1
+    assert ChatCache().get("what native alternatives can I plant instead of it", KUDZU) is None, "fuzzy matching is opt-in"
+    print("✅ Chat cache evicts by LRU and TTL and optionally matches near-duplicate questions")
+
+
+def test_imager_generates_each_question_once():
+    calls = []
+    original_generate, original_cache = backend.generate, backend.chat_cache
+    backend.generate = lambda prompt, max_tokens=None, **kwargs: calls.append(prompt) or f"answer {len(calls)}"
+    backend.chat_cache = ChatCache()
+    try:
+        imager = Imager()
+        first = imager.chat_response("How do I remove it?", KUDZU)
+        again = imager.chat_response("how do I remove it", KUDZU)
+        other = imager.chat_response("How do I remove it?", dict(KUDZU, region="Florida"))
+    finally:
+        backend.generate, backend.chat_cache = original_generate, original_cache
+    assert first == again == "answer 1" and other == "answer 2" and len(calls) == 2
+    print("✅ Repeated chat questions skip the LLM")
+
+
+if __name__ == "__main__":
+    print("Chat Cache Test")
+    print("=" * 60)
+    test_questions_are_normalized_and_scoped_to_context()
+    test_lru_ttl_and_fuzzy_matching()
+    test_imager_generates_each_question_once()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+
+import app.backend as backend
+from app.backend import Imager
+from app.chat_cache import ChatCache
+from app.chat_sessions import ChatSessionStore, estimate_tokens
+from app.llm_framework import LLM, Gemini
+
+KUDZU = {"species": "Kudzu", "region": "Texas", "userRole": "Homeowner", "invasiveOrNot": True}
+
+
+def test_history_stays_within_token_budget():
+    store = ChatSessionStore(token_budget=200)
+    session = store.open(None, "alice")
+    sizes = []
+    for i in range(50):
+        history = store.history(session)
+        sizes.append(sum(estimate_tokens(t.question) + estimate_tokens(t.answer) for t in history.turns)
+                     + estimate_tokens(history.summary))
+        store.record(session, f"Question number {i} about kudzu?", "An answer of about twenty tokens " * 3)
+    history = store.history(session)
+    assert max(sizes) <= 200, f"history grew past its budget: {max(sizes)}"
+    assert history.turns[-1].question == "Question number 49 about kudzu?", "newest turns are kept verbatim"
+    dropped = history.turns[0].question.replace("Question number ", "").split()[0]
+    assert history.summary.endswith(f"Question number {int(dropped) - 1} about kudzu?"), "older questions are summarized"
+    assert len(history.summary) <= 50 * 4, "the summary keeps its quarter of the budget"
+    print(f"✅ Chat history stays within its token budget (largest {max(sizes)} tokens over 50 turns)")
+
+
+def test_sessions_are_owned_bounded_and_expire():
+    store = ChatSessionStore(max_sessions=2, idle_ttl=60)
+    alice = store.open(None, "alice")
+    store.record(alice, "q", "a", KUDZU)
+    assert store.open(alice.id, "alice") is alice
+    assert store.open(alice.id, "mallory").id != alice.id, "another user cannot continue the session"
+    assert store.open("../../etc/passwd", "alice").id != alice.id
+
+    store.open(None, "bob")
+    store.open(None, "carol")
+    assert store.open(alice.id, "alice").turns == [], "least recently used sessions are dropped without a spill dir"
+
+    idle = store.open(None, "dave")
+    idle.last_used = time.time() - 120
+    assert store.open(idle.id, "dave").id != idle.id, "idle sessions expire"
+    print("✅ Chat sessions are per user, bounded and expire when idle")
+
+
+def test_spilled_sessions_survive_eviction_and_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        worker_a = ChatSessionStore(max_sessions=1, spill_dir=tmp)
+        worker_b = ChatSessionStore(max_sessions=1, spill_dir=tmp)
+        session = worker_a.open(None, "alice")
+        worker_a.record(session, "How do I remove it?", "Dig out the crowns.", KUDZU)
+        worker_a.open(None, "bob")  # pushes alice's session out of memory
+
+        on_b = worker_b.open(session.id, "alice")
+        assert [t.answer for t in on_b.turns] == ["Dig out the crowns."] and on_b.context == KUDZU
+        worker_b.record(on_b, "When?", "Before it seeds.")
+        back_on_a = worker_a.open(session.id, "alice")
+        assert [t.question for t in back_on_a.turns] == ["How do I remove it?", "When?"], "the newest copy wins"
+
+        old = os.path.join(tmp, f"{session.id}.json")
+        os.utime(old, (time.time() - 7200, time.time() - 7200))
+        worker_a.cleanup_spilled()
+        assert not os.path.exists(old)
+    print("✅ Spilled chat sessions survive eviction and are shared between workers")
+
+
+def test_follow_ups_send_history_and_skip_the_cache():
+    prompts = []
+    original_generate, original_cache = backend.generate, backend.chat_cache
+    backend.generate = lambda prompt, max_tokens=None, history=None, **kwargs: prompts.append((prompt, history)) or "answer"
+    backend.chat_cache = ChatCache()
+    store = ChatSessionStore()
+    try:
+        imager = Imager()
+        session = store.open(None, "alice")
+        for question in ("How do I remove it?", "How do I remove it?"):
+            answer = imager.chat_response(question, KUDZU, store.history(session))
+            store.record(session, question, answer, KUDZU)
+    finally:
+        backend.generate, backend.chat_cache = original_generate, original_cache
+    assert len(prompts) == 2, "a follow-up is not answered from the single-question cache"
+    assert prompts[0][1] is None and prompts[1][1] == [("How do I remove it?", "answer")]
+
+    openai = LLM().llm_contents("k", "m", "now", history=[("q", "a")])[0]["messages"]
+    assert [m["role"] for m in openai] == ["user", "assistant", "user"]
+    gemini = Gemini().llm_contents("k", "m", "now", history=[("q", "a")])[0]["contents"]
+    assert [c["role"] for c in gemini] == ["user", "model", "user"]
+    print("✅ Follow-up questions carry the conversation to the model")
+
+
+if __name__ == "__main__":
+    print("Chat Sessions Test")
+    print("=" * 60)
+    test_history_stays_within_token_budget()
+    test_sessions_are_owned_bounded_and_expire()
+    test_spilled_sessions_survive_eviction_and_workers()
+    test_follow_ups_send_history_and_skip_the_cache()
@@ -0,0 +1,148 @@
+import os
+import tempfile
+
+import pytest
+import torch
+
+import app.plant_classifier as pc
+
+WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "plant_classifier.pth")
+ATOL = 1e-4
+
+
+def _inputs():
+    torch.manual_seed(0)
+    return [torch.randn(1, 3, 64, 64), torch.randn(16, 3, 64, 64), torch.zeros(1, 3, 64, 64)]
+
+
+def _exported_weights(tmp):
+    """Copy of the shipped weights with freshly exported artifacts beside it"""
+    weights = os.path.join(tmp, "plant_classifier.pth")
+    model = pc.load_eager_model(WEIGHTS)
+    torch.save(model.state_dict(), weights)
+    paths = pc.artifact_paths(weights)
+    digest = pc.weights_digest(weights)
+    pc.export_torchscript(model, paths["torchscript"], digest)
+    try:
+        pc.export_onnx(model, paths["onnx"], digest)
+    except Exception as e:
+        print(f"⚠️ ONNX export unavailable: {e}")
+    return weights
+
+
+# Float runtimes held to eager parity (int8 is lossy, see test_int8_artifact_is_servable)
+PARITY_RUNTIMES = ("eager", "torchscript", "onnx")
+
+
+@pytest.mark.parametrize("name", PARITY_RUNTIMES)
+def test_runtimes_match_eager(name):
+    """Every available runtime must produce the eager model's logits"""
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = _exported_weights(tmp)
+        reference = pc.EagerRuntime(weights)
+        try:
+            runtime = pc.RUNTIMES[name](weights)
+        except Exception as e:
+            pytest.skip(f"{name} runtime unavailable here: {e}")
+        if name != "eager":
+            assert runtime.source == pc.artifact_paths(weights)[name], f"{name}: fresh artifact not served ({runtime.source})"
+        for batch in _inputs():
+            expected, actual = reference(batch), runtime(batch)
+            assert actual.shape == expected.shape, f"{name}: shape {actual.shape} != {expected.shape}"
+            diff = (actual - expected).abs().max().item()
+            assert diff < ATOL, f"{name}: max |logit diff| {diff:.2e} exceeds {ATOL}"
+        print(f"✅ {name} runtime matches eager logits")
+
+
+def test_stale_artifacts_are_not_served():
+    """Artifacts exported from older weights must not answer for the current .pth"""
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = _exported_weights(tmp)
+        retrained = pc.load_eager_model(weights)
+        with torch.no_grad():
+            retrained.fc3.bias.add_(1.0)
+        torch.save(retrained.state_dict(), weights)
+
+        torchscript = pc.TorchScriptRuntime(weights)
+        assert "traced at startup" in torchscript.source, "a stale TorchScript file is re-traced from the weights"
+        batch = _inputs()[1]
+        assert torch.allclose(torchscript(batch), pc.EagerRuntime(weights)(batch), atol=ATOL)
+        if os.path.exists(pc.artifact_paths(weights)["onnx"]):
+            with pytest.raises(ValueError, match="not exported from the current"):
+                pc.OnnxRuntime(weights)
+            assert pc.create_runtime(weights, "auto").name == "torchscript", "auto skips the stale ONNX graph"
+    print("✅ Artifacts exported from other weights are ignored")
+
+
+def test_torchscript_traces_without_artifact():
+    """Asking for TorchScript without an exported file traces the weights in-process"""
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "plant_classifier.pth")
+        torch.save(pc.load_eager_model(WEIGHTS).state_dict(), weights)
+        runtime = pc.TorchScriptRuntime(weights)
+        assert "traced at startup" in runtime.source
+        batch = _inputs()[0]
+        assert torch.allclose(runtime(batch), pc.EagerRuntime(weights)(batch), atol=ATOL)
+    print("✅ TorchScript runtime falls back to in-process tracing")
+
+
+def test_auto_falls_back_when_artifacts_missing():
+    """auto must still load something when the ONNX artifact is absent"""
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "plant_classifier.pth")
+        torch.save(pc.load_eager_model(WEIGHTS).state_dict(), weights)
+        runtime = pc.create_runtime(weights, "auto")
+        assert runtime.name in ("torchscript", "eager")
+    print(f"✅ auto runtime fell back to {runtime.name}")
+
+
+def test_eager_model_reuses_preloaded_weights():
+    """Models built after preload_weights run on the shared tensors instead of private copies"""
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "plant_classifier.pth")
+        torch.save(pc.load_eager_model(WEIGHTS).state_dict(), weights)
+        shared = pc.preload_weights(weights)
+        try:
+            assert all(tensor.is_shared() for tensor in shared.values())
+            model = pc.load_eager_model(weights)
+            for name, tensor in model.state_dict().items():
+                assert tensor.data_ptr() == shared[name].data_ptr(), f"{name} was copied instead of shared"
+        finally:
+            pc._shared_weights.pop(os.path.abspath(weights), None)
+    print("✅ Eager models adopt the preloaded shared-memory weights")
+
+
+def test_int8_artifact_is_servable():
+    """A statically quantized artifact loads through the int8 runtime and tracks the float model"""
+    from quantize_model import quantize_static_model, save_int8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "plant_classifier.pth")
+        model = pc.load_eager_model(WEIGHTS)
+        torch.save(model.state_dict(), weights)
+        torch.manual_seed(1)
+        calibration = [torch.randn(16, 3, 64, 64) for _ in range(4)]
+        save_int8(quantize_static_model(model, calibration), pc.artifact_paths(weights)["int8"], "static")
+
+        runtime = pc.create_runtime(weights, "int8")
+        assert runtime.metadata["mode"] == "static"
+        batch = torch.randn(64, 3, 64, 64)
+        expected, actual = pc.EagerRuntime(weights)(batch), runtime(batch)
+        agreement = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+        assert agreement >= 0.95, f"int8 predictions agree with float on only {agreement:.0%}"
+    print(f"✅ int8 runtime agrees with float on {agreement:.0%} of predictions")
+
+
+if __name__ == "__main__":
+    print("Classifier Runtime Parity Test")
+    print("=" * 60)
+    for name in PARITY_RUNTIMES:
+        try:
+            test_runtimes_match_eager(name)
+        except pytest.skip.Exception as e:
+            print(f"⚠️ Skipped: {e}")
+    test_stale_artifacts_are_not_served()
+    test_torchscript_traces_without_artifact()
+    test_auto_falls_back_when_artifacts_missing()
+    test_eager_model_reuses_preloaded_weights()
+    test_int8_artifact_is_servable()
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+import app.api as api
+import app.backend as backend
+from app.backend import Imager
+from app.llm_registry import llm_registry
+from app.plant_classifier import PLANT, PlantPrediction
+from app.rate_limiter import RateLimitPolicy
+from app.species_index import SpeciesIndex
+from app.species_knowledge import SpeciesKnowledge
+
+REGIONS = ["Texas", "Florida", "California", "Ontario", "Queensland", "Bavaria", "Kerala", "Patagonia"]
+
+
+def _echo_region_llm(url, llm_contents, mode='default'):
+    """Fake Gemini call: answers slowly with the region it saw in its own prompt"""
+    prompt = llm_contents[0]["contents"][0]["parts"][0]["text"]
+    region = re.search(r"context: Region: ([^,.]+)", prompt).group(1)
+    time.sleep(random.uniform(0.001, 0.02))
+    return '{"specieIdentified": "%s", "confidenceScore": 99}' % region
+
+
+class _PatchedLLM:
+    """Swap the registry's image client output for the echo fake, with the species caches disabled
+    (the real ones would write species_knowledge.sqlite3 and species_index/ into the source tree)"""
+
+    def __enter__(self):
+        self.client = llm_registry.current.image_client
+        self.original = self.client.get_output, backend.species_knowledge, api.species_index
+        self.client.get_output = _echo_region_llm
+        backend.species_knowledge = SpeciesKnowledge(os.devnull, enabled=False)
+        api.species_index = SpeciesIndex(os.devnull, similarity=1.0, enabled=False)
+        return self
+
+    def __exit__(self, *exc):
+        self.client.get_output, backend.species_knowledge, api.species_index = self.original
+
+
+def test_imager_threads_do_not_share_region():
+    """Many threads analysing with different regions must each see their own region"""
+    imager = Imager()
+    jobs = [REGIONS[i % len(REGIONS)] for i in range(200)]
+
+    def run(region):
+        result = imager.analyze_plant_image("data:image/png;base64,AAAA", region=region, date="2025-05-01", season="Spring")
+        return region, result["specieIdentified"]
+
+    with _PatchedLLM(), ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(run, jobs))
+
+    leaks = [(sent, seen) for sent, seen in results if sent != seen]
+    print(f"✅ {len(results) - len(leaks)}/{len(results)} threaded analyses kept their region")
+    assert not leaks, f"Region leaked between requests: {leaks[:5]}"
+
+
+def test_api_concurrent_requests_do_not_share_region():
+    """Concurrent /api/analyze-plant requests through the ASGI app keep their own region"""
+    original_classify = api.classify_plant
+    original_policy = api.rate_limiter.policies["analysis"]
+    api.classify_plant = lambda image: PlantPrediction(PLANT, 0.99, 0.1, "fake")
+    api.rate_limiter.policies["analysis"] = RateLimitPolicy(requests_per_minute=100000)
+
+    async def one(client, region):
+        response = await client.post(
+            "/api/analyze-plant",
+            files={"image": ("leaf.png", b"not-really-a-png", "image/png")},
+            data={"region": region},
+        )
+        assert response.status_code == 200, response.text
+        return region, response.json()["specieIdentified"]
+
+    async def main():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(one(client, REGIONS[i % len(REGIONS)]) for i in range(120)))
+
+    try:
+        with _PatchedLLM():
+            results = asyncio.run(main())
+    finally:
+        api.classify_plant = original_classify
+        api.rate_limiter.policies["analysis"] = original_policy
+
+    leaks = [(sent, seen) for sent, seen in results if sent != seen]
+    print(f"✅ {len(results) - len(leaks)}/{len(results)} concurrent API requests kept their region")
+    assert not leaks, f"Region leaked between requests: {leaks[:5]}"
+
+
+def test_imager_has_no_mutable_request_state():
+    """The shared Imager must not grow per-request attributes while serving"""
+    imager = Imager()
+    before = dict(vars(imager))
+    with _PatchedLLM():
+        threads = [threading.Thread(target=imager.analyze_plant_image, args=("data:image/png;base64,AAAA", region)) for region in REGIONS]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+    assert vars(imager) == before, f"Imager state changed: {vars(imager)}"
+    print("✅ Imager state unchanged after concurrent analyses")
+
+
+def _app():
+    from fastapi import FastAPI
+    app = FastAPI()
+    app.include_router(api.router)
+    return app
+
+
+if __name__ == "__main__":
+    print("Concurrency Stress Test")
+    print("=" * 60)
+    test_imager_threads_do_not_share_region()
+    test_api_concurrent_requests_do_not_share_region()
+    test_imager_has_no_mutable_request_state()
+    print("\n✅ No context leaked between concurrent requests")
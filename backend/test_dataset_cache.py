@@ -0,0 +1,109 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+
+from dataset_cache import ShardedDataset, build_cache, load_index
+
+
+def _write_images(directory, count, offset=0):
+    paths = []
+    for i in range(offset, offset + count):
+        pixels = np.full((300, 400, 3), i * 7 % 255, dtype=np.uint8)
+        pixels[:, :200, 1] = 255 - pixels[:, :200, 1]
+        path = os.path.join(directory, f"{i}.jpg")
+        Image.fromarray(pixels).save(path, quality=95)
+        paths.append(path)
+    return paths
+
+
+def test_cache_rows_match_decoded_images():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_images(tmp, 5)
+        cache_dir = os.path.join(tmp, "cache")
+        build_cache(paths, cache_dir, workers=1, shard_size=2)
+        assert len(load_index(cache_dir)["shards"]) == 3
+
+        dataset = ShardedDataset(paths, [0, 1, 0, 1, 0], cache_dir)
+        for i, path in enumerate(paths):
+            image, label = dataset[i]
+            assert image.dtype == torch.uint8 and image.shape == (3, 64, 64)
+            expected = Image.open(path).convert("RGB").resize((64, 64), Image.BILINEAR)
+            diff = np.abs(image.permute(1, 2, 0).numpy().astype(int) - np.asarray(expected).astype(int)).mean()
+            assert diff < 3, f"cached row {i} differs from a full decode by {diff:.1f} on average"
+            assert label == [0, 1, 0, 1, 0][i]
+    print("✅ Cached rows match decoded images across shards")
+
+
+def test_incremental_build_and_broken_images():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        first = _write_images(tmp, 3)
+        build_cache(first, cache_dir, workers=1)
+
+        broken = os.path.join(tmp, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not a jpeg")
+        more = _write_images(tmp, 2, offset=3)
+        index = build_cache(first + more + [broken], cache_dir, workers=1)
+
+        assert len(index["shards"]) == 2, "only the new images should form a new shard"
+        assert index["shards"][1]["count"] == 2
+        assert index["failed"] == [broken]
+        dataset = ShardedDataset(first + more + [broken], [1] * 6, cache_dir)
+        assert len(dataset) == 5, "undecodable images are dropped from the dataset"
+    print("✅ Rebuilds only decode new files and skip broken ones")
+
+
+def test_changed_files_are_decoded_again():
+    """Files edited or replaced in place must not keep serving stale pixels, and fixed files are retried"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        paths = _write_images(tmp, 2)
+        broken = os.path.join(tmp, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not a jpeg")
+        build_cache(paths + [broken], cache_dir, workers=1)
+        assert build_cache(paths + [broken], cache_dir, workers=1)["shards"][-1]["count"] == 2, "nothing changed, nothing decoded"
+
+        Image.new("RGB", (300, 400), (200, 10, 10)).save(paths[0], quality=95)
+        Image.new("RGB", (300, 400), (10, 10, 200)).save(broken, quality=95)
+        for path in (paths[0], broken):
+            os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+        index = build_cache(paths + [broken], cache_dir, workers=1)
+        assert len(index["shards"]) == 2 and index["shards"][1]["count"] == 2 and index["failed"] == []
+
+        dataset = ShardedDataset(paths + [broken], [0, 1, 1], cache_dir)
+        assert len(dataset) == 3
+        red, _ = dataset[0]
+        blue, _ = dataset[2]
+        assert red[0].float().mean() > 180 and red[2].float().mean() < 30, "the edited image is served, not the old pixels"
+        assert blue[2].float().mean() > 180, "a fixed file is decoded on the next build"
+    print("✅ Images changed on disk are decoded again and failed ones retried")
+
+
+def test_dataset_pickles_without_mapped_shards():
+    """DataLoader workers must reopen the maps rather than receive copies of them"""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_images(tmp, 2)
+        cache_dir = os.path.join(tmp, "cache")
+        build_cache(paths, cache_dir, workers=1)
+        dataset = ShardedDataset(paths, [1, 0], cache_dir)
+        dataset[0]
+        assert dataset._shards
+        clone = pickle.loads(pickle.dumps(dataset))
+        assert clone._shards == {}
+        assert torch.equal(clone[1][0], dataset[1][0])
+    print("✅ Sharded dataset pickles without its memory maps")
+
+
+if __name__ == "__main__":
+    print("Dataset Cache Test")
+    print("=" * 60)
+    test_cache_rows_match_decoded_images()
+    test_incremental_build_and_broken_images()
+    test_changed_files_are_decoded_again()
+    test_dataset_pickles_without_mapped_shards()
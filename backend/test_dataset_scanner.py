@@ -0,0 +1,160 @@
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+import dataset_scanner
+import train_model
+from dataset_scanner import Source, load_manifest, scan
+from train_model import BinaryDataset
+
+
+def _write_images(directory, count, offset=0):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(offset, offset + count):
+        pixels = np.full((30 + i, 40, 3), i * 9 % 255, dtype=np.uint8)
+        path = os.path.join(directory, f"{i}.jpg")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_manifest_records_validated_images():
+    with tempfile.TemporaryDirectory() as tmp:
+        plants = _write_images(os.path.join(tmp, "plants", "nested"), 3)
+        others = _write_images(os.path.join(tmp, "others"), 2, offset=3)
+        broken = os.path.join(tmp, "others", "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not a jpeg")
+        manifest = os.path.join(tmp, "manifest.csv")
+
+        scan([Source("plants", os.path.join(tmp, "plants"), 1), Source("others", os.path.join(tmp, "others"), 0)],
+             manifest, workers=1)
+        entries = {e.path: e for e in load_manifest(manifest)}
+        assert set(entries) == set(plants + others + [broken])
+        assert all(entries[p].label == 1 and entries[p].source == "plants" for p in plants)
+        assert entries[plants[2]].width == 40 and entries[plants[2]].height == 32
+        assert entries[plants[0]].hash and entries[plants[0]].hash != entries[plants[1]].hash
+        assert not entries[broken].valid and entries[broken].error.startswith("undecodable")
+    print("✅ Manifest records labels, dimensions, hashes and broken files")
+
+
+def test_rescan_only_inspects_changed_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_images(os.path.join(tmp, "plants"), 3)
+        sources = [Source("plants", os.path.join(tmp, "plants"), 1)]
+        manifest = os.path.join(tmp, "manifest.csv")
+        scan(sources, manifest, workers=1)
+
+        inspected = []
+        original = dataset_scanner._inspect
+
+        class RecordingPool:
+            def __init__(self, max_workers=None):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def map(self, fn, items, chunksize=1):
+                inspected.extend(items)
+                return map(original, items)
+
+        dataset_scanner.ProcessPoolExecutor, saved = RecordingPool, dataset_scanner.ProcessPoolExecutor
+        try:
+            assert scan(sources, manifest)
+            assert inspected == [], "unchanged files must keep their manifest rows"
+
+            Image.fromarray(np.zeros((50, 50, 3), dtype=np.uint8)).save(paths[1])
+            os.utime(paths[1], ns=(0, 10**9))
+            os.remove(paths[2])
+            added = _write_images(os.path.join(tmp, "plants"), 1, offset=7)
+            entries = {e.path: e for e in scan(sources, manifest)}
+        finally:
+            dataset_scanner.ProcessPoolExecutor = saved
+
+        assert sorted(inspected) == sorted([paths[1]] + added)
+        assert set(entries) == {paths[0], paths[1]} | set(added)
+        assert entries[paths[1]].width == 50
+    print("✅ Rescans only inspect new or changed files")
+
+
+def test_dataset_skips_broken_images_from_manifest():
+    with tempfile.TemporaryDirectory() as tmp:
+        plants = _write_images(os.path.join(tmp, "plants"), 2)
+        non_plants = _write_images(os.path.join(tmp, "non"), 2, offset=2)
+        with open(os.path.join(tmp, "non", "broken.jpg"), "wb") as f:
+            f.write(b"\xff\xd8 truncated")
+        manifest = os.path.join(tmp, "manifest.csv")
+        extra = os.path.join(tmp, "extra")
+
+        dataset = BinaryDataset(os.path.join(tmp, "plants"), os.path.join(tmp, "trees"), os.path.join(tmp, "non"),
+                                manifest_path=manifest, extra_plant_dir=extra)
+        assert sorted(dataset.image_paths) == sorted(plants + non_plants)
+        assert dataset.labels.count(1) == 2 and dataset.labels.count(0) == 2
+
+        # Second construction reads the manifest: a new file is not seen until a rescan
+        _write_images(os.path.join(tmp, "plants"), 1, offset=5)
+        assert len(BinaryDataset(os.path.join(tmp, "plants"), os.path.join(tmp, "trees"), os.path.join(tmp, "non"),
+                                 manifest_path=manifest, extra_plant_dir=extra)) == 4
+        assert len(BinaryDataset(os.path.join(tmp, "plants"), os.path.join(tmp, "trees"), os.path.join(tmp, "non"),
+                                 manifest_path=manifest, rescan=True, extra_plant_dir=extra)) == 5
+    print("✅ Training dataset loads validated images from the manifest")
+
+
+def test_empty_sources_do_not_force_rescans():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_images(os.path.join(tmp, "plants"), 2)
+        _write_images(os.path.join(tmp, "non"), 2, offset=2)
+        os.makedirs(os.path.join(tmp, "trees"))  # exists but holds no images
+        dirs = (os.path.join(tmp, "plants"), os.path.join(tmp, "trees"), os.path.join(tmp, "non"))
+        manifest = os.path.join(tmp, "manifest.csv")
+        BinaryDataset(*dirs, manifest_path=manifest, extra_plant_dir=os.path.join(tmp, "extra"))
+
+        scans = []
+        original = train_model.scan
+        train_model.scan = lambda *args, **kwargs: scans.append(args) or original(*args, **kwargs)
+        try:
+            assert len(BinaryDataset(*dirs, manifest_path=manifest, extra_plant_dir=os.path.join(tmp, "extra"))) == 4
+            assert scans == [], "a scanned empty directory is covered by the manifest"
+            os.makedirs(os.path.join(tmp, "extra"))
+            BinaryDataset(*dirs, manifest_path=manifest, extra_plant_dir=os.path.join(tmp, "extra"))
+            assert len(scans) == 1, "a source that was never scanned still triggers a scan"
+        finally:
+            train_model.scan = original
+    print("✅ Empty source directories count as scanned")
+
+
+def test_unreadable_images_are_skipped_a_bounded_number_of_times():
+    with tempfile.TemporaryDirectory() as tmp:
+        plants = _write_images(os.path.join(tmp, "plants"), 3)
+        dataset = BinaryDataset(os.path.join(tmp, "plants"), os.path.join(tmp, "trees"), os.path.join(tmp, "non"),
+                                manifest_path=os.path.join(tmp, "manifest.csv"), extra_plant_dir=os.path.join(tmp, "extra"))
+        first = dataset.image_paths.index(plants[0])
+        os.remove(plants[0])
+        image, label = dataset[first]
+        assert image.size == (40, 31 if dataset.image_paths[(first + 1) % 3] == plants[1] else 32) and label == 1
+
+        for path in plants[1:]:
+            os.remove(path)
+        try:
+            dataset[0]
+            raise AssertionError("a dataset whose files are all gone must fail")
+        except RuntimeError as e:
+            assert "--rescan" in str(e)
+    print("✅ Vanished images are skipped, and a dataset with none left fails clearly")
+
+
+if __name__ == "__main__":
+    print("Dataset Scanner Test")
+    print("=" * 60)
+    test_manifest_records_validated_images()
+    test_rescan_only_inspects_changed_files()
+    test_dataset_skips_broken_images_from_manifest()
+    test_empty_sources_do_not_force_rescans()
+    test_unreadable_images_are_skipped_a_bounded_number_of_times()
@@ -0,0 +1,93 @@
+import base64
+import io
+import os
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+
+import train_model as tm
+from app.schemas import PlantInfo
+from distill_dataset import harvest, load_labels, species_key, teacher_label
+
+
+def _data_url(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (40, 40, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _item(seed, species="Kudzu (Pueraria montana)", invasive=True, confidence=90, **extra):
+    plant_data = {"specieIdentified": species, "invasiveOrNot": invasive, "confidenceScore": confidence}
+    plant_data.update(extra)
+    return {"id": str(seed), "status": "completed", "region": "Texas", "plant_data": plant_data, "imageDataUrl": _data_url(seed)}
+
+
+def test_teacher_verdicts_are_normalized_and_filtered():
+    assert species_key({"specieIdentified": "Kudzu (Pueraria montana var. lobata)"}) == "Pueraria montana"
+    assert species_key({"specieIdentified": "x", "scientificName": "quercus Virginiana"}) == "Quercus virginiana"
+    assert teacher_label(_item(0, confidence=0.95))["confidence"] == 95.0, "0-1 scores are read as percentages"
+    assert teacher_label(_item(0, confidence=40)) is None, "low-confidence verdicts are not distilled"
+    assert teacher_label(_item(0, species="Not a Plant")) is None, "CNN-only results are not teacher answers"
+    assert teacher_label(_item(0, analysisDegraded=True)) is None
+    assert teacher_label(dict(_item(0), status="analyzing")) is None
+    for source in ("species_index", "species_knowledge"):
+        stored = PlantInfo(**_item(0, source=source)["plant_data"])
+        assert stored.source == source, "the tag survives saving to a collection"
+        assert teacher_label(_item(0, source=source)) is None, "answers served without the LLM are not distilled"
+    print("✅ Teacher verdicts are normalized and unusable analyses skipped")
+
+
+def test_harvest_dedupes_images_and_is_incremental():
+    with tempfile.TemporaryDirectory() as tmp:
+        items = [_item(1), _item(2, "Live Oak (Quercus virginiana)", invasive=False), _item(1, confidence=99),
+                 _item(3, species="Unidentified Plant")]
+        labels = harvest(tmp, items=items)
+        assert len(labels) == 2
+        assert {l.species: l.confidence for l in labels} == {"Pueraria montana": 99.0, "Quercus virginiana": 90.0}
+        assert all(os.path.exists(l.path) for l in labels)
+
+        harvest(tmp, items=[_item(4)])
+        assert len(load_labels(tmp)) == 3, "re-harvesting keeps earlier labels"
+    print("✅ Harvest keeps one image per hash with its most confident verdict")
+
+
+def test_student_classes_and_dataset_labels():
+    with tempfile.TemporaryDirectory() as tmp:
+        items = [_item(i) for i in range(3)] + [_item(10 + i, "Chinese Privet (Ligustrum sinense)") for i in range(2)] \
+            + [_item(20, "Live Oak (Quercus virginiana)", invasive=False)]
+        labels = harvest(os.path.join(tmp, "distill"), items=items)
+        classes = tm.student_classes(labels, min_images=3)
+        assert classes == ["not_plant", "plant", "Pueraria montana"], "rare species do not get a class"
+
+        dataset = tm.StudentDataset(os.path.join(tmp, "p"), os.path.join(tmp, "t"), os.path.join(tmp, "n"), labels, classes,
+                                    manifest_path=os.path.join(tmp, "manifest.csv"), extra_plant_dir=os.path.join(tmp, "e"))
+        by_species = {l.path: l.species for l in labels}
+        for path, label in zip(dataset.image_paths, dataset.labels):
+            assert label == (2 if by_species[path] == "Pueraria montana" else 1)
+        assert dataset.sources == ["distilled"] * 6 and all(0 < c <= 1 for c in dataset.confidences)
+        image, _ = dataset[0]
+        assert image.size == (40, 40)
+    print("✅ Student dataset maps teacher verdicts onto student classes")
+
+
+def test_student_network_is_cpu_cheap():
+    model = tm.PlantStudentCNN(5).eval()
+    with torch.no_grad():
+        assert model(torch.randn(4, 3, 64, 64)).shape == (4, 5)
+        channels_last = tm.TrainingMode(channels_last=True).prepare(tm.PlantStudentCNN(5))
+        assert channels_last(torch.randn(2, 3, 64, 64).to(memory_format=torch.channels_last)).shape == (2, 5)
+    parameters = sum(p.numel() for p in model.parameters())
+    assert parameters < sum(p.numel() for p in tm.PlantCNN().parameters()), "student must stay small"
+    print(f"✅ Student network: {parameters} parameters")
+
+
+if __name__ == "__main__":
+    print("Distillation Test")
+    print("=" * 60)
+    test_teacher_verdicts_are_normalized_and_filtered()
+    test_harvest_dedupes_images_and_is_incremental()
+    test_student_classes_and_dataset_labels()
+    test_student_network_is_cpu_cheap()
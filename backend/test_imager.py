@@ -143,7 +143,9 @@ def test_server_health():
 def test_direct_imager():
     """Test the Imager class directly with two-call approach"""
     try:
+        import app.backend as backend
         from app.backend import Imager
+        from app.species_knowledge import SpeciesKnowledge
 
         imager = Imager()
         image_path = "invasive.png"
@@ -154,8 +156,13 @@ def test_direct_imager():
 
         print("\nTesting Imager class directly...")
 
-        # Test the new two-call approach
-        result = imager.analyze_plant_image(image_path)
+        # Test the new two-call approach (without writing the species knowledge cache into the source tree)
+        original_knowledge = backend.species_knowledge
+        backend.species_knowledge = SpeciesKnowledge(os.devnull, enabled=False)
+        try:
+            result = imager.analyze_plant_image(image_path)
+        finally:
+            backend.species_knowledge = original_knowledge
         print(f"✅ Two-call approach successful!")
         print(f"Result type: {type(result)}")
         print(f"Result keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from app.llm_errors import LLMOverloadedError
+from app.llm_governor import ConcurrencyGovernor
+
+
+def test_limit_grows_additively_and_halves_on_throttle():
+    governor = ConcurrencyGovernor(initial_limit=4, min_limit=1, max_limit=6)
+    for _ in range(4):
+        with governor.slot() as ticket:
+            ticket.succeeded = True
+    assert abs(governor.limit - 5.0) < 0.1, "about +1 per round of successful calls"
+
+    with governor.slot() as ticket:
+        ticket.throttled = True
+    halved = governor.limit
+    assert abs(halved - governor.stats()["limit_exact"]) < 0.01 and 2.4 < halved < 2.6
+    with governor.slot() as ticket:
+        ticket.throttled = True
+    assert governor.limit == halved, "throttles within one latency period count once"
+
+    for _ in range(5):
+        governor._last_decrease -= 60  # a later throttle burst
+        governor.acquire()
+        governor.release(throttled=True)
+    assert governor.limit == governor.min_limit, "never below min_limit"
+
+    for _ in range(200):
+        governor.acquire()
+        governor.release(succeeded=True)
+    assert governor.limit == governor.max_limit, "never above max_limit"
+    assert governor.stats()["throttled"] == 7 and governor.stats()["in_flight"] == 0
+    print("✅ The limit grows by ~1 per round, halves once per throttle burst and stays within bounds")
+
+
+def test_excess_callers_queue_and_are_shed():
+    governor = ConcurrencyGovernor(initial_limit=1, max_queue=1)
+    governor.acquire()
+    start = time.monotonic()
+    try:
+        governor.acquire(timeout=0.05)
+        raise AssertionError("no slot was free")
+    except LLMOverloadedError:
+        assert time.monotonic() - start < 1, "shed at the deadline"
+
+    got_slot = threading.Event()
+    waiter = threading.Thread(target=lambda: (governor.acquire(timeout=5), got_slot.set()))
+    waiter.start()
+    while governor.stats()["queued"] == 0:
+        time.sleep(0.005)
+    try:
+        governor.acquire(timeout=5)
+        raise AssertionError("the queue was full")
+    except LLMOverloadedError as e:
+        assert "queue is full" in str(e)
+
+    governor.release(succeeded=True)
+    assert got_slot.wait(2), "a queued caller takes the freed slot"
+    waiter.join()
+    stats = governor.stats()
+    assert stats["shed"] == 2 and stats["in_flight"] == 1 and stats["queued"] == 0
+    print("✅ Callers beyond the limit wait, and are shed at the deadline or when the queue is full")
+
+
+if __name__ == "__main__":
+    print("LLM Governor Test")
+    print("=" * 60)
+    test_limit_grows_additively_and_halves_on_throttle()
+    test_excess_callers_queue_and_are_shed()
@@ -0,0 +1,83 @@
+import os
+import signal
+import threading
+
+import app.llm_registry as registry_module
+from app.llm_registry import LLMRegistry
+
+SETTINGS = ("LLM_NAME", "LLM_URL", "LLM_FAST_URL", "LLM_FAST_NAME", "LLM_ESCALATION_CONFIDENCE")
+
+
+def _with_env(**values):
+    """Apply LLM settings without .env overriding them; returns a restore function"""
+    saved = {name: os.environ.get(name) for name in SETTINGS}
+    original_load_dotenv = registry_module.load_dotenv
+    registry_module.load_dotenv = lambda **kwargs: None
+    for name in SETTINGS:
+        os.environ.pop(name, None)
+    os.environ.update(values)
+
+    def restore():
+        registry_module.load_dotenv = original_load_dotenv
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return restore
+
+
+def test_reload_swaps_snapshot_and_keeps_it_on_invalid_config():
+    restore = _with_env(LLM_NAME="main-v1", LLM_URL="https://main.test", LLM_ESCALATION_CONFIDENCE="70")
+    try:
+        registry = LLMRegistry()
+        first = registry.current
+        assert first.main.name == "main-v1" and first.fast is None
+
+        os.environ.update(LLM_NAME="main-v2", LLM_FAST_URL="https://fast.test", LLM_FAST_NAME="fast-v1")
+        second = registry.reload()
+        assert registry.current is second and second.main.name == "main-v2" and second.fast.name == "fast-v1"
+        assert first.main.name == "main-v1", "snapshots already handed out are never mutated"
+
+        os.environ.update(LLM_NAME="main-v3", LLM_ESCALATION_CONFIDENCE="very confident")
+        assert registry.reload() is second, "an invalid config keeps the previous snapshot"
+        assert registry.current.main.name == "main-v2"
+    finally:
+        restore()
+    print("✅ Reload swaps in a new snapshot, and an invalid config keeps the old one")
+
+
+def test_sighup_reloads_in_the_background():
+    if not hasattr(signal, "SIGHUP"):
+        print("⚠️ Skipping: no SIGHUP on this platform")
+        return
+    restore = _with_env(LLM_NAME="main-v1", LLM_URL="https://main.test")
+    original_handler = signal.getsignal(signal.SIGHUP)
+    try:
+        registry = LLMRegistry()
+        reloaded = threading.Semaphore(0)
+        reload = registry.reload
+        registry.reload = lambda: (reload(), reloaded.release())
+        registry.install_sighup_handler()
+        before = registry.current
+
+        os.environ["LLM_ESCALATION_CONFIDENCE"] = "not a number"
+        os.kill(os.getpid(), signal.SIGHUP)
+        assert reloaded.acquire(timeout=5), "SIGHUP triggers a reload"
+        assert registry.current is before, "a bad .env on SIGHUP leaves the running config alone"
+
+        os.environ.update(LLM_NAME="main-v2", LLM_ESCALATION_CONFIDENCE="80")
+        os.kill(os.getpid(), signal.SIGHUP)
+        assert reloaded.acquire(timeout=5)
+        assert registry.current.main.name == "main-v2" and registry.current.escalation_confidence == 80
+    finally:
+        signal.signal(signal.SIGHUP, original_handler)
+        restore()
+    print("✅ SIGHUP reloads the configuration without a restart")
+
+
+if __name__ == "__main__":
+    print("LLM Registry Test")
+    print("=" * 60)
+    test_reload_swaps_snapshot_and_keeps_it_on_invalid_config()
+    test_sighup_reloads_in_the_background()
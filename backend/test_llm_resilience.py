@@ -0,0 +1,140 @@
+import threading
+import time
+
+import requests
+
+import app.llm_framework as framework
+from app.llm_errors import LLMCircuitOpenError, LLMConnectionError, LLMHTTPError, LLMTimeoutError
+from app.llm_resilience import CircuitBreaker, ResilientCaller
+
+
+def _raises(error):
+    def attempt(timeout):
+        raise error
+    return attempt
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow(), "opens at the threshold"
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN, "one probe after the cooldown"
+    assert not breaker.allow(), "only one probe at a time"
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN, "a failed probe reopens the circuit"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.consecutive_failures == 0
+    print("✅ Circuit breaker goes closed -> open -> half-open -> closed")
+
+
+def test_half_open_probe_is_released_on_transport_errors():
+    """A probe ending in a non-HTTP requests error must not leave the circuit stuck open"""
+    caller = ResilientCaller(max_attempts=1, failure_threshold=1, reset_timeout=0.05)
+    original_post = framework.requests.post
+    framework.requests.post = lambda *args, **kwargs: (_ for _ in ()).throw(requests.exceptions.ChunkedEncodingError("cut"))
+    url = "https://llm.test/v1"
+    try:
+        for _ in range(3):
+            try:
+                caller.call(url, lambda timeout: framework._post_once(url, {}, {}, timeout))
+                raise AssertionError("the call cannot succeed")
+            except LLMConnectionError:
+                pass  # typed, so the API maps it to a 503
+            except LLMCircuitOpenError:
+                pass
+            time.sleep(0.06)
+    finally:
+        framework.requests.post = original_post
+    breaker = caller.breaker(url)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker._probe_in_flight
+
+    time.sleep(0.06)
+    assert caller.call(url, lambda timeout: "recovered") == "recovered", "the next probe after the cooldown goes through"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    stuck = ResilientCaller(max_attempts=1, failure_threshold=1, reset_timeout=0.05)
+    stuck.breaker(url).record_failure()
+    time.sleep(0.06)
+    try:
+        stuck.call(url, _raises(RuntimeError("bug in the attempt")))
+    except RuntimeError:
+        pass
+    assert not stuck.breaker(url)._probe_in_flight, "untyped failures give the probe back"
+    stuck.total_timeout = -1
+    try:
+        stuck.call(url, lambda timeout: "never")
+    except Exception:
+        pass
+    stuck.total_timeout = 180
+    assert stuck.call(url, lambda timeout: "ok") == "ok", "an exhausted budget gives the probe back"
+    print("✅ Half-open probes are released on every exit without an upstream verdict")
+
+
+def test_retries_back_off_and_stop_on_bad_requests():
+    caller = ResilientCaller(max_attempts=3, base_delay=0.001, max_delay=0.002, failure_threshold=10)
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise LLMTimeoutError("slow")
+        return "answer"
+
+    assert caller.call("flaky", flaky) == "answer" and len(attempts) == 3
+
+    bad = []
+    try:
+        caller.call("bad", lambda timeout: bad.append(1) or (_ for _ in ()).throw(LLMHTTPError(400, "bad request")))
+        raise AssertionError("400 must be raised")
+    except LLMHTTPError as e:
+        assert e.status_code == 400
+    assert len(bad) == 1, "non-retryable errors are not retried"
+    assert caller.breaker("bad").state == CircuitBreaker.CLOSED, "a bad request says the upstream is up"
+
+    try:
+        caller.call("down", _raises(LLMHTTPError(503, "down")))
+    except LLMHTTPError:
+        pass
+    assert caller.breaker("down").consecutive_failures == 3, "every retryable failure counts"
+
+    assert caller._backoff(0, LLMHTTPError(429, retry_after=5)) == 5, "Retry-After is honoured"
+    delays = [caller._backoff(attempt, LLMTimeoutError()) for attempt in range(10)]
+    assert all(0 <= delay <= caller.max_delay for delay in delays), "backoff is capped"
+    print("✅ Retryable failures back off and retry; bad requests fail at once")
+
+
+def test_slow_attempts_are_hedged():
+    caller = ResilientCaller(hedge=True, hedge_min_samples=5, failure_threshold=10)
+    for _ in range(5):
+        caller.call("hedged", lambda timeout: "fast")
+    calls = []
+    release = threading.Event()
+
+    def first_slow(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            release.wait(2)
+            return "slow"
+        return "hedge"
+
+    start = time.monotonic()
+    assert caller.call("hedged", first_slow) == "hedge"
+    release.set()
+    assert time.monotonic() - start < 1 and caller.hedged_count == 1 and caller.hedge_wins == 1
+    print("✅ An attempt slower than the recent p95 is hedged and the faster answer wins")
+
+
+if __name__ == "__main__":
+    print("LLM Resilience Test")
+    print("=" * 60)
+    test_breaker_opens_probes_and_closes()
+    test_half_open_probe_is_released_on_transport_errors()
+    test_retries_back_off_and_stop_on_bad_requests()
+    test_slow_attempts_are_hedged()
@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.api as api
+import app.maps as maps
+from app.maps import MapManager, etag_matches, export_markers
+from app.schemas import CreateMarkerRequest
+
+AUSTIN = dict(latitude=30.27, longitude=-97.74)
+
+
+def _manager(tmp: str, name: str = "markers.json") -> MapManager:
+    return MapManager(os.path.join(tmp, name))
+
+
+def _add(manager: MapManager, plant: str, user: str = "alice"):
+    return manager.add_marker(user, user.title(), CreateMarkerRequest(plant_name=plant, is_invasive=True, **AUSTIN))
+
+
+def _client(manager: MapManager, uid: str = "alice") -> TestClient:
+    app = FastAPI()
+    app.include_router(api.router)
+    app.dependency_overrides[api.get_current_user] = lambda: {"uid": uid}
+    app.dependency_overrides[api.get_current_user_optional] = lambda: {"uid": uid}
+    api.map_manager = manager
+    return TestClient(app)
+
+
+def test_delta_cursor_and_tombstones():
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = _manager(tmp)
+        kudzu, privet = _add(manager, "Kudzu"), _add(manager, "Privet")
+        full = manager.get_markers_delta()
+        assert full.reset and [m.id for m in full.added] == [kudzu.id, privet.id] and full.cursor == 2
+
+        assert manager.get_markers_delta(cursor=full.cursor).added == []
+        tallow = _add(manager, "Chinese tallow")
+        assert manager.remove_marker(kudzu.id, "alice")
+        delta = manager.get_markers_delta(cursor=full.cursor)
+        assert [m.id for m in delta.added] == [tallow.id] and delta.removed == [kudzu.id] and not delta.reset
+        assert delta.cursor == 4 and manager.get_markers_delta(cursor=delta.cursor).removed == []
+
+        since = manager.get_markers_delta(since=datetime.now() - timedelta(hours=1))
+        assert {m.id for m in since.added} == {privet.id, tallow.id} and since.removed == [kudzu.id]
+        assert manager.get_markers_delta(cursor=99).reset, "a cursor from a newer store resyncs"
+
+        reloaded = _manager(tmp)
+        assert reloaded.get_markers_delta(cursor=2).removed == [kudzu.id] and reloaded.revision == 4
+        try:
+            manager.remove_marker(privet.id, "mallory")
+            raise AssertionError("only the owner may remove a marker")
+        except PermissionError:
+            pass
+        assert not manager.remove_marker("no-such-marker", "alice")
+    print("✅ Delta sync returns additions and tombstones after a cursor or timestamp")
+
+
+def test_tombstones_are_capped():
+    original = maps.MAX_TOMBSTONES
+    maps.MAX_TOMBSTONES = 3
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = _manager(tmp)
+            markers = [_add(manager, f"Kudzu {i}") for i in range(6)]
+            cursor = manager.revision
+            for m in markers[:5]:
+                manager.remove_marker(m.id, "alice")
+            assert len(manager.tombstones) == 3 and manager.tombstone_floor == cursor + 2
+            assert manager.get_markers_delta(cursor=cursor + 2).removed == [m.id for m in markers[2:5]]
+            behind = manager.get_markers_delta(cursor=cursor)
+            assert behind.reset and [m.id for m in behind.added] == [markers[5].id] and behind.removed == [], \
+                "clients behind the dropped tombstones get a full resync"
+            assert manager.get_markers_delta(since=datetime.now() - timedelta(hours=1)).reset
+    finally:
+        maps.MAX_TOMBSTONES = original
+    print("✅ Tombstones are capped and clients behind the cap resync")
+
+
+def test_unreadable_records_do_not_break_loading():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "markers.json")
+        good = {"id": "a", "user_id": "alice", "latitude": 30.0, "longitude": -97.0, "plant_name": "Kudzu",
+                "is_invasive": True, "timestamp": "2025-01-01T10:00:00Z"}
+        with open(path, "w") as f:
+            json.dump([good, dict(good, id="b", timestamp=None), {k: v for k, v in good.items() if k != "timestamp"}], f)
+        manager = MapManager(path)
+        assert [m.id for m in manager.get_all_markers()] == ["a"] and manager.revision == 1
+
+        with open(path, "w") as f:
+            f.write("{not json")
+        broken = MapManager(path)
+        assert broken.get_all_markers() == [] and broken.get_markers_delta(cursor=0).cursor == 0
+        assert _add(broken, "Privet").id
+    print("✅ Markers without a timestamp are skipped instead of failing the load")
+
+
+def test_marker_list_etag_and_delete_endpoint():
+    original = api.map_manager
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = _manager(tmp)
+            kudzu = _add(manager, "Kudzu")
+            client = _client(manager)
+            first = client.get("/api/map/markers")
+            etag = first.headers["etag"]
+            assert first.status_code == 200 and etag == '"markers-1"'
+            for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+                assert client.get("/api/map/markers", headers={"If-None-Match": header}).status_code == 304, header
+            assert client.get("/api/map/markers", headers={"If-None-Match": '"markers-0"'}).status_code == 200
+            assert etag_matches('W/"markers-1"', '"markers-1"') and not etag_matches('"markers-1"', '"markers-2"')
+
+            assert _client(manager, uid="mallory").delete(f"/api/map/markers/{kudzu.id}").status_code == 403
+            assert client.delete(f"/api/map/markers/{kudzu.id}").status_code == 200
+            assert client.delete(f"/api/map/markers/{kudzu.id}").status_code == 404
+            after = client.get("/api/map/markers", headers={"If-None-Match": etag})
+            assert after.status_code == 200 and after.json() == [] and after.headers["etag"] == '"markers-2"'
+            delta = client.get("/api/map/markers/delta", params={"cursor": 1}).json()
+            assert delta["removed"] == [kudzu.id] and delta["cursor"] == 2
+    finally:
+        api.map_manager = original
+    print("✅ The marker list honours strong, weak and * validators, and DELETE leaves a tombstone")
+
+
+def test_export_is_a_consistent_snapshot():
+    """Removing a marker mid-export must not shift the markers after it out of the stream"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = _manager(tmp)
+        manager.save_markers = lambda: None  # bulk setup; every add would otherwise rewrite the whole file
+        markers = [_add(manager, f"Kudzu {i}") for i in range(600)]  # several hundred, so a batched copy would re-lock mid-export
+        exported = []
+        for m in manager.iter_markers():
+            exported.append(m['id'])
+            if len(exported) == 1:
+                manager.remove_marker(markers[0].id, "alice")
+        assert exported == [m.id for m in markers]
+
+        lines = b''.join(export_markers(manager, fmt="ndjson")).decode().splitlines()
+        assert [json.loads(line)["id"] for line in lines] == [m.id for m in markers[1:]]
+    print("✅ Marker exports stream one consistent snapshot")
+
+
+if __name__ == "__main__":
+    print("Map Markers Test")
+    print("=" * 60)
+    test_delta_cursor_and_tombstones()
+    test_tombstones_are_capped()
+    test_unreadable_records_do_not_break_loading()
+    test_marker_list_etag_and_delete_endpoint()
+    test_export_is_a_consistent_snapshot()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+
+import httpx
+import torch
+
+import app.api as api
+import app.backend as backend
+from app.llm_registry import llm_registry
+from app.plant_classifier import NOT_PLANT, PLANT, UNCERTAIN, PlantPrediction, Thresholds
+from app.rate_limiter import RateLimitPolicy
+from app.species_index import SpeciesIndex
+from app.species_knowledge import SpeciesKnowledge
+from tune_thresholds import choose_thresholds
+
+
+def test_thresholds_split_into_three_verdicts():
+    thresholds = Thresholds(accept=0.8, reject=0.2)
+    assert thresholds.verdict(0.95) == PLANT
+    assert thresholds.verdict(0.8) == PLANT
+    assert thresholds.verdict(0.5) == UNCERTAIN
+    assert thresholds.verdict(0.2) == UNCERTAIN
+    assert thresholds.verdict(0.05) == NOT_PLANT
+    # Defaults reproduce the original single 0.5 cut-off
+    assert Thresholds().verdict(0.49) == NOT_PLANT and Thresholds().verdict(0.5) == PLANT
+    print("✅ accept/reject thresholds give plant, gray band and not-plant verdicts")
+
+
+def test_choose_thresholds_meets_precision_targets():
+    """Overlapping score distributions leave a gray band between the two cut-offs"""
+    generator = torch.Generator().manual_seed(0)
+    non_plants = torch.rand(2000, generator=generator) * 0.6
+    plants = 0.4 + torch.rand(2000, generator=generator) * 0.6
+    probabilities = torch.cat([non_plants, plants])
+    labels = torch.cat([torch.zeros(2000, dtype=torch.long), torch.ones(2000, dtype=torch.long)])
+
+    accept, reject = choose_thresholds(probabilities, labels, accept_precision=0.99, reject_precision=0.99)
+    assert reject < accept, (accept, reject)
+    assert (labels[probabilities < reject] == 0).float().mean() >= 0.99
+    assert (labels[probabilities >= accept] == 1).float().mean() >= 0.99
+    assert 0.35 < reject <= 0.41 and 0.59 <= accept < 0.65, (accept, reject)
+    print(f"✅ tuned thresholds: reject < {reject:.3f}, accept >= {accept:.3f}")
+
+
+def test_gray_band_goes_to_llm_and_rejects_skip_it():
+    calls = []
+    client = llm_registry.current.image_client
+    original_output, original_classify = client.get_output, api.classify_plant
+    original_policy = api.rate_limiter.policies["analysis"]
+    original_caches = backend.species_knowledge, api.species_index
+    api.rate_limiter.policies["analysis"] = RateLimitPolicy(requests_per_minute=100000)
+    # The real species caches would write species_knowledge.sqlite3 and species_index/ into the source tree
+    backend.species_knowledge = SpeciesKnowledge(os.devnull, enabled=False)
+    api.species_index = SpeciesIndex(os.devnull, similarity=1.0, enabled=False)
+    client.get_output = lambda url, llm_contents, mode='default': calls.append(url) or '{"specieIdentified": "Kudzu", "confidenceScore": 95}'
+
+    async def analyze(verdict, probability):
+        api.classify_plant = lambda image: PlantPrediction(verdict, probability, 0.5, "fake")
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            response = await http.post("/api/analyze-plant", files={"image": ("leaf.png", b"png", "image/png")}, data={"region": "Texas"})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    try:
+        rejected = asyncio.run(analyze(NOT_PLANT, 0.02))
+        assert rejected["specieIdentified"] == "Not a Plant" and not calls
+        gray = asyncio.run(analyze(UNCERTAIN, 0.4))
+        assert gray["specieIdentified"] == "Kudzu" and len(calls) >= 1
+        assert gray["classifier"] == {"verdict": UNCERTAIN, "plantProbability": 0.4, "latencyMs": 0.5, "runtime": "fake"}
+    finally:
+        client.get_output, api.classify_plant = original_output, original_classify
+        api.rate_limiter.policies["analysis"] = original_policy
+        backend.species_knowledge, api.species_index = original_caches
+    print("✅ Rejected images skip the LLM; gray-band images are analysed by it")
+
+
+def _app():
+    from fastapi import FastAPI
+    app = FastAPI()
+    app.include_router(api.router)
+    return app
+
+
+if __name__ == "__main__":
+    print("Plant Threshold Test")
+    print("=" * 60)
+    test_thresholds_split_into_three_verdicts()
+    test_choose_thresholds_meets_precision_targets()
+    test_gray_band_goes_to_llm_and_rejects_skip_it()
@@ -0,0 +1,88 @@
+import io
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from app.preprocessing import EVAL_TRANSFORM, Preprocessor, decode, prepare_image, preprocessor
+
+# What is_plant used to build on every call
+LEGACY_TRANSFORM = transforms.Compose([
+    transforms.Resize((64, 64)),
+    transforms.ToTensor(),
+    transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
+])
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def _photo(width: int, height: int) -> Image.Image:
+    """Smooth gradient with some texture, closer to a photo than random noise"""
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) % 64 * 4], axis=-1).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def test_matches_legacy_transform_for_png():
+    """Non-JPEG input goes through the same resize and normalization as before"""
+    data = open("flower.png", "rb").read()
+    legacy = LEGACY_TRANSFORM(Image.open(io.BytesIO(data)).convert("RGB")).unsqueeze(0)
+    diff = (preprocessor(data) - legacy).abs().max().item()
+    assert diff < 1e-5, f"preprocessed tensor differs from legacy transform by {diff}"
+    assert torch.allclose(EVAL_TRANSFORM(Image.open(io.BytesIO(data)).convert("RGB")).unsqueeze(0), legacy)
+    print(f"✅ PNG preprocessing matches legacy transform (max diff {diff:.1e})")
+
+
+def test_jpeg_is_decoded_at_reduced_resolution():
+    """Large JPEGs are DCT-scaled on decode and still land close to the full decode"""
+    data = _encode(_photo(4000, 3000), "JPEG")
+    image, original_size = decode(data)
+    assert original_size == (4000, 3000)
+    assert image.size[0] < 4000 and min(image.size) >= 64, f"unexpected draft size {image.size}"
+
+    legacy = LEGACY_TRANSFORM(Image.open(io.BytesIO(data)).convert("RGB")).unsqueeze(0)
+    diff = (preprocessor(data) - legacy).abs().mean().item()
+    assert diff < 0.05, f"draft decode drifted from full decode by {diff:.3f} on average"
+    print(f"✅ 4000x3000 JPEG decoded at {image.size[0]}x{image.size[1]} (mean diff {diff:.4f})")
+
+
+def test_input_buffer_is_reused_per_thread():
+    local = Preprocessor()
+    image = _photo(200, 100)
+    first, second = local.to_tensor(image), local.to_tensor(image)
+    assert first.data_ptr() == second.data_ptr()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(local.to_tensor(image).data_ptr()))
+    thread.start()
+    thread.join()
+    assert other[0] != first.data_ptr(), "threads must not share an input buffer"
+    print("✅ Input tensor reused within a thread and private across threads")
+
+
+def test_prepared_image_is_shared_and_fails_soft():
+    data = open("flower.png", "rb").read()
+    prepared = prepare_image(data, "image/png")
+    assert prepared.image is not None and prepared.error is None
+    assert prepared.data_uri.startswith("data:image/png;base64,")
+    assert prepared.data_uri is prepared.data_uri  # encoded once
+
+    broken = prepare_image(b"not-an-image", "image/png")
+    assert broken.image is None and broken.error
+    assert broken.data_uri.startswith("data:image/png;base64,")
+    print("✅ PreparedImage caches its data URI and records decode errors")
+
+
+if __name__ == "__main__":
+    print("Preprocessing Test")
+    print("=" * 60)
+    test_matches_legacy_transform_for_png()
+    test_jpeg_is_decoded_at_reduced_resolution()
+    test_input_buffer_is_reused_per_thread()
+    test_prepared_image_is_shared_and_fails_soft()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+import time
+
+from fastapi import HTTPException
+
+from app.rate_limiter import RateLimitPolicy, RateLimiter, SQLiteRateLimiter
+
+
+def _limited(limiter, key, endpoint="analysis") -> HTTPException:
+    try:
+        limiter.check_rate_limit(key, endpoint)
+    except HTTPException as e:
+        return e
+    raise AssertionError("the request should have been limited")
+
+
+def test_token_bucket_allows_burst_then_refills():
+    limiter = RateLimiter(policies={"analysis": RateLimitPolicy(requests_per_minute=60, burst=2)})
+    assert limiter.check_rate_limit("alice") and limiter.check_rate_limit("alice")
+    limited = _limited(limiter, "alice")
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "1"
+    assert limiter.check_rate_limit("bob"), "buckets are per key"
+
+    bucket = limiter.requests["alice"].buckets["analysis"]
+    bucket.updated -= 1.0  # one second at 60/min refills one token
+    assert limiter.get_remaining_requests("alice") == 1
+    assert limiter.check_rate_limit("alice")
+    _limited(limiter, "alice")
+
+    bucket.updated -= 3600
+    assert limiter.get_remaining_requests("alice") == 2, "refill is capped at the burst size"
+    print("✅ Token buckets allow the burst, refill at the policy rate and cap at capacity")
+
+
+def test_eviction_stops_at_blocked_keys():
+    limiter = RateLimiter(policies={"analysis": RateLimitPolicy(requests_per_minute=60)}, max_keys=3, idle_ttl=60)
+    now = time.time()
+    for key in ("blocked", "idle", "active"):
+        limiter.check_rate_limit(key)
+    limiter.max_failures_before_block = 1
+    limiter.record_failure("blocked")
+    limiter.requests.move_to_end("blocked", last=False)
+    limiter.requests["blocked"].last_request_time = now - 120
+    limiter.requests["idle"].last_request_time = now - 120
+
+    limiter.cleanup_old_entries()
+    assert list(limiter.requests) == ["blocked", "idle", "active"], "an active block is not evicted, and eviction stops there"
+    assert _limited(limiter, "blocked").detail.startswith("Too many failed requests")
+
+    limiter.requests.move_to_end("blocked", last=False)
+    limiter.requests["blocked"].last_request_time = now - 120
+    limiter.requests["blocked"].block_until = now - 1
+    limiter.cleanup_old_entries()
+    assert list(limiter.requests) == ["active"], "expired blocks and idle keys go once the front is unblocked"
+
+    for key in ("a", "b", "c", "d"):
+        limiter.check_rate_limit(key)
+    assert len(limiter.requests) == 3 and "active" not in limiter.requests, "max_keys drops the least recently seen"
+    print("✅ Idle keys are evicted from the LRU front, but never past an active block")
+
+
+def test_sqlite_limits_are_shared_across_connections():
+    """Two limiters on one file stand in for two worker processes"""
+    policies = {"analysis": RateLimitPolicy(requests_per_minute=6, burst=3)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "limits.sqlite3")
+        worker_a, worker_b = SQLiteRateLimiter(path, policies), SQLiteRateLimiter(path, policies)
+        assert worker_a.check_rate_limit("alice") and worker_b.check_rate_limit("alice")
+        allowed = []
+        thread = threading.Thread(target=lambda: allowed.append(worker_a.check_rate_limit("alice")))
+        thread.start()
+        thread.join()
+        assert allowed == [True], "another thread's connection draws from the same bucket"
+
+        limited = _limited(worker_b, "alice")
+        assert limited.headers["Retry-After"] == "10", "one token at 6/min takes 10 seconds"
+        assert worker_a.get_remaining_requests("alice") == 0 and worker_b.check_rate_limit("bob")
+
+        worker_a._conn().execute("UPDATE buckets SET updated = updated - 4 WHERE key = 'alice'")
+        assert _limited(worker_b, "alice").headers["Retry-After"] == "6", "Retry-After counts down as tokens refill"
+        worker_a._conn().execute("UPDATE buckets SET updated = updated - 6 WHERE key = 'alice'")
+        assert worker_b.check_rate_limit("alice")
+
+        worker_a.max_failures_before_block = 2
+        worker_a.record_failure("mallory")
+        worker_a.record_failure("mallory")
+        assert _limited(worker_b, "mallory").detail.startswith("Too many failed requests"), "blocks hold across workers"
+    print("✅ SQLite token buckets and failure blocks are shared by every connection")
+
+
+def test_sqlite_tables_are_bounded_by_max_keys():
+    policies = {"analysis": RateLimitPolicy(requests_per_minute=6000), "chat": RateLimitPolicy(requests_per_minute=6000)}
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = SQLiteRateLimiter(os.path.join(tmp, "limits.sqlite3"), policies, max_keys=3)
+        limiter.CLEANUP_INTERVAL = 10 ** 9  # purge only when the test says so
+        limiter.max_failures_before_block = 2
+        for age, key in enumerate(["mallory", "alice", "bob", "carol", "dave"]):
+            limiter.check_rate_limit(key, "analysis")
+            limiter.check_rate_limit(key, "chat")
+            limiter.record_failure(key)
+            for table in ("buckets", "failures"):
+                limiter._conn().execute(f"UPDATE {table} SET updated = updated - ? WHERE key = ?", (100 - age, key))
+        limiter.record_failure("mallory")
+        limiter._conn().execute("UPDATE failures SET updated = updated - 200 WHERE key = 'mallory'")
+
+        limiter.cleanup_old_entries()
+        keys = {row[0] for row in limiter._conn().execute("SELECT key FROM buckets")}
+        assert keys == {"bob", "carol", "dave"}, "the least recently seen keys past max_keys are dropped"
+        failures = {row[0] for row in limiter._conn().execute("SELECT key FROM failures")}
+        assert failures == {"mallory", "bob", "carol", "dave"}, "the oldest key is kept while its block is active"
+        assert _limited(limiter, "mallory").detail.startswith("Too many failed requests")
+
+        threads = [threading.Thread(target=lambda: [limiter.check_rate_limit("bob") for _ in range(50)]) for _ in range(8)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        assert limiter._checks == 10 + 400, "every check is counted"
+    print("✅ SQLite limiter tables stay within max_keys and keep active blocks")
+
+
+if __name__ == "__main__":
+    print("Rate Limiter Test")
+    print("=" * 60)
+    test_token_bucket_allows_burst_then_refills()
+    test_eviction_stops_at_blocked_keys()
+    test_sqlite_limits_are_shared_across_connections()
+    test_sqlite_tables_are_bounded_by_max_keys()
@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from app.plant_classifier import EMBEDDING_DIM, WEIGHTS_DIGEST, artifact_paths, embed, load_species_similarity, weights_digest
+from app.preprocessing import prepare_image
+from app.species_index import SpeciesIndex, species_key
+from calibrate_species_index import choose_similarity, pair_similarities
+
+KUDZU = {"specieIdentified": "Kudzu (Pueraria montana)", "invasiveOrNot": True, "confidenceScore": 95,
+         "nativeRegion": "East Asia", "invasiveEffects": "Smothers trees", "region": "Texas", "classifier": {}}
+PRIVET = {"specieIdentified": "Chinese Privet (Ligustrum sinense)", "invasiveOrNot": True, "confidenceScore": 0.93}
+
+
+def _vector(seed, noise=0.0, base=None):
+    rng = np.random.default_rng(seed)
+    vector = (base if base is not None else rng.random(EMBEDDING_DIM)) + noise * rng.standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+def test_neighbours_must_agree_within_region():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SpeciesIndex(tmp, dim=EMBEDDING_DIM, similarity=0.95, neighbours=5, min_votes=3)
+        kudzu = _vector(1)
+        for i in range(2):
+            assert index.add(_vector(10 + i, 0.02, kudzu), "Texas", KUDZU)
+        assert index.match(kudzu, "Texas") is None, "two neighbours are not enough votes"
+
+        duplicate = _vector(11, 0.02, kudzu)
+        assert not index.add(duplicate, "Texas", KUDZU), "the same photo uploaded again must not add a vote"
+        assert index.add(_vector(12, 0.02, kudzu), "texas ", KUDZU)
+        match = index.match(_vector(13, 0.02, kudzu), "Texas")
+        assert match and match.species == "Pueraria montana" and match.votes == 3
+        assert match.analysis["invasiveEffects"] == "Smothers trees"
+        assert "region" not in match.analysis and "classifier" not in match.analysis, "only species fields are stored"
+        assert index.match(kudzu, "Florida") is None, "neighbours from other regions do not count"
+        assert index.match(_vector(99), "Texas") is None, "dissimilar uploads fall through to the LLM"
+
+        index.add(_vector(14, 0.01, kudzu), "Texas", PRIVET)
+        assert index.match(kudzu, "Texas") is None, "disagreeing neighbours fall through to the LLM"
+        assert not index.add(kudzu, "Texas", dict(KUDZU, confidenceScore=60)), "low-confidence answers are not stored"
+        assert not index.add(kudzu, "Texas", {"specieIdentified": "Unidentified Plant", "confidenceScore": 99})
+    print("✅ Species index answers only when close same-region neighbours agree")
+
+
+def test_workers_share_rows_and_size_is_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = SpeciesIndex(tmp, dim=EMBEDDING_DIM, similarity=0.95, max_entries=10)
+        reader = SpeciesIndex(tmp, dim=EMBEDDING_DIM, similarity=0.95, max_entries=10)
+        kudzu = _vector(1)
+        for i in range(3):
+            writer.add(_vector(20 + i, 0.02, kudzu), "Texas", KUDZU)
+        assert reader.match(kudzu, "Texas") is not None, "rows written by another worker are picked up"
+
+        for i in range(10):
+            writer.add(_vector(40 + i), "Texas", PRIVET)
+        assert len(writer) <= 10, "compaction keeps the index under its bound"
+        reader.refresh()
+        assert len(reader) == len(writer), "readers reload after a compaction"
+        assert reader.match(kudzu, "Texas") is None, "compaction drops the oldest rows"
+    print("✅ Species index rows are shared between workers and bounded")
+
+
+def test_reader_survives_a_compaction_in_progress():
+    """A refresh between the vectors.f32 and rows.jsonl swaps must resync instead of raising"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = SpeciesIndex(tmp, dim=EMBEDDING_DIM, similarity=0.95)
+        reader = SpeciesIndex(tmp, dim=EMBEDDING_DIM, similarity=0.95)
+        kudzu = _vector(1)
+        for i in range(8):
+            writer.add(_vector(20 + i, 0.02, kudzu), "Texas", KUDZU)
+        reader.refresh()
+        for i in range(2):
+            writer.add(_vector(40 + i), "Texas", PRIVET)
+
+        # Replay a compaction to 5 rows up to its first step: vectors.f32 swapped, rows.jsonl not yet
+        path = lambda name: os.path.join(tmp, name)
+        np.array(writer._vectors[-5:]).tofile(path("vectors.f32.tmp"))
+        os.replace(path("vectors.f32.tmp"), path("vectors.f32"))
+        reader.refresh()
+        assert len(reader) == 0 and reader.match(kudzu, "Texas") is None, "old rows are never paired with new vectors"
+
+        with open(path("rows.jsonl.tmp"), "w") as f:
+            f.writelines(json.dumps({"species": s, "region": r}) + "\n" for s, r in zip(writer._species[-5:], writer._regions[-5:]))
+        os.replace(path("rows.jsonl.tmp"), path("rows.jsonl"))
+        reader.refresh()
+        assert len(reader) == 5 and reader.match(kudzu, "Texas").votes == 3, "the next refresh loads the compacted index"
+    print("✅ Readers resync instead of failing when a compaction swaps the files mid-refresh")
+
+
+def test_embeddings_are_normalized_and_stable():
+    def upload(color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (120, 90), color).save(buffer, format="PNG")
+        return prepare_image(buffer.getvalue(), "image/png")
+
+    green = embed(upload((40, 160, 40)))
+    assert green is not None and green.shape == (EMBEDDING_DIM,) and green.dtype == np.float32
+    assert abs(np.linalg.norm(green) - 1) < 1e-5 or not green.any()
+    assert np.allclose(green, embed(upload((40, 160, 40))))
+    assert embed(prepare_image(b"not an image", "image/png")) is None
+    assert species_key({"specieIdentified": "Chinaberry (Melia azedarach)"}) == "Melia azedarach"
+    print("✅ Upload embeddings are normalized and deterministic")
+
+
+def test_confidence_scale():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SpeciesIndex(tmp, similarity=0.95, dim=EMBEDDING_DIM)
+        assert not index.add(_vector(1), "Texas", dict(KUDZU, confidenceScore=1)), "1% verdicts are not remembered"
+        assert index.add(_vector(1), "Texas", dict(KUDZU, confidenceScore=0.95))
+    print("✅ The index reads confidence scores on the 0-100 scale")
+
+
+def test_similarity_is_calibrated_on_held_out_species():
+    def photos(noise):
+        centres = [_vector(seed) for seed in range(8)]
+        embeddings = np.stack([_vector(100 * s + i, noise, centre) for s, centre in enumerate(centres) for i in range(6)])
+        return pair_similarities(embeddings, np.repeat(np.arange(8), 6))
+
+    similarities, same = photos(0.01)
+    threshold = choose_similarity(similarities, same, precision=0.99)
+    assert threshold is not None and (same[similarities >= threshold]).mean() >= 0.99
+    assert (similarities[same] >= threshold).mean() > 0.9, "well separated species keep most same-species pairs"
+
+    # Features that score different species as close as the same species (like the binary
+    # plant classifier's) never get a threshold, so the index cannot start on them
+    similarities, same = photos(0.0)
+    similarities = np.where(same, similarities, similarities.max())
+    assert choose_similarity(similarities, same, precision=0.99) is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "plant_classifier.pth")
+        with open(weights, "wb") as f:
+            f.write(b"weights v1")
+        assert load_species_similarity(weights) is None, "no calibration, no index"
+        with open(artifact_paths(weights)["species_similarity"], "w") as f:
+            json.dump({"similarity": threshold, WEIGHTS_DIGEST: weights_digest(weights)}, f)
+        assert load_species_similarity(weights) == threshold
+        with open(weights, "wb") as f:
+            f.write(b"weights v2")
+        assert load_species_similarity(weights) is None, "a retrained model needs a new calibration"
+    print(f"✅ Species similarity threshold {threshold:.4f} comes from held-out pairs and is tied to the weights")
+
+
+if __name__ == "__main__":
+    print("Species Index Test")
+    print("=" * 60)
+    test_neighbours_must_agree_within_region()
+    test_workers_share_rows_and_size_is_bounded()
+    test_reader_survives_a_compaction_in_progress()
+    test_embeddings_are_normalized_and_stable()
+    test_confidence_scale()
+    test_similarity_is_calibrated_on_held_out_species()
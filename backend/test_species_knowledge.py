@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+import threading
+
+import app.backend as backend
+from app.backend import Imager
+from app.llm_registry import llm_registry
+from app.species_knowledge import SpeciesKnowledge
+
+KUDZU = {
+    "specieIdentified": "Kudzu (Pueraria montana)", "commonName": "Kudzu", "scientificName": "Pueraria montana",
+    "nativeRegion": "East Asia", "invasiveOrNot": True, "confidenceScore": 95, "confidenceReasoning": "Trifoliate leaves",
+    "invasiveEffects": "Smothers trees", "nativeAlternatives": [{"commonName": "Crossvine"}], "removeInstructions": "Dig out crowns",
+}
+IDENTIFIED = {"specieIdentified": "Kudzu (Pueraria montana var. lobata)", "confidenceScore": 0.92, "confidenceReasoning": "Hairy vines"}
+
+
+def test_identification_is_completed_from_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        knowledge = SpeciesKnowledge(os.path.join(tmp, "knowledge.sqlite3"))
+        assert knowledge.complete(IDENTIFIED, "Texas") is None, "uncached species need the full analysis"
+        assert not knowledge.remember(dict(KUDZU, confidenceScore=50), "Texas"), "low-confidence analyses are not cached"
+        assert not knowledge.remember(dict(KUDZU, analysisDegraded=True), "Texas")
+        assert knowledge.remember(KUDZU, "Texas")
+
+        result = knowledge.complete(IDENTIFIED, "Texas")
+        assert result["specieIdentified"] == IDENTIFIED["specieIdentified"], "the identification itself is kept"
+        assert result["confidenceReasoning"] == "Hairy vines"
+        assert result["removeInstructions"] == "Dig out crowns" and result["invasiveOrNot"] is True
+        assert result["knowledge"]["refreshing"] is False and result["source"] == "species_knowledge"
+        assert knowledge.complete(dict(IDENTIFIED, confidenceScore=40), "Texas") is None, "unsure identifications get the full analysis"
+        assert knowledge.complete(IDENTIFIED, "Florida") is None, "knowledge is per region"
+    print("✅ Confident identifications of cached species are completed from the cache")
+
+
+def test_stale_entries_are_served_and_refreshed_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "knowledge.sqlite3")
+        knowledge, other_worker = SpeciesKnowledge(path, ttl=60), SpeciesKnowledge(path, ttl=60)
+        knowledge.remember(KUDZU, "Texas")
+        knowledge._conn().execute("UPDATE knowledge SET updated = updated - 120")
+
+        release = threading.Event()
+        calls = []
+
+        def refresh(species, region):
+            calls.append((species, region))
+            release.wait(5)
+            return dict(KUDZU, removeInstructions="Cut and treat stumps")
+
+        stale = knowledge.complete(IDENTIFIED, "Texas", refresh=refresh)
+        assert stale["removeInstructions"] == "Dig out crowns" and stale["knowledge"]["refreshing"], "stale entries are still served"
+        again = other_worker.complete(IDENTIFIED, "Texas", refresh=refresh)
+        assert not again["knowledge"]["refreshing"], "only one worker claims the refresh"
+        release.set()
+        knowledge._refresher.shutdown(wait=True)
+        assert calls == [("Pueraria montana", "texas")]
+        fresh = other_worker.complete(IDENTIFIED, "Texas", refresh=refresh)
+        assert fresh["removeInstructions"] == "Cut and treat stumps" and fresh["knowledge"]["age"] < 5
+    print("✅ Stale knowledge is served while one background refresh replaces it")
+
+
+def _run_imager(knowledge, species_per_upload):
+    """Analyze one upload per species name; returns (prompts sent, results)"""
+    client = llm_registry.current.image_client
+    original_output, original_knowledge = client.get_output, backend.species_knowledge
+    prompts, species = [], iter(species_per_upload)
+    current = {}
+
+    def fake_llm(url, llm_contents, mode="default"):
+        prompt = llm_contents[0]["contents"][0]["parts"][0]["text"]
+        prompts.append(prompt)
+        answer = dict(KUDZU, specieIdentified=current["name"], scientificName=current["name"])
+        if '"removeInstructions"' in prompt:
+            return json.dumps(answer)
+        return json.dumps({key: answer[key] for key in ("specieIdentified", "commonName", "scientificName", "confidenceScore", "confidenceReasoning")})
+
+    backend.species_knowledge = knowledge
+    client.get_output = fake_llm
+    results = []
+    try:
+        imager = Imager()
+        for current["name"] in species:
+            results.append(imager.analyze_plant_image("data:image/png;base64,AAAA", region="Texas"))
+    finally:
+        backend.species_knowledge = original_knowledge
+        client.get_output = original_output
+    return prompts, results
+
+
+def test_imager_uses_identification_prompt_for_cached_species():
+    with tempfile.TemporaryDirectory() as tmp:
+        knowledge = SpeciesKnowledge(os.path.join(tmp, "knowledge.sqlite3"), min_samples=2)
+        prompts, results = _run_imager(knowledge, ["Pueraria montana"] * 4)
+
+    full = ['"removeInstructions"' in prompt for prompt in prompts]
+    assert full == [True, True, True, False], "full analyses measure the hit rate until it is trusted"
+    assert "knowledge" not in results[2] and results[3]["knowledge"]["species"] == "Pueraria montana"
+    assert {key: results[3][key] for key in KUDZU if key not in ("specieIdentified", "scientificName")} == \
+        {key: KUDZU[key] for key in KUDZU if key not in ("specieIdentified", "scientificName")}
+    print("✅ Repeat species are answered with the identification-only prompt")
+
+
+def test_low_hit_rate_regions_skip_identification():
+    """A region of mostly new species goes straight to the full prompt instead of paying for two calls"""
+    with tempfile.TemporaryDirectory() as tmp:
+        knowledge = SpeciesKnowledge(os.path.join(tmp, "knowledge.sqlite3"), min_samples=2)
+        prompts, _ = _run_imager(knowledge, [f"Genus{letter} speciosa" for letter in "abcdefgh"])
+        assert all('"removeInstructions"' in prompt for prompt in prompts) and len(prompts) == 8
+        assert knowledge.hit_rate("Texas") == 0 and not knowledge.worth_identifying("Texas")
+
+        # A region that was mostly hits and then turns to new species measures the misses and falls back
+        knowledge = SpeciesKnowledge(os.path.join(tmp, "other.sqlite3"), min_samples=2)
+        prompts, _ = _run_imager(knowledge, ["Pueraria montana"] * 4 + [f"Genus{letter} speciosa" for letter in "abcdef"])
+        stats = knowledge.stats()
+        assert (stats["identification_hits"], stats["identification_misses"]) == (1, 2) and stats["miss_seconds"] >= 0
+        assert stats["region_hit_rates"]["texas"] < knowledge.min_hit_rate
+        full = ['"removeInstructions"' in prompt for prompt in prompts]
+        assert full == [True] * 3 + [False] + [False, True] * 2 + [True] * 4, "two misses in a row switch the region back"
+    print("✅ Low hit-rate regions use the full prompt directly and the miss cost is reported")
+
+
+if __name__ == "__main__":
+    print("Species Knowledge Test")
+    print("=" * 60)
+    test_identification_is_completed_from_cache()
+    test_stale_entries_are_served_and_refreshed_once()
+    test_imager_uses_identification_prompt_for_cached_species()
+    test_low_hit_rate_regions_skip_identification()
@@ -0,0 +1,63 @@
+import dataclasses
+import json
+import os
+
+import app.backend as backend
+from app.backend import Imager
+from app.confidence import confidence_score
+from app.llm_registry import LLMEndpoint, llm_registry
+from app.species_knowledge import SpeciesKnowledge
+
+KUDZU = {
+    "specieIdentified": "Kudzu (Pueraria montana)", "nativeRegion": "East Asia", "invasiveOrNot": True,
+    "confidenceScore": 95, "invasiveEffects": "Smothers trees", "nativeAlternatives": [], "removeInstructions": "Dig out crowns",
+}
+
+
+def _analyze_with_tiers(fast_confidence):
+    """Run one analysis with a fast tier answering at fast_confidence; returns (urls asked, result, config)"""
+    original = llm_registry._current
+    fast = LLMEndpoint("key", "fast-model", "https://fast.test")
+    llm_registry._current = dataclasses.replace(original, fast=fast, escalation_confidence=70)
+    client = llm_registry.current.image_client
+    original_output, original_knowledge = client.get_output, backend.species_knowledge
+    asked = []
+
+    def fake_llm(url, llm_contents, mode="default"):
+        asked.append(url)
+        return json.dumps(dict(KUDZU, confidenceScore=fast_confidence if url == fast.url else 95))
+
+    client.get_output = fake_llm
+    backend.species_knowledge = SpeciesKnowledge(os.devnull, enabled=False)
+    try:
+        result = Imager().analyze_plant_image("data:image/png;base64,AAAA", region="Texas")
+    finally:
+        llm_registry._current = original
+        client.get_output, backend.species_knowledge = original_output, original_knowledge
+    return asked, result, original
+
+
+def test_confidence_scale():
+    assert confidence_score({"confidenceScore": 0.95}) == 95.0, "0-1 fractions are rescaled"
+    assert confidence_score({"confidenceScore": 1}) == 1.0, "a 1% answer must not become 100%"
+    assert confidence_score({"confidenceScore": "87"}) == 87.0
+    assert confidence_score({"confidenceScore": None}) is None and confidence_score({}) is None
+    print("✅ Confidence scores are read on the 0-100 scale")
+
+
+def test_low_confidence_fast_answers_escalate():
+    """confidenceScore 1 means 1% on the prompt's scale, so the fast tier must escalate"""
+    asked, result, config = _analyze_with_tiers(fast_confidence=1)
+    assert asked == ["https://fast.test", config.main.url] and result["routing"]["escalated"]
+    assert result["routing"]["tier"] == "main"
+
+    asked, result, _ = _analyze_with_tiers(fast_confidence=0.9)
+    assert asked == ["https://fast.test"] and not result["routing"]["escalated"], "a 0.9 fraction is 90%, above the bar"
+    print("✅ A 1% fast-tier answer escalates to the main model, a confident one does not")
+
+
+if __name__ == "__main__":
+    print("Tier Routing Test")
+    print("=" * 60)
+    test_confidence_scale()
+    test_low_confidence_fast_answers_escalate()
@@ -0,0 +1,165 @@
+import os
+import random
+import tempfile
+
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import Dataset, WeightedRandomSampler
+
+import train_model as tm
+
+
+class _RandomDraws(Dataset):
+    """Returns one draw from each RNG an augmentation might use"""
+
+    def __len__(self):
+        return 16
+
+    def __getitem__(self, idx):
+        return torch.tensor([random.random(), float(np.random.rand()), torch.rand(1).item()]), idx
+
+
+def _draws(num_workers):
+    loader = tm.make_loader(_RandomDraws(), True, torch.device("cpu"), num_workers=num_workers, prefetch_factor=2, seed=7)
+    return [torch.cat([draws for draws, _ in loader]) for _ in range(2)]  # two epochs
+
+
+def test_loader_workers_are_reproducible():
+    first, second = _draws(2), _draws(2)
+    for epoch_a, epoch_b in zip(first, second):
+        assert torch.equal(epoch_a, epoch_b), "same seed must give the same augmentation draws"
+    assert not torch.equal(first[0], first[1]), "epochs must not repeat the same draws"
+    # Workers must not share python/numpy streams (the classic duplicated-augmentation bug)
+    per_sample = first[0][:, :2]
+    assert len(set(per_sample[:, 0].tolist())) == len(per_sample)
+    assert len(set(per_sample[:, 1].tolist())) == len(per_sample)
+    print("✅ Seeded loader workers repeat their draws run to run and never share them")
+
+
+def test_epoch_stats_reports_throughput_and_wait():
+    stats = tm.EpochStats()
+    stats.batch_ready(32)
+    stats.step_done()
+    stats.batch_ready(32)
+    images_per_sec, data_wait = stats.summary()
+    assert stats.images == 64 and images_per_sec > 0 and 0 <= data_wait <= 1
+    print(f"✅ Epoch stats: {images_per_sec:.0f} img/s, data wait {data_wait:.0%}")
+
+
+class _Hashed(Dataset):
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __getitem__(self, idx):
+        return torch.zeros(1), idx
+
+
+def test_holdout_split_keeps_duplicates_together():
+    hashes = [f"h{i % 40}" for i in range(100)]  # every image has two or three copies
+    rest, holdout = tm.holdout_split(_Hashed(hashes))
+    assert sorted(rest + holdout) == list(range(100))
+    assert not {hashes[i] for i in rest} & {hashes[i] for i in holdout}, "a copy leaked across the split"
+    assert (rest, holdout) == tm.holdout_split(_Hashed(hashes)), "split must be deterministic"
+    print(f"✅ Hash-grouped split: {len(rest)} train / {len(holdout)} held out, no shared images")
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_weighted_sampling_balances_classes_and_sources(num_workers):
+    labels = [0] * 30 + [1] * 68 + [1] * 2
+    sources = ["non_plants"] * 30 + ["plants"] * 68 + ["extra_plants"] * 2
+    weights = tm.sample_weights(labels, sources, {"extra_plants": 50.0})
+    assert abs(weights[:30].sum().item() - weights[30:].sum().item()) < 1e-9, "classes must get equal shares"
+    assert abs(weights[98].item() / weights[30].item() - 50.0) < 1e-9
+
+    loader = tm.make_loader(_Hashed([str(i) for i in range(100)]), True, torch.device("cpu"), num_workers=num_workers, weights=weights)
+    assert isinstance(loader.sampler, WeightedRandomSampler), "worker options must not drop the sampler"
+    drawn = torch.cat([idx for _, idx in loader])
+    assert len(drawn) == 100, "an epoch is as long as the unique image list"
+    assert drawn.tolist() != list(range(100)), "draws follow the weights, not dataset order"
+    assert (drawn >= 98).sum() > 10, "the 50x source is drawn far more often than its 2% share"
+    print("✅ Sampler weights balance classes and favour weighted sources without duplicating entries")
+
+
+def _run(epochs, checkpoint, resume_after=None, mode=tm.TrainingMode()):
+    """Train PlantCNN on a fixed random set; optionally 'crash' after resume_after epochs and resume"""
+    torch.manual_seed(3)
+    data = torch.utils.data.TensorDataset(torch.randn(48, 3, 64, 64), torch.arange(48) % 2)
+    loader = tm.make_loader(data, True, torch.device("cpu"), num_workers=0, seed=5, weights=torch.ones(48, dtype=torch.double))
+    model = mode.prepare(tm.PlantCNN())
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    criterion = torch.nn.CrossEntropyLoss()
+    start = 0
+    if resume_after is None and os.path.exists(checkpoint):
+        start, _ = tm.load_checkpoint(checkpoint, model, optimizer, (loader,))
+    for epoch in range(start, epochs if resume_after is None else resume_after):
+        tm.train_one_epoch(model, loader, criterion, optimizer, torch.device("cpu"), mode)
+        tm.save_checkpoint(checkpoint, model, optimizer, epoch, 0.0, (loader,), mode)
+    return model
+
+
+def test_resumed_training_matches_uninterrupted_run():
+    with tempfile.TemporaryDirectory() as tmp:
+        straight = _run(3, os.path.join(tmp, "a.pt"))
+        _run(3, os.path.join(tmp, "b.pt"), resume_after=1)
+        resumed = _run(3, os.path.join(tmp, "b.pt"))
+        for (name, a), b in zip(straight.state_dict().items(), resumed.state_dict().values()):
+            assert torch.equal(a, b), f"{name} differs after resuming"
+    print("✅ Resuming from a checkpoint reproduces the uninterrupted run exactly")
+
+
+def test_fit_returns_best_epoch_even_if_saving_fails():
+    """The best weights come back from fit itself, not from a file that may be missing or stale"""
+    torch.manual_seed(3)
+    data = torch.utils.data.TensorDataset(torch.randn(16, 3, 64, 64), torch.arange(16) % 2)
+    loader = tm.make_loader(data, True, torch.device("cpu"), num_workers=0, seed=5, weights=torch.ones(16, dtype=torch.double))
+    model = tm.PlantCNN()
+    validation_labels = iter([torch.tensor([0]), torch.tensor([1])])  # 100% then 0%: epoch 1 is the best
+    snapshots = []
+
+    def failing_save(model):
+        snapshots.append({k: v.clone() for k, v in model.state_dict().items()})
+        raise OSError("disk full")
+
+    original_epochs, original_predict = tm.EPOCHS, tm.predict
+    tm.EPOCHS = 2
+    tm.predict = lambda *args: (torch.tensor([[1.0, 0.0]]), next(validation_labels))
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            best_acc, best_state = tm.fit(model, loader, loader, torch.device("cpu"), tm.TrainingMode(),
+                                          os.path.join(tmp, "ckpt.pt"), False, failing_save)
+            _, untouched = tm.fit(tm.PlantCNN(), loader, loader, torch.device("cpu"), tm.TrainingMode(),
+                                  os.path.join(tmp, "ckpt.pt"), True, failing_save)
+    finally:
+        tm.EPOCHS, tm.predict = original_epochs, original_predict
+    assert best_acc == 100.0 and len(snapshots) == 1
+    for name, tensor in best_state.items():
+        assert torch.equal(tensor, snapshots[0][name]), f"{name} is not the best epoch's weights"
+    assert any(not torch.equal(best_state[k], v) for k, v in model.state_dict().items()), "training went on after the best epoch"
+    assert untouched is None, "a resumed run with no better epoch has no best state of its own"
+    print("✅ fit hands back the best epoch's weights even when saving them failed")
+
+
+def test_bf16_channels_last_mode_trains():
+    mode = tm.TrainingMode(bf16=True, channels_last=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _run(1, os.path.join(tmp, "c.pt"), mode=mode)
+    assert model.conv1.weight.dtype == torch.float32, "autocast must keep fp32 master weights"
+    assert model.conv1.weight.is_contiguous(memory_format=torch.channels_last)
+    print(f"✅ {mode.name} training step runs with fp32 weights")
+
+
+if __name__ == "__main__":
+    print("Training Pipeline Test")
+    print("=" * 60)
+    test_loader_workers_are_reproducible()
+    test_epoch_stats_reports_throughput_and_wait()
+    test_holdout_split_keeps_duplicates_together()
+    test_weighted_sampling_balances_classes_and_sources(num_workers=0)
+    test_weighted_sampling_balances_classes_and_sources(num_workers=2)
+    test_resumed_training_matches_uninterrupted_run()
+    test_fit_returns_best_epoch_even_if_saving_fails()
+    test_bf16_channels_last_mode_trains()
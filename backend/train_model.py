@@ -2,11 +2,18 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset, random_split
+from torch.utils.data import DataLoader, Dataset, Subset, WeightedRandomSampler
 from torchvision import transforms, datasets
 import os
 import random
+import time
+import argparse
+import numpy as np
+from dataclasses import dataclass
 from PIL import Image
+from dataset_cache import CACHE_DIR, ShardedDataset, build_cache
+from dataset_scanner import MANIFEST_PATH, default_sources, load_manifest, scan, scanned_sources
+from distill_dataset import DISTILL_DIR, load_labels
 
 # Configuration
 # User can adjust epochs here
@@ -14,15 +21,42 @@ EPOCHS = 10
 BATCH_SIZE = 32
 LEARNING_RATE = 0.001
 
+# Data loading: decode/augmentation runs in NUM_WORKERS background processes,
+# each keeping PREFETCH_FACTOR batches ready. Override with --workers / --prefetch-factor.
+NUM_WORKERS = min(8, os.cpu_count() or 1)
+PREFETCH_FACTOR = 4
+SEED = 42
+
 # Paths to the datasets
 PLANT_DIR = "/Users/ericmin/Downloads/plantwild_v2"
 TREE_DIR = "/Users/ericmin/Downloads/tree"
 NON_PLANT_DIR = "/Users/ericmin/Downloads/dataset"
 MODEL_SAVE_PATH = "models/plant_classifier.pth"
+# Full training state written after every epoch; --resume continues from it
+CHECKPOINT_PATH = "models/plant_classifier.checkpoint.pt"
+
+# Fixed held-out split: the training validation set, also used by offline tools
+# (quantization report, threshold tuning)
+HOLDOUT_FRACTION = 0.2
+SPLIT_SEED = 42
+
+# Relative sampling weight of an image from each source (default 1) within its class.
+# extra_plants holds a handful of hand-picked photos (e.g. invasive species) that must be learned.
+SOURCE_WEIGHTS = {"extra_plants": 50.0}
+
+# Consecutive unreadable images __getitem__ skips over before giving up
+MAX_LOAD_ATTEMPTS = 10
 
 # Custom Dataset to handle two separate directories
 class BinaryDataset(Dataset):
-    def __init__(self, plant_dir, tree_dir, non_plant_dir, transform=None):
+    """
+    Images listed in the scan manifest (see dataset_scanner.py). The source
+    directories are only walked when the manifest is missing, does not cover them,
+    or rescan=True; images that failed validation are left out up front.
+    """
+
+    def __init__(self, plant_dir, tree_dir, non_plant_dir, transform=None, manifest_path=MANIFEST_PATH, rescan=False,
+                 extra_plant_dir="extra_plants"):
         self.plant_dir = plant_dir
         self.tree_dir = tree_dir
         self.non_plant_dir = non_plant_dir
@@ -30,87 +64,125 @@ class BinaryDataset(Dataset):
         self.image_paths = []
         self.labels = [] # 0 for non-plant, 1 for plant
 
-        # Helper to recursively find images
-        def find_images_recursive(directory):
-            paths = []
-            if os.path.exists(directory):
-                for root, _, files in os.walk(directory):
-                    for filename in files:
-                        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                            paths.append(os.path.join(root, filename))
-            return paths
+        sources = default_sources(plant_dir, tree_dir, non_plant_dir, extra_plant_dir)
+        entries = [] if rescan else manifest_entries(load_manifest(manifest_path), sources)
+        # A source is covered once scanned, even if it held no images
+        scanned = scanned_sources(manifest_path)
+        covered = {e.source for e in entries} | {s.name for s in sources if (s.name, s.directory) in scanned}
+        if rescan or any(os.path.exists(s.directory) and s.name not in covered for s in sources):
+            entries = scan(sources, manifest_path)
+        else:
+            print(f"📋 Using manifest {manifest_path} ({len(entries)} images; --rescan to pick up changes)")
+
+        by_source = {s.name: [] for s in sources}
+        broken = 0
+        for entry in entries:
+            if entry.valid:
+                by_source[entry.source].append(entry)
+            else:
+                broken += 1
+        if broken:
+            print(f"⚠️ Skipping {broken} images that failed validation (see {manifest_path})")
 
         # 1. Collect Non-Plant images (Label 0)
-        non_plant_paths = find_images_recursive(non_plant_dir)
         if not os.path.exists(non_plant_dir):
             print(f"⚠️ Warning: Non-plant directory not found: {non_plant_dir}")
 
-        num_non_plants = len(non_plant_paths)
+        num_non_plants = len(by_source["non_plants"])
         print(f"   Found {num_non_plants} non-plant images.")
 
         # 2. Collect Plant images (Label 1)
-        plant_paths = find_images_recursive(plant_dir)
         if not os.path.exists(plant_dir):
             print(f"⚠️ Warning: Plant directory not found: {plant_dir}")
 
         # ADDED: Collect Tree images (Label 1)
-        tree_paths = find_images_recursive(tree_dir)
         if not os.path.exists(tree_dir):
             print(f"⚠️ Warning: Tree directory not found: {tree_dir}")
         else:
-            print(f"   Found {len(tree_paths)} tree images.")
-            plant_paths.extend(tree_paths)
+            print(f"   Found {len(by_source['trees'])} tree images.")
 
         # ADDED: Include extra local plant images (e.g., invasive2.png)
-        extra_plant_dir = "extra_plants"
-        if os.path.exists(extra_plant_dir):
-            extra_paths = find_images_recursive(extra_plant_dir)
-            print(f"   Found {len(extra_paths)} extra plant images in {extra_plant_dir}")
-            # Add them multiple times to ensure they are learned (Oversampling)
-            for _ in range(50): 
-                plant_paths.extend(extra_paths)
-        
-        num_plants_found = len(plant_paths)
+        # Listed once; the training sampler draws them more often (SOURCE_WEIGHTS)
+        if by_source["extra_plants"]:
+            print(f"   Found {len(by_source['extra_plants'])} extra plant images in {extra_plant_dir}")
+
+        num_plants_found = sum(len(by_source[name]) for name in ("plants", "trees", "extra_plants"))
         print(f"   Found {num_plants_found} plant images (Plants + Trees + Extras).")
 
         # 3. Balance Datasets
-        # We want to use ALL available plant/tree images as requested.
-        # We will NOT downsample plants even if they outnumber non-plants.
-        if num_non_plants > 0 and num_plants_found > num_non_plants:
-            print(f"ℹ️  Keeping all {num_plants_found} plant images (Plants > Non-Plants).")
-            # previously: plant_paths = random.sample(plant_paths, num_non_plants)
-        elif num_plants_found == 0:
+        # Nothing is dropped or duplicated here: class and source balance comes from
+        # the per-image sampling weights (sample_weights) used by the training loader.
+        if num_plants_found == 0:
             print("⚠️ Warning: No plant images found.")
         elif num_non_plants == 0:
             print("⚠️ Warning: No non-plant images found.")
 
         # 4. Combine
-        for p in non_plant_paths:
-            self.image_paths.append(p)
-            self.labels.append(0)
-        
-        for p in plant_paths:
-            self.image_paths.append(p)
-            self.labels.append(1)
+        self.sources = [] # manifest source name per image
+        self.hashes = [] # content hash per image; copies of one image share it
+        for source in sources:
+            for entry in by_source[source.name]:
+                self.image_paths.append(entry.path)
+                self.labels.append(source.label)
+                self.sources.append(source.name)
+                self.hashes.append(entry.hash)
 
     def __len__(self):
         return len(self.image_paths)
 
     def __getitem__(self, idx):
-        img_path = self.image_paths[idx]
-        label = self.labels[idx]
-        
-        try:
-            image = Image.open(img_path).convert("RGB")
-            if self.transform:
-                image = self.transform(image)
-            return image, label
-        except Exception as e:
-            print(f"Error loading image {img_path}: {e}")
-            # Return a dummy image or handle error appropriately
-            # For simplicity, we'll return the next item (recursive) or a black image
-            # Ideally, filter broken images beforehand
-            return torch.zeros((1, 28, 28)), label
+        attempts = min(MAX_LOAD_ATTEMPTS, len(self))
+        for offset in range(attempts):
+            i = (idx + offset) % len(self)
+            img_path = self.image_paths[i]
+            try:
+                image = Image.open(img_path).convert("RGB")
+                if self.transform:
+                    image = self.transform(image)
+                return image, self.labels[i]
+            except Exception as e:
+                # Every listed image decoded at scan time, so this file changed since; rescan to drop it.
+                # Serve the next item so the batch keeps a consistent shape.
+                print(f"Error loading image {img_path}: {e}")
+        raise RuntimeError(f"{attempts} consecutive images from {self.image_paths[idx]} failed to load; "
+                           f"the dataset changed since the manifest was written (run with --rescan)")
+
+def manifest_entries(entries, sources):
+    """Manifest rows that belong to `sources` (same source name, under its directory)"""
+    roots = {s.name: os.path.join(s.directory, "") for s in sources}
+    return [e for e in entries if e.source in roots and e.path.startswith(roots[e.source])]
+
+def holdout_split(dataset, seed=SPLIT_SEED, fraction=HOLDOUT_FRACTION):
+    """
+    Deterministic (rest, held-out) index split of a dataset. Images with the same
+    content hash (`dataset.hashes`, when present) always land on the same side, so
+    copies of one photo never sit in both training and validation.
+    """
+    keys = getattr(dataset, "hashes", None) or list(range(len(dataset)))
+    groups = {}
+    for idx, key in enumerate(keys):
+        groups.setdefault(key, []).append(idx)
+    groups = list(groups.values())
+    order = torch.randperm(len(groups), generator=torch.Generator().manual_seed(seed)).tolist()
+    holdout_groups = max(1, int(len(groups) * fraction))
+    rest = [idx for g in order[holdout_groups:] for idx in groups[g]]
+    holdout = [idx for g in order[:holdout_groups] for idx in groups[g]]
+    return rest, holdout
+
+def sample_weights(labels, sources, source_weights=None, item_weights=None):
+    """
+    Per-image sampling weight: each class gets an equal share of the draws and,
+    within a class, an image from source s is drawn source_weights[s] times as
+    often as a regular one (further scaled by item_weights, e.g. teacher confidence).
+    """
+    source_weights = SOURCE_WEIGHTS if source_weights is None else source_weights
+    raw = [source_weights.get(source, 1.0) for source in sources]
+    if item_weights is not None:
+        raw = [weight * item for weight, item in zip(raw, item_weights)]
+    class_totals = {}
+    for label, weight in zip(labels, raw):
+        class_totals[label] = class_totals.get(label, 0.0) + weight
+    return torch.tensor([weight / class_totals[label] for label, weight in zip(labels, raw)], dtype=torch.double)
 
 # RESTORED USER'S CNN ARCHITECTURE
 # Fixing 'def' to 'class' for validity, but keeping structure identical
@@ -137,7 +209,7 @@ class PlantCNN(nn.Module):
         X = F.max_pool2d(X, 2, 2)
         X = F.relu(self.conv2(X))
         X = F.max_pool2d(X, 2, 2)
-        X = X.view(-1, 16 * 14 * 14) # Flatten based on new dimensions
+        X = X.reshape(-1, 16 * 14 * 14) # Flatten based on new dimensions (reshape: activations may be channels-last)
         X = F.relu(self.fc1(X))
         X = self.dropout(X) # Apply dropout
         X = F.relu(self.fc2(X))
@@ -145,126 +217,500 @@ class PlantCNN(nn.Module):
         X = self.fc3(X)
         return X
 
-def train():
-    print("🚀 Starting training setup...")
+# Student classifier distilled from the LLM's verdicts on stored analyses (see distill_dataset.py)
+STUDENT_SAVE_PATH = "models/plant_student.pt"
+STUDENT_CHECKPOINT_PATH = "models/plant_student.checkpoint.pt"
+# Class 0 / 1 keep the gate's meaning; every known invasive species gets its own class after them
+STUDENT_BASE_CLASSES = ["not_plant", "plant"]
+MIN_SPECIES_IMAGES = 20  # teacher-labelled images needed before an invasive species gets a class
+STUDENT_CONFIDENCE = 0.9  # probability at which a student verdict is counted as skipping the LLM
 
-    # 1. Define Transforms
-    # MUST match the input size expected by PlantCNN (64x64, RGB)
-    # ADDED: Data Augmentation to help with distracting backgrounds and color variations
-    transform = transforms.Compose([
-        transforms.Resize((64, 64)), # Increased resolution
-        transforms.RandomHorizontalFlip(), # Randomly flip horizontally
-        transforms.RandomRotation(15), # Randomly rotate +/- 15 degrees
-        transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1), # Randomly change colors
-        transforms.ToTensor(),
-        transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)) # Normalize RGB images
-    ])
+class PlantStudentCNN(nn.Module):
+    """
+    Same 64x64 RGB input as PlantCNN, four conv/batch-norm blocks and global
+    average pooling: ~80k parameters and ~15M multiply-adds per image, still
+    well under a millisecond on one CPU core.
+    """
+    def __init__(self, num_classes):
+        super().__init__()
+        def block(channels_in, channels_out):
+            return nn.Sequential(
+                nn.Conv2d(channels_in, channels_out, 3, 1, padding=1, bias=False),
+                nn.BatchNorm2d(channels_out),
+                nn.ReLU(inplace=True),
+                nn.MaxPool2d(2, 2),
+            )
+        self.features = nn.Sequential(block(3, 16), block(16, 32), block(32, 64), block(64, 96)) # 64 -> 4x4
+        self.dropout = nn.Dropout(0.3)
+        self.fc = nn.Linear(96, num_classes)
 
-    # 2. Load Data
-    print(f"📂 Loading data from:")
-    print(f"   Plants: {PLANT_DIR}")
-    print(f"   Trees: {TREE_DIR}")
-    print(f"   Non-Plants: {NON_PLANT_DIR}")
+    def forward(self, X):
+        X = self.features(X)
+        X = X.mean(dim=(2, 3)) # global average pool
+        return self.fc(self.dropout(X))
 
-    # 3. Create Dataset and Dataloaders
-    # Now we pass TREE_DIR as well
-    dataset = BinaryDataset(PLANT_DIR, TREE_DIR, NON_PLANT_DIR, transform=transform)
-    
-    if len(dataset) == 0:
-        print("❌ No images found. Exiting.")
-        return
+# MUST match the input size expected by PlantCNN (64x64, RGB)
+# ADDED: Data Augmentation to help with distracting backgrounds and color variations
+TRAIN_TRANSFORM = transforms.Compose([
+    transforms.Resize((64, 64)), # Increased resolution
+    transforms.RandomHorizontalFlip(), # Randomly flip horizontally
+    transforms.RandomRotation(15), # Randomly rotate +/- 15 degrees
+    transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1), # Randomly change colors
+    transforms.ToTensor(),
+    transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)) # Normalize RGB images
+])
 
-    print(f"✅ Found {len(dataset)} total images.")
-    
-    # 80% train, 20% validation
-    train_size = int(0.8 * len(dataset))
-    val_size = len(dataset) - train_size
-    train_dataset, val_dataset = random_split(dataset, [train_size, val_size])
-    
-    print(f"   - Training Set: {len(train_dataset)} images")
-    print(f"   - Validation Set: {len(val_dataset)} images")
+# Augmentations applied per epoch to uint8 (3, 64, 64) tensors from the shard cache;
+# the deterministic decode + resize already happened once in build_cache()
+CACHED_TRAIN_TRANSFORM = transforms.Compose([
+    transforms.RandomHorizontalFlip(),
+    transforms.RandomRotation(15),
+    transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
+    transforms.ConvertImageDtype(torch.float32),
+    transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))
+])
+CACHED_EVAL_TRANSFORM = transforms.Compose([
+    transforms.ConvertImageDtype(torch.float32),
+    transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))
+])
 
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False)
+def cached_datasets(dataset, train_indices, val_indices, cache_dir=CACHE_DIR, workers=None):
+    """Train/validation datasets over the shard cache (built or topped up first)"""
+    build_cache(dataset.image_paths, cache_dir, workers=workers)
+    pick = lambda values, indices: [values[i] for i in indices]
+    train_view = ShardedDataset(pick(dataset.image_paths, train_indices), pick(dataset.labels, train_indices),
+                                cache_dir, transform=CACHED_TRAIN_TRANSFORM)
+    # Validation rows without augmentation, so it measures the model and not the jitter
+    val_view = ShardedDataset(pick(dataset.image_paths, val_indices), pick(dataset.labels, val_indices),
+                              cache_dir, transform=CACHED_EVAL_TRANSFORM)
+    return train_view, val_view
 
-    # 3. Initialize Model
+def seed_worker(worker_id):
+    """Seed python/numpy in each loader worker from its torch seed (loader seed + worker id),
+    so augmentations repeat exactly from run to run"""
+    worker_seed = torch.initial_seed() % 2**32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+def make_loader(dataset, shuffle, device, num_workers=NUM_WORKERS, prefetch_factor=PREFETCH_FACTOR, seed=SEED,
+                weights=None):
+    """weights: per-item sampling weights; an epoch then draws len(dataset) items with replacement"""
+    options = {}
+    if weights is not None:
+        options["sampler"] = WeightedRandomSampler(weights, len(dataset), generator=torch.Generator().manual_seed(seed))
+        shuffle = False
+    if num_workers > 0:
+        # Keep workers (and their open shard maps) alive between epochs
+        options.update(persistent_workers=True, prefetch_factor=prefetch_factor, worker_init_fn=seed_worker)
+    return DataLoader(
+        dataset,
+        batch_size=BATCH_SIZE,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",  # page-locked batches allow async host-to-GPU copies
+        generator=torch.Generator().manual_seed(seed),
+        **options
+    )
+
+class EpochStats:
+    """Images/sec for an epoch and the share of its wall time spent waiting on the loader"""
+
+    def __init__(self):
+        self.start = self._last_step = time.perf_counter()
+        self.data_wait = 0.0
+        self.images = 0
+
+    def batch_ready(self, batch_size):
+        self.data_wait += time.perf_counter() - self._last_step
+        self.images += batch_size
+
+    def step_done(self):
+        self._last_step = time.perf_counter()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return self.images / elapsed, self.data_wait / elapsed
+
+@dataclass(frozen=True)
+class TrainingMode:
+    """
+    Numerics/layout of the training step. bf16 runs the forward pass under
+    bfloat16 autocast (weights, gradients and optimizer state stay fp32; bf16 has
+    fp32's exponent range, so no loss scaling is needed). channels_last stores
+    activations NHWC, the layout the CPU convolution kernels prefer.
+    """
+    bf16: bool = False
+    channels_last: bool = False
+
+    @property
+    def name(self):
+        parts = ["bf16" if self.bf16 else "fp32"] + (["channels-last"] if self.channels_last else [])
+        return " + ".join(parts)
+
+    def prepare(self, model):
+        return model.to(memory_format=torch.channels_last) if self.channels_last else model
+
+    def inputs(self, inputs, device):
+        if self.channels_last:
+            return inputs.to(device, memory_format=torch.channels_last, non_blocking=True)
+        return inputs.to(device, non_blocking=True)
+
+    def autocast(self, device):
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=self.bf16)
+
+def train_one_epoch(model, loader, criterion, optimizer, device, mode=TrainingMode()):
+    """One pass over `loader`; returns (mean loss, accuracy %, EpochStats)"""
+    model.train()
+    running_loss = 0.0
+    correct = 0
+    total = 0
+    stats = EpochStats()
+
+    for i, data in enumerate(loader, 0):
+        inputs, labels = data
+        stats.batch_ready(labels.size(0))
+        inputs, labels = mode.inputs(inputs, device), labels.to(device, non_blocking=True)
+
+        optimizer.zero_grad()
+
+        with mode.autocast(device):
+            outputs = model(inputs)
+            loss = criterion(outputs, labels)
+        loss.backward()
+        optimizer.step()
+
+        running_loss += loss.item()
+        
+        # Calculate accuracy
+        _, predicted = torch.max(outputs.data, 1)
+        total += labels.size(0)
+        correct += (predicted == labels).sum().item()
+        stats.step_done()
+
+    return running_loss / len(loader), 100 * correct / total, stats
+
+def _loader_generators(loaders):
+    """Every torch.Generator that decides a loader's order and worker seeds"""
+    generators = []
+    for loader in loaders:
+        generators.append(loader.generator)
+        sampler_generator = getattr(loader.sampler, "generator", None)
+        if sampler_generator is not None:
+            generators.append(sampler_generator)
+    return generators
+
+def save_checkpoint(path, model, optimizer, epoch, best_val_acc, loaders=(), mode=TrainingMode()):
+    """Everything needed to continue after `epoch` (0-based) as if never stopped"""
+    state = {
+        "epoch": epoch,
+        "best_val_acc": best_val_acc,
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "mode": {"bf16": mode.bf16, "channels_last": mode.channels_last},
+        "rng": {
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            "numpy": np.random.get_state(),
+            "python": random.getstate(),
+            "loaders": [g.get_state() for g in _loader_generators(loaders)],
+        },
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write-then-rename: a run killed mid-save keeps the previous checkpoint
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def load_checkpoint(path, model, optimizer, loaders=()):
+    """Restore a save_checkpoint() file; returns (next epoch, best validation accuracy)"""
+    state = torch.load(path, map_location="cpu", weights_only=False)  # includes numpy/python RNG state
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    rng = state["rng"]
+    torch.set_rng_state(rng["torch"])
+    if rng["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng["cuda"])
+    np.random.set_state(rng["numpy"])
+    random.setstate(rng["python"])
+    for generator, generator_state in zip(_loader_generators(loaders), rng["loaders"]):
+        generator.set_state(generator_state)
+    return state["epoch"] + 1, state["best_val_acc"]
+
+def select_device():
     if torch.backends.mps.is_available():
-        device = torch.device("mps")
+        return torch.device("mps")
     elif torch.cuda.is_available():
-        device = torch.device("cuda")
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+def build_loaders(dataset, device, use_cache=True, cache_dir=CACHE_DIR, num_workers=NUM_WORKERS,
+                  prefetch_factor=PREFETCH_FACTOR, seed=SEED, source_weights=None, item_weights=None):
+    """(train, validation) loaders over the hash-grouped holdout split, training drawn by sample_weights"""
+    # 80% train, 20% validation, split by image content so duplicates cannot leak across
+    train_indices, val_indices = holdout_split(dataset)
+    item_weights = item_weights or [1.0] * len(dataset)
+    if use_cache:
+        train_dataset, val_dataset = cached_datasets(dataset, train_indices, val_indices, cache_dir)
+        index_of = {path: i for i, path in enumerate(dataset.image_paths)}
+        kept = [index_of[p] for p in train_dataset.paths]
     else:
-        device = torch.device("cpu")
-    print(f"💻 Using device: {device}")
-    
-    # Use the local PlantCNN class
-    model = PlantCNN().to(device)
+        train_dataset, val_dataset = Subset(dataset, train_indices), Subset(dataset, val_indices)
+        kept = train_indices
+    weights = sample_weights([dataset.labels[i] for i in kept], [dataset.sources[i] for i in kept],
+                             source_weights, [item_weights[i] for i in kept])
     
+    print(f"   - Training Set: {len(train_dataset)} images")
+    print(f"   - Validation Set: {len(val_dataset)} images")
+
+    train_loader = make_loader(train_dataset, True, device, num_workers, prefetch_factor, seed, weights=weights)
+    val_loader = make_loader(val_dataset, False, device, num_workers, prefetch_factor, seed)
+    print(f"🧵 Data loading: {num_workers} workers, prefetch {prefetch_factor if num_workers else 0} batches each")
+    return train_loader, val_loader
+
+def predict(model, loader, device, mode=TrainingMode()):
+    """(softmax probabilities, labels) over a loader"""
+    model.eval()
+    probabilities, targets = [], []
+    with torch.no_grad():
+        for inputs, labels in loader:
+            with mode.autocast(device):
+                outputs = model(mode.inputs(inputs, device))
+            probabilities.append(F.softmax(outputs.float(), dim=1).cpu())
+            targets.append(labels)
+    return torch.cat(probabilities), torch.cat(targets)
+
+def fit(model, train_loader, val_loader, device, mode, checkpoint_path, resume, save_best):
+    """
+    Train for EPOCHS (continuing a checkpoint if resume); save_best(model) on each new best.
+    Returns (best Val Acc, CPU state dict of this run's best epoch), the state being None
+    when no epoch of this run improved on the best so far.
+    """
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
 
     # 4. Training Loop
     print(f"params: {sum(p.numel() for p in model.parameters())} trainable parameters")
-    print("Starting training loop...")
+    print(f"⚙️  Training mode: {mode.name}")
     
     best_val_acc = 0.0
+    best_state = None
+    start_epoch = 0
+    if resume and os.path.exists(checkpoint_path):
+        start_epoch, best_val_acc = load_checkpoint(checkpoint_path, model, optimizer, (train_loader, val_loader))
+        print(f"⏯️  Resuming from {checkpoint_path} at epoch {start_epoch + 1} (best Val Acc so far {best_val_acc:.2f}%)")
+    elif resume:
+        print(f"ℹ️  No checkpoint at {checkpoint_path}; starting from scratch")
+    print("Starting training loop...")
 
-    for epoch in range(EPOCHS):
+    for epoch in range(start_epoch, EPOCHS):
         # Training Phase
-        model.train()
-        running_loss = 0.0
-        correct = 0
-        total = 0
-        
-        for i, data in enumerate(train_loader, 0):
-            inputs, labels = data
-            inputs, labels = inputs.to(device), labels.to(device)
-
-            optimizer.zero_grad()
-
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-
-            running_loss += loss.item()
-            
-            # Calculate accuracy
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-
-        train_loss = running_loss / len(train_loader)
-        train_acc = 100 * correct / total
+        train_loss, train_acc, stats = train_one_epoch(model, train_loader, criterion, optimizer, device, mode)
+        images_per_sec, data_wait = stats.summary()
 
         # Validation Phase
-        model.eval()
-        val_correct = 0
-        val_total = 0
-        with torch.no_grad():
-            for data in val_loader:
-                inputs, labels = data
-                inputs, labels = inputs.to(device), labels.to(device)
-                outputs = model(inputs)
-                _, predicted = torch.max(outputs.data, 1)
-                val_total += labels.size(0)
-                val_correct += (predicted == labels).sum().item()
-        
-        val_acc = 100 * val_correct / val_total
+        probabilities, labels = predict(model, val_loader, device, mode)
+        val_acc = 100 * (probabilities.argmax(dim=1) == labels).float().mean().item()
         
-        print(f"Epoch {epoch + 1}/{EPOCHS} | Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}% | Val Acc: {val_acc:.2f}%")
+        print(f"Epoch {epoch + 1}/{EPOCHS} | Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.2f}% | Val Acc: {val_acc:.2f}% "
+              f"| {images_per_sec:.0f} img/s | data wait {data_wait:.0%}")
 
         # Save Best Model
         if val_acc > best_val_acc:
             best_val_acc = val_acc
+            best_state = {k: v.detach().cpu().clone() for k, v in _contiguous_state(model).items()}
             try:
-                os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
-                torch.save(model.state_dict(), MODEL_SAVE_PATH)
+                save_best(model)
                 # print(f"   💾 New best model saved! (Val Acc: {val_acc:.2f}%)")
             except Exception as e:
                 print(f"❌ Error saving model: {e}")
 
+        save_checkpoint(checkpoint_path, model, optimizer, epoch, best_val_acc, (train_loader, val_loader), mode)
+
+    return best_val_acc, best_state
+
+def _contiguous_state(model):
+    # Contiguous (NCHW) tensors: the serving loaders expect the default layout
+    return {k: v.contiguous() for k, v in model.state_dict().items()}
+
+def train(use_cache=True, cache_dir=CACHE_DIR, num_workers=NUM_WORKERS, prefetch_factor=PREFETCH_FACTOR, seed=SEED,
+          manifest_path=MANIFEST_PATH, rescan=False, mode=TrainingMode(), checkpoint_path=CHECKPOINT_PATH, resume=False):
+    print("🚀 Starting training setup...")
+    torch.manual_seed(seed)
+
+    # 1. Define Transforms
+    transform = TRAIN_TRANSFORM
+
+    # 2. Load Data
+    print(f"📂 Loading data from:")
+    print(f"   Plants: {PLANT_DIR}")
+    print(f"   Trees: {TREE_DIR}")
+    print(f"   Non-Plants: {NON_PLANT_DIR}")
+
+    # 3. Create Dataset and Dataloaders
+    # Now we pass TREE_DIR as well
+    dataset = BinaryDataset(PLANT_DIR, TREE_DIR, NON_PLANT_DIR, transform=transform, manifest_path=manifest_path, rescan=rescan)
+    
+    if len(dataset) == 0:
+        print("❌ No images found. Exiting.")
+        return
+
+    print(f"✅ Found {len(dataset)} total images.")
+
+    # 3. Initialize Model
+    device = select_device()
+    print(f"💻 Using device: {device}")
+    train_loader, val_loader = build_loaders(dataset, device, use_cache, cache_dir, num_workers, prefetch_factor, seed)
+    
+    # Use the local PlantCNN class
+    model = mode.prepare(PlantCNN().to(device))
+
+    def save_best(model):
+        os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
+        torch.save(_contiguous_state(model), MODEL_SAVE_PATH)
+
+    best_val_acc, _ = fit(model, train_loader, val_loader, device, mode, checkpoint_path, resume, save_best)
+
     print(f"✅ Finished Training. Best Validation Accuracy: {best_val_acc:.2f}%")
+    if not os.path.exists(MODEL_SAVE_PATH):
+        print(f"❌ No model was saved to {MODEL_SAVE_PATH}; nothing to export")
+        return
     print(f"💾 Final best model saved to {MODEL_SAVE_PATH}")
+    export(MODEL_SAVE_PATH)
+
+class StudentDataset(BinaryDataset):
+    """BinaryDataset images (not_plant / plant) plus the teacher-labelled ones, labelled with student class indices"""
+
+    def __init__(self, plant_dir, tree_dir, non_plant_dir, teacher_labels, classes, transform=None, **kwargs):
+        super().__init__(plant_dir, tree_dir, non_plant_dir, transform=transform, **kwargs)
+        self.classes = classes
+        self.confidences = [1.0] * len(self.image_paths) # curated images are certain
+        class_index = {name: i for i, name in enumerate(classes)}
+        for label in teacher_labels:
+            self.image_paths.append(label.path)
+            # Non-invasive and rare species only teach "plant"
+            self.labels.append(class_index.get(label.species, 1) if label.invasive else 1)
+            self.sources.append("distilled")
+            self.hashes.append(label.hash)
+            self.confidences.append(label.confidence / 100)
+        print(f"   Added {len(teacher_labels)} teacher-labelled images ({len(classes) - 2} invasive species classes)")
+
+def student_classes(teacher_labels, min_images=MIN_SPECIES_IMAGES):
+    counts = {}
+    for label in teacher_labels:
+        if label.invasive:
+            counts[label.species] = counts.get(label.species, 0) + 1
+    return STUDENT_BASE_CLASSES + sorted(species for species, count in counts.items() if count >= min_images)
+
+def student_report(probabilities, labels, classes, threshold=STUDENT_CONFIDENCE):
+    """
+    What a confident student would settle without the LLM: "not a plant" or a
+    known invasive species at >= threshold ("plant" still needs the LLM to name it).
+    """
+    confidence, predicted = probabilities.max(dim=1)
+    decided = (confidence >= threshold) & (predicted != 1)
+    correct = predicted == labels
+    print(f"\n🎓 Student at p >= {threshold}: decides {decided.float().mean().item():.1%} of held-out images alone, "
+          f"precision {correct[decided].float().mean().item() if decided.any() else float('nan'):.3f}")
+    report = {}
+    for index, name in enumerate(classes):
+        if index == 1:
+            continue
+        mine = decided & (predicted == index)
+        support = int((labels == index).sum())
+        precision = correct[mine].float().mean().item() if mine.any() else float("nan")
+        report[name] = {"decided": int(mine.sum()), "precision": precision, "support": support}
+        print(f"   {name:<32} decided {int(mine.sum()):>5}  precision {precision:6.3f}  (held-out images {support})")
+    return report
+
+def train_student(distill_dir=DISTILL_DIR, use_cache=True, cache_dir=CACHE_DIR, num_workers=NUM_WORKERS,
+                  prefetch_factor=PREFETCH_FACTOR, seed=SEED, manifest_path=MANIFEST_PATH, rescan=False,
+                  mode=TrainingMode(), checkpoint_path=STUDENT_CHECKPOINT_PATH, resume=False, min_species_images=MIN_SPECIES_IMAGES):
+    """Distil the LLM's stored verdicts into PlantStudentCNN (not a plant / plant / known invasive species)"""
+    print("🚀 Starting student training setup...")
+    torch.manual_seed(seed)
+
+    teacher_labels = load_labels(distill_dir)
+    if not teacher_labels:
+        print(f"⚠️ No teacher labels in {distill_dir} (run distill_dataset.py); training not_plant / plant only")
+    classes = student_classes(teacher_labels, min_species_images)
+    dataset = StudentDataset(PLANT_DIR, TREE_DIR, NON_PLANT_DIR, teacher_labels, classes, transform=TRAIN_TRANSFORM,
+                             manifest_path=manifest_path, rescan=rescan)
+    if len(dataset) == 0:
+        print("❌ No images found. Exiting.")
+        return
+    print(f"✅ Found {len(dataset)} total images, {len(classes)} classes.")
+
+    device = select_device()
+    print(f"💻 Using device: {device}")
+    # Teacher confidence scales how often a distilled image is drawn
+    train_loader, val_loader = build_loaders(dataset, device, use_cache, cache_dir, num_workers, prefetch_factor, seed,
+                                             item_weights=dataset.confidences)
+    model = mode.prepare(PlantStudentCNN(len(classes)).to(device))
+
+    def save_best(model):
+        os.makedirs(os.path.dirname(STUDENT_SAVE_PATH), exist_ok=True)
+        torch.save({"classes": classes, "state_dict": _contiguous_state(model)}, STUDENT_SAVE_PATH)
+
+    best_val_acc, best_state = fit(model, train_loader, val_loader, device, mode, checkpoint_path, resume, save_best)
+    print(f"✅ Finished Training. Best Validation Accuracy: {best_val_acc:.2f}%")
+
+    # Report on the best epoch from memory: the saved file may be missing (save failed)
+    # or left over from an earlier run (no epoch improved)
+    if best_state is None and resume and os.path.exists(STUDENT_SAVE_PATH):
+        # The best epoch came before the resume point and was saved by the interrupted run
+        best_state = torch.load(STUDENT_SAVE_PATH, map_location="cpu")["state_dict"]
+    if best_state is None:
+        print("⚠️ No epoch improved validation accuracy; reporting on the final weights")
+    else:
+        model.load_state_dict(best_state)
+        print(f"💾 Final best student saved to {STUDENT_SAVE_PATH}")
+    probabilities, labels = predict(model, val_loader, device, mode)
+    return student_report(probabilities, labels, classes)
+
+def export(weights_path=MODEL_SAVE_PATH, formats=("torchscript", "onnx")):
+    """
+    Writes serving artifacts next to the state dict: a frozen TorchScript module
+    and an ONNX graph (skipped if the onnx exporter dependencies are missing),
+    each stamped with the weights digest so serving ignores them after a retrain.
+    """
+    from app.plant_classifier import artifact_paths, load_eager_model, export_torchscript, export_onnx, weights_digest
+
+    exporters = {"torchscript": export_torchscript, "onnx": export_onnx}
+    model = load_eager_model(weights_path)
+    digest = weights_digest(weights_path)
+    paths = artifact_paths(weights_path)
+    for fmt in formats:
+        try:
+            exporters[fmt](model, paths[fmt], digest)
+            print(f"📦 Exported {fmt} model to {paths[fmt]}")
+        except Exception as e:
+            print(f"⚠️ Skipping {fmt} export: {e}")
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export", action="store_true", help="only export serving artifacts from the saved weights")
+    parser.add_argument("--format", choices=["torchscript", "onnx"], action="append", help="artifact(s) to export (default: both)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="decoded image shard cache (see dataset_cache.py)")
+    parser.add_argument("--no-cache", action="store_true", help="decode the original images every epoch")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="DataLoader worker processes (0: load in the main process)")
+    parser.add_argument("--prefetch-factor", type=int, default=PREFETCH_FACTOR, help="batches each worker keeps ready")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="validated image list (see dataset_scanner.py)")
+    parser.add_argument("--rescan", action="store_true", help="rescan the dataset directories for new or changed images")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast for the forward pass (fastest on CPUs with AVX512-BF16/AMX)")
+    parser.add_argument("--channels-last", action="store_true", help="NHWC memory format for the model and batches")
+    parser.add_argument("--checkpoint", default=None, help="full training state written after every epoch "
+                        f"(default: {CHECKPOINT_PATH}, or {STUDENT_CHECKPOINT_PATH} with --student)")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    parser.add_argument("--student", action="store_true", help="train the distilled student (plus known invasive species) instead of the gate")
+    parser.add_argument("--distill-dir", default=DISTILL_DIR, help="teacher-labelled images (see distill_dataset.py)")
+    args = parser.parse_args()
+
+    options = dict(use_cache=not args.no_cache, cache_dir=args.cache_dir, num_workers=args.workers,
+                   prefetch_factor=args.prefetch_factor, seed=args.seed, manifest_path=args.manifest, rescan=args.rescan,
+                   mode=TrainingMode(args.bf16, args.channels_last), resume=args.resume)
+    if args.export:
+        export(MODEL_SAVE_PATH, args.format or ("torchscript", "onnx"))
+    elif args.student:
+        train_student(args.distill_dir, checkpoint_path=args.checkpoint or STUDENT_CHECKPOINT_PATH, **options)
+    else:
+        train(checkpoint_path=args.checkpoint or CHECKPOINT_PATH, **options)
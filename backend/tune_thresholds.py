@@ -0,0 +1,129 @@
+"""
+Offline threshold tuning for the CNN plant pre-check.
+
+Runs the serving classifier over the held-out split, prints the precision/recall
+curve of both decisions, and picks:
+- reject: the highest threshold whose rejected images are still at least
+  --reject-precision non-plants (so real plants are rarely turned away)
+- accept: the lowest threshold whose accepted images are at least
+  --accept-precision plants
+Images in between fall in the gray band and go straight to the LLM. The result
+is written to models/plant_classifier.thresholds.json, which load_model reads.
+
+Usage (from the backend directory):
+    python tune_thresholds.py [--reject-precision 0.99] [--accept-precision 0.98]
+                              [--plants DIR --trees DIR --non-plants DIR] [--dry-run]
+"""
+
+import argparse
+import json
+from typing import Tuple
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Subset
+
+import app.plant_classifier as pc
+from app.preprocessing import EVAL_TRANSFORM
+from train_model import BinaryDataset, PLANT_DIR, TREE_DIR, NON_PLANT_DIR, MODEL_SAVE_PATH, holdout_split
+
+CURVE_POINTS = [i / 20 for i in range(1, 20)]
+
+
+def collect_probabilities(runtime, loader) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Plant probability and label for every image in the loader"""
+    probabilities, labels = [], []
+    for inputs, batch_labels in loader:
+        probabilities.append(F.softmax(runtime(inputs), dim=1)[:, 1])
+        labels.append(batch_labels)
+    return torch.cat(probabilities), torch.cat(labels)
+
+
+def curve_point(probabilities: torch.Tensor, labels: torch.Tensor, threshold: float) -> dict:
+    """Precision/recall of accepting p >= threshold as plant and rejecting p < threshold"""
+    accepted, plants = probabilities >= threshold, labels == 1
+    rejected, non_plants = ~accepted, ~plants
+    ratio = lambda a, b: (a.sum() / b.sum()).item() if b.any() else float("nan")
+    return {
+        "threshold": threshold,
+        "plant_precision": ratio(accepted & plants, accepted),
+        "plant_recall": ratio(accepted & plants, plants),
+        "reject_precision": ratio(rejected & non_plants, rejected),
+        "reject_recall": ratio(rejected & non_plants, non_plants),
+        "rejected_share": rejected.float().mean().item(),
+    }
+
+
+def choose_thresholds(probabilities: torch.Tensor, labels: torch.Tensor,
+                      accept_precision: float, reject_precision: float) -> Tuple[float, float]:
+    """(accept, reject) meeting the precision targets; reject never exceeds accept"""
+    order = torch.argsort(probabilities)
+    ordered, is_plant = probabilities[order], (labels[order] == 1).long()
+    candidates = torch.unique(torch.cat([ordered, torch.tensor([0.0, 1.0])]))
+    # below[i]: how many images score under candidates[i]; cumulative plant counts give both precisions
+    below = torch.searchsorted(ordered, candidates, right=False)
+    plants_below = torch.cat([torch.zeros(1, dtype=torch.long), torch.cumsum(is_plant, 0)])[below]
+    total, total_plants = len(ordered), int(is_plant.sum())
+
+    reject_precisions = 1 - plants_below / below.clamp(min=1)
+    safe_rejects = candidates[(below > 0) & (reject_precisions >= reject_precision)]
+    reject = safe_rejects.max().item() if len(safe_rejects) else 0.0  # never reject unless some threshold is safe
+
+    above = total - below
+    accept_precisions = (total_plants - plants_below) / above.clamp(min=1)
+    precise_accepts = candidates[(above > 0) & (accept_precisions >= accept_precision)]
+    accept = precise_accepts.min().item() if len(precise_accepts) else 1.0  # only certain plants otherwise
+    # Cleanly separable validation data makes the two ranges overlap: a single cut, no gray band
+    return accept, min(reject, accept)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=MODEL_SAVE_PATH)
+    parser.add_argument("--runtime", default="auto", help="classifier runtime to tune (thresholds are runtime specific for int8)")
+    parser.add_argument("--accept-precision", type=float, default=0.98)
+    parser.add_argument("--reject-precision", type=float, default=0.99)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--plants", default=PLANT_DIR)
+    parser.add_argument("--trees", default=TREE_DIR)
+    parser.add_argument("--non-plants", default=NON_PLANT_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="print the curve without writing thresholds")
+    args = parser.parse_args()
+
+    dataset = BinaryDataset(args.plants, args.trees, args.non_plants, transform=EVAL_TRANSFORM)
+    if len(dataset) == 0:
+        print("❌ No images found for validation. Exiting.")
+        raise SystemExit(1)
+    _, holdout = holdout_split(dataset)
+    loader = DataLoader(Subset(dataset, holdout), batch_size=args.batch_size, shuffle=False)
+
+    runtime = pc.create_runtime(args.weights, args.runtime)
+    probabilities, labels = collect_probabilities(runtime, loader)
+    print(f"📊 {len(labels)} held-out images ({int(labels.sum())} plants) scored with the {runtime.name} runtime")
+
+    print(f"\n{'threshold':>9} {'plant P':>8} {'plant R':>8} {'reject P':>9} {'reject R':>9} {'rejected':>9}")
+    for t in CURVE_POINTS:
+        row = curve_point(probabilities, labels, t)
+        print(f"{t:9.2f} {row['plant_precision']:8.3f} {row['plant_recall']:8.3f} {row['reject_precision']:9.3f} "
+              f"{row['reject_recall']:9.3f} {row['rejected_share']:8.1%}")
+
+    accept, reject = choose_thresholds(probabilities, labels, args.accept_precision, args.reject_precision)
+    rejected = probabilities < reject
+    gray = (probabilities >= reject) & (probabilities < accept)
+    print(f"\n🎚️ accept >= {accept:.4f}, reject < {reject:.4f}")
+    print(f"   LLM calls avoided: {rejected.float().mean().item():.1%} of images "
+          f"({int((rejected & (labels == 1)).sum())} plants wrongly rejected)")
+    print(f"   Gray band (straight to LLM): {gray.float().mean().item():.1%} of images")
+
+    if not args.dry_run:
+        path = pc.artifact_paths(args.weights)["thresholds"]
+        with open(path, "w") as f:
+            json.dump({
+                "accept": accept,
+                "reject": reject,
+                "accept_precision": args.accept_precision,
+                "reject_precision": args.reject_precision,
+                "runtime": runtime.name,
+                "validation_images": len(labels),
+            }, f, indent=2)
+        print(f"💾 Thresholds written to {path}")
@@ -162,7 +162,8 @@ function AppContent() {
         })),
         controlMethods: (item.plant_data.removeInstructions || '').split(';').map((s: string) => s.trim()).filter(Boolean),
         region: item.region || '',
-        nativeRegion: item.plant_data.nativeRegion || ''
+        nativeRegion: item.plant_data.nativeRegion || '',
+        source: item.plant_data.source
       };
     }
 
@@ -351,7 +352,8 @@ function AppContent() {
         scientificName: alt.scientificName,
         characteristics: alt.description
       })),
-      removeInstructions: apiPlantInfo.controlMethods.join('; ')
+      removeInstructions: apiPlantInfo.controlMethods.join('; '),
+      source: apiPlantInfo.source
     };
   }, []);
 
@@ -32,6 +32,8 @@ const PlantChat: React.FC<PlantChatProps> = ({ plantData, messages, onNewMessage
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const { firebaseUser } = useAuth();
   const initializedRef = useRef(false);
+  // Server-side conversation, so follow-up questions keep the earlier answers
+  const sessionIdRef = useRef<string | null>(null);
 
   // Initialize with welcome message if empty
   useEffect(() => {
@@ -91,7 +93,8 @@ const PlantChat: React.FC<PlantChatProps> = ({ plantData, messages, onNewMessage
         },
         body: JSON.stringify({
           message: question,
-          context: context
+          context: context,
+          sessionId: sessionIdRef.current
         })
       });
 
@@ -100,6 +103,7 @@ const PlantChat: React.FC<PlantChatProps> = ({ plantData, messages, onNewMessage
       }
 
       const data = await response.json();
+      sessionIdRef.current = data.sessionId ?? null;
       
       const botMsg: Message = {
         id: (Date.now() + 1).toString(),
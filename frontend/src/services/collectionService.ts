@@ -16,6 +16,7 @@ export interface PlantInfo {
     characteristics: string;
   }>;
   removeInstructions: string;
+  source?: string;
 }
 
 export interface CollectionItem {
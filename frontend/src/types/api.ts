@@ -17,6 +17,7 @@ export interface PlantInfo {
   region: string; // The region where the scan was performed (User's region)
   nativeRegion?: string; // The native region of the plant
   imageUrl?: string;
+  source?: string; // Set when the answer was served from the species index or knowledge cache
 }
 
 export interface NativeAlternative {
@@ -18,6 +18,7 @@ export interface PlantAnalysisResponse {
   coins?: number;
   coinAwarded?: boolean;
   region?: string; // The region where the scan was performed
+  source?: string; // Set when the answer was served from the species index or knowledge cache
 }
 
 export interface PlantAnalysisRequest {
@@ -181,7 +181,8 @@ export function convertToPlantInfo(response: PlantAnalysisResponse): PlantInfo {
     })),
     controlMethods: response.removeInstructions ? [response.removeInstructions] : [],
     region: response.region || 'Unknown',
-    nativeRegion: response.nativeRegion || 'Unknown'
+    nativeRegion: response.nativeRegion || 'Unknown',
+    source: response.source
   };
 }
 